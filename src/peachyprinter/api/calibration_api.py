@@ -49,7 +49,7 @@ class CalibrationAPI(object):
         self._state = MachineState()
         self._status = MachineStatus()
 
-        self._communicator = UsbPacketCommunicator(self._configuration.circut.calibration_queue_length)
+        self._communicator = UsbPacketCommunicator(self._configuration.circut.calibration_queue_length, self._configuration.circut.write_buffer_size, self._configuration.circut.use_loopback)
         self._communicator.start()
         self._disseminator = MicroDisseminator(
             self._laser_control,
@@ -76,7 +76,8 @@ class CalibrationAPI(object):
             self._laser_control,
             self._state,
             post_fire_delay_speed=post_fire_delay_speed,
-            slew_delay_speed=slew_delay_speed
+            slew_delay_speed=slew_delay_speed,
+            compile_repeated_layers=True,
             )
 
         self._layer_processing = LayerProcessing(
@@ -151,7 +152,7 @@ class CalibrationAPI(object):
         logger.info('Showing test pattern %s' % pattern)
         if pattern in self._test_patterns.keys():
             self._apply_calibration()
-            self._update_generator(self._test_patterns[pattern])
+            self._update_generator(LoopingPatternGenerator(self._test_patterns[pattern]))
         else:
             logger.error('Pattern: %s does not exist' % pattern)
             raise Exception('Pattern: %s does not exist' % pattern)
@@ -160,7 +161,7 @@ class CalibrationAPI(object):
     def show_scale(self):
         logger.info('Showing scale')
         self._unapply_calibration()
-        self._update_generator(self._scale_generator)
+        self._update_generator(LoopingPatternGenerator(self._scale_generator))
 
     def get_max_deflection(self):
         return self._configuration.calibration.max_deflection
@@ -241,14 +242,19 @@ class CalibrationAPI(object):
         self._controller.change_generator(self._current_generator)
 
     def _apply_calibration(self):
+        fit_cache = self._configuration.calibration.fit_cache
+        cached_fits = set(fit_cache)
         self._path_to_points.set_transformer(
             HomogenousTransformer(
                 self._configuration.calibration.max_deflection,
                 self._configuration.calibration.height,
                 self._configuration.calibration.lower_points,
-                self._configuration.calibration.upper_points
+                self._configuration.calibration.upper_points,
+                fit_cache=fit_cache,
                 )
             )
+        if set(fit_cache) != cached_fits:
+            self._configuration_manager.save(self._configuration)
 
     def _unapply_calibration(self):
         self._path_to_points.set_transformer(
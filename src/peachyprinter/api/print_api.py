@@ -11,9 +11,10 @@ from peachyprinter.infrastructure.zaxis import SerialDripZAxis
 from peachyprinter.domain.laser_control import LaserControl
 from peachyprinter.infrastructure.micro_disseminator import MicroDisseminator
 from peachyprinter.infrastructure.communicator import UsbPacketCommunicator, NullCommunicator
-from peachyprinter.infrastructure.gcode_layer_generator import GCodeReader
+from peachyprinter.infrastructure.gcode_layer_generator import GCodeReader, GCodeLayerIndex
+from peachyprinter.infrastructure.layer_cache import LayerCache
 from peachyprinter.infrastructure.transformer import HomogenousTransformer
-from peachyprinter.infrastructure.layer_generators import SubLayerGenerator, ShuffleGenerator, OverLapGenerator
+from peachyprinter.infrastructure.layer_generators import SubLayerGenerator, ShuffleGenerator, OverLapGenerator, TravelOptimizerGenerator, SimplifyGenerator
 from peachyprinter.infrastructure.commander import SerialCommander, NullCommander
 from peachyprinter.infrastructure.notification import EmailNotificationService, EmailGateway
 from peachyprinter.infrastructure.layer_control import LayerWriter, LayerProcessing
@@ -92,8 +93,25 @@ class PrintAPI(object):
 
     def print_gcode(self, file_name, print_sub_layers=True, dry_run=False, force_source_speed=False):
         self._current_file_name = file_name
+        reader_options = {
+            'scale': self._configuration.options.scaling_factor,
+            'start_height': self._start_height,
+            'chord_error': self._configuration.options.laser_thickness_mm / 2.0,
+            'samples_per_second': self._configuration.circut.data_rate,
+            }
+        if self._configuration.options.use_layer_cache and not dry_run:
+            layer_cache = LayerCache(max_size_mb=self._configuration.options.layer_cache_size_mb)
+            compiled_layers = layer_cache.get_layers(file_name, **reader_options)
+            if compiled_layers:
+                self._current_file = compiled_layers
+                self.print_layers(compiled_layers, print_sub_layers, dry_run, force_source_speed=force_source_speed)
+                return
         self._current_file = open(file_name, 'r')
-        gcode_reader = GCodeReader(self._current_file, scale=self._configuration.options.scaling_factor, start_height=self._start_height)
+        if self._start_height:
+            reader_options['layer_index'] = GCodeLayerIndex.load_or_build(file_name, scale=self._configuration.options.scaling_factor)
+        if self._configuration.options.use_chunked_gcode:
+            reader_options['chunked'] = True
+        gcode_reader = GCodeReader(self._current_file, **reader_options)
         gcode_layer_generator = gcode_reader.get_layers()
         layer_generator = gcode_layer_generator
         self.print_layers(layer_generator, print_sub_layers, dry_run, force_source_speed=force_source_speed)
@@ -128,7 +146,7 @@ class PrintAPI(object):
         if dry_run:
             self._communicator = NullCommunicator()
         else:
-            self._communicator = UsbPacketCommunicator(self._configuration.circut.print_queue_length)
+            self._communicator = UsbPacketCommunicator(self._configuration.circut.print_queue_length, self._configuration.circut.write_buffer_size, self._configuration.circut.use_loopback)
             self._communicator.start()
         return self._communicator
 
@@ -144,7 +162,13 @@ class PrintAPI(object):
         logger.info("Shuffled: %s" % self._configuration.options.use_shufflelayers)
         logger.info("Sublayered: %s" % self._configuration.options.use_sublayers)
         logger.info("Overlapped: %s" % self._configuration.options.use_overlap)
+        logger.info("Travel optimized: %s" % self._configuration.options.use_travel_optimizer)
+        logger.info("Simplified: %s" % self._configuration.options.use_simplification)
 
+        if self._configuration.options.use_simplification:
+            layer_generator = SimplifyGenerator(layer_generator, self._configuration.options.laser_thickness_mm / 2.0)
+        if self._configuration.options.use_travel_optimizer:
+            layer_generator = TravelOptimizerGenerator(layer_generator)
         if self._configuration.options.use_sublayers and print_sub_layers:
             layer_generator = SubLayerGenerator(layer_generator, self._configuration.options.sublayer_height_mm)
         if self._configuration.options.use_shufflelayers:
@@ -159,11 +183,13 @@ class PrintAPI(object):
 
         self.laser_control = LaserControl(self._configuration.cure_rate.override_laser_power_amount)
 
+        # Only the calibration API saves the fit cache, prints reuse the fit it saved
         transformer = HomogenousTransformer(
             self._configuration.calibration.max_deflection,
             self._configuration.calibration.height,
             self._configuration.calibration.lower_points,
             self._configuration.calibration.upper_points,
+            fit_cache=self._configuration.calibration.fit_cache,
             )
 
         state = MachineState()
@@ -214,7 +240,8 @@ class PrintAPI(object):
             override_move_speed=override_move_speed,
             wait_speed=wait_speed,
             post_fire_delay_speed=post_fire_delay_speed,
-            slew_delay_speed=slew_delay_speed
+            slew_delay_speed=slew_delay_speed,
+            hold_while_waiting=self._configuration.circut.use_hold_messages and not dry_run,
             )
 
         self._layer_processing = LayerProcessing(
@@ -242,6 +269,7 @@ class PrintAPI(object):
             layer_generator,
             self._status,
             abort_on_error=abort_on_error,
+            prefetch_layers=self._configuration.options.prefetch_layers,
             )
 
         self._controller.start()
@@ -249,6 +277,14 @@ class PrintAPI(object):
     def get_status(self):
         return self._controller.get_status()
 
+    '''Returns only what changed since cursor, which should be the cursor from the previous result or None for everything'''
+    def get_status_since(self, cursor=None):
+        return self._controller.get_status_since(cursor)
+
+    '''Pushes status events for the current print to call_back from a dispatch thread, see MachineStatus.subscribe'''
+    def subscribe(self, call_back, events=None, max_rate=10.0, queue_length=100):
+        return self._controller.subscribe(call_back, events=events, max_rate=max_rate, queue_length=queue_length)
+
     def can_set_drips_per_second(self):
         if getattr(self._zaxis, 'set_drips_per_second', False):
             return True
@@ -1,3 +1,6 @@
+import numpy
+import itertools
+
 
 class Command(object):
     pass
@@ -29,12 +32,180 @@ class VerticalMove(Command):
         return "MOVEVERTICAL[Start:%s,Stop:%s,Speed:%f]" % (self.start,self.end,self.speed)
 
 class Layer(object):
-    def __init__(self, z , commands = None):
+    '''repeats is set when this same layer will be handed out again, so it is worth compiling for replay.'''
+
+    def __init__(self, z , commands = None, repeats=False):
         if commands:
             self.commands = commands
         else:
             self.commands = [ ]
         self.z = z
+        self.repeats = repeats
+
+    def __str__(self):
+        return "Layer[Z:%f,Commands: %s]" % (self.z,[str(command) for command in self.commands])
+
+class SubLayer(object):
+    '''A layer drawn with the geometry of another layer at a different height. The geometry is shared, not copied,
+    so setting commands replaces this sublayer's geometry rather than changing the shared one. Drawing starts offset
+    commands into the geometry, wraps round to its beginning and finishes with the tail commands. repeats is set
+    when the next layer emitted draws the same geometry with the same offset and tail.'''
+
+    def __init__(self, geometry, z, offset=0, tail=None, repeats=False):
+        self.geometry = geometry
+        self.z = z
+        self.offset = offset
+        self.tail = tail if tail else []
+        self.repeats = repeats
+
+    @property
+    def z_offset(self):
+        return self.z - self.geometry.z
+
+    @property
+    def commands(self):
+        if not self.offset and not self.tail:
+            return self.geometry.commands
+        return LayerCommandsView(self.geometry.commands, self.offset, self.tail)
+
+    @commands.setter
+    def commands(self, commands):
+        self.geometry = Layer(self.geometry.z, commands=list(commands))
+        self.offset = 0
+        self.tail = []
+        self.repeats = False
 
     def __str__(self):
-        return "Layer[Z:%f,Commands: %s]" % (self.z,[str(command) for command in self.commands])
\ No newline at end of file
+        return "SubLayer[Z:%f,Offset:%d,Geometry: %s,Tail: %s]" % (self.z, self.offset, str(self.geometry), [str(command) for command in self.tail])
+
+
+class LayerCommandsView(object):
+    '''Read only sequence of commands starting offset commands in and wrapping round, followed by tail commands.'''
+
+    def __init__(self, commands, offset, tail):
+        self._commands = commands
+        self._offset = offset
+        self._tail = tail
+
+    def __len__(self):
+        return len(self._commands) + len(self._tail)
+
+    def __iter__(self):
+        return itertools.chain(
+            itertools.islice(iter(self._commands), self._offset, None),
+            itertools.islice(iter(self._commands), self._offset),
+            self._tail,
+            )
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("command index out of range")
+        count = len(self._commands)
+        if index >= count:
+            return self._tail[index - count]
+        return self._commands[(index + self._offset) % count]
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+class ArrayLayer(object):
+    DRAW = 0
+    MOVE = 1
+    _KINDS = {LateralDraw: DRAW, LateralMove: MOVE}
+    _COMMANDS = {DRAW: LateralDraw, MOVE: LateralMove}
+
+    def __init__(self, z, starts=None, ends=None, speeds=None, kinds=None):
+        self.z = z
+        self.repeats = False
+        self.starts = numpy.asarray(starts if starts is not None else [], dtype=numpy.float64).reshape(-1, 2)
+        self.ends = numpy.asarray(ends if ends is not None else [], dtype=numpy.float64).reshape(-1, 2)
+        self.speeds = numpy.asarray(speeds if speeds is not None else [], dtype=numpy.float64).reshape(-1)
+        self.kinds = numpy.asarray(kinds if kinds is not None else [], dtype=numpy.uint8).reshape(-1)
+        if not (len(self.starts) == len(self.ends) == len(self.speeds) == len(self.kinds)):
+            raise Exception("Layer arrays must be the same length")
+
+    @classmethod
+    def from_commands(cls, z, commands):
+        kinds = []
+        for command in commands:
+            if type(command) not in cls._KINDS:
+                raise Exception("Command not supported in array layer: %s" % command)
+            kinds.append(cls._KINDS[type(command)])
+        return cls(
+            z,
+            [command.start for command in commands],
+            [command.end for command in commands],
+            [command.speed for command in commands],
+            kinds,
+            )
+
+    @classmethod
+    def from_layer(cls, layer):
+        return cls.from_commands(layer.z, list(layer.commands))
+
+    def to_layer(self):
+        return Layer(self.z, list(self.commands))
+
+    @property
+    def commands(self):
+        return ArrayLayerCommands(self)
+
+    @commands.setter
+    def commands(self, commands):
+        other = ArrayLayer.from_commands(self.z, list(commands))
+        self.starts, self.ends, self.speeds, self.kinds = other.starts, other.ends, other.speeds, other.kinds
+
+    @property
+    def draws(self):
+        return self.kinds == self.DRAW
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def segments(self, chunk_size=4096):
+        for offset in range(0, len(self.kinds), chunk_size):
+            chunk = slice(offset, offset + chunk_size)
+            for segment in zip(self.kinds[chunk].tolist(), self.starts[chunk].tolist(), self.ends[chunk].tolist(), self.speeds[chunk].tolist()):
+                yield segment
+
+    def command(self, index):
+        kind = int(self.kinds[index])
+        return self._COMMANDS[kind](self.starts[index].tolist(), self.ends[index].tolist(), float(self.speeds[index]))
+
+    def __str__(self):
+        return "ArrayLayer[Z:%f,Commands: %s]" % (self.z, [str(command) for command in self.commands])
+
+
+class ArrayLayerCommands(object):
+    def __init__(self, layer):
+        self._layer = layer
+
+    def __len__(self):
+        return len(self._layer)
+
+    def __iter__(self):
+        command_types = self._layer._COMMANDS
+        for (kind, start, end, speed) in self._layer.segments():
+            yield command_types[kind](start, end, speed)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._layer.command(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("command index out of range")
+        return self._layer.command(index)
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
@@ -1,10 +1,25 @@
 class Disseminator(object):
-    def process(self, data):
+    def process(self, data, laser_powers=None):
         raise NotImplementedError()
 
+    def hold(self, position, samples):
+        self.process([position] * samples)
+
     def next_layer(self, height):
         raise NotImplementedError()
 
+    def flush(self):
+        pass
+
+    def start_recording(self):
+        pass
+
+    def stop_recording(self):
+        return None
+
+    def replay(self, frames):
+        raise NotImplementedError()
+
     @property
     def samples_per_second(self):
         raise NotImplementedError()
@@ -18,3 +18,6 @@ class LaserControl:
 
     def laser_power(self):
         return self._laser_power
+
+    def default_laser_power(self):
+        return self._default_laser_power
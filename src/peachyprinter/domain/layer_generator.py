@@ -35,6 +35,9 @@ class TestLayerGenerator(LayerGenerator):
         except ValueError:
             return False
 
+    def settings(self):
+        return (self._speed, self._radius, self._current_height)
+
     def set_speed(self, speed):
         if (self._is_positive_float(speed)):
             self._speed = speed
@@ -1,3 +1,11 @@
+import numpy
+
+
 class Transformer(object):
     def transform(self, xyz):
         raise NotImplementedException
+
+    def transform_many(self, xyz):
+        '''Transforms an (N, 3) array of points returning an (N, 2) array and the number of points clipped to the printable area'''
+        transformed = [self.transform(point)[:2] for point in numpy.asarray(xyz, dtype=float).reshape(-1, 3)]
+        return numpy.array(transformed, dtype=float).reshape(-1, 2), 0
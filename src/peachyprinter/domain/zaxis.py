@@ -1,7 +1,11 @@
+import threading
+import time
+
 
 class ZAxis(object):
     def __init__(self, starting_height):
         self._starting_height = starting_height
+        self._height_changed = threading.Condition()
 
     def current_z_location_mm():
         raise NotImplementedError('current_z_location_mm unimplmented')
@@ -17,3 +21,33 @@ class ZAxis(object):
  
     def start(self):
         pass
+
+    def wait_for_height(self, height_mm, timeout=None, cancelled=None):
+        '''Blocks until the axis reaches height_mm, timeout seconds pass or cancelled returns True, returning True if
+        the height was reached. A timeout of None waits as long as it takes. Wakes as soon as an implementation calls
+        _height_updated, when interrupt is called, or when _seconds_until_height predicts arrival.'''
+        until = None if timeout is None else time.time() + timeout
+        with self._height_changed:
+            while self.current_z_location_mm() < height_mm:
+                if cancelled and cancelled():
+                    return False
+                remaining = None if until is None else until - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                predicted = self._seconds_until_height(height_mm)
+                if predicted is not None:
+                    predicted = max(predicted, 0.001)
+                    remaining = predicted if remaining is None else min(remaining, predicted)
+                self._height_changed.wait(remaining)
+            return True
+
+    def interrupt(self):
+        '''Wakes anything blocked in wait_for_height so it can check whether it was cancelled.'''
+        self._height_updated()
+
+    def _seconds_until_height(self, height_mm):
+        return None
+
+    def _height_updated(self):
+        with self._height_changed:
+            self._height_changed.notify_all()
@@ -1,9 +1,11 @@
 import logging
 import time
-from messages import ProtoBuffableMessage
+import threading
+from messages import ProtoBuffableMessage, MoveMessage
 import Queue as queue
 from Queue import Empty
 from peachyprinter.infrastructure.peachyusb import PeachyUSB, PeachyUSBException
+from peachyprinter.infrastructure.peachyusb_loopback import LoopbackPeachyUSB
 
 logger = logging.getLogger('peachy')
 
@@ -12,6 +14,12 @@ class Communicator(object):
     def send(self, message):
         raise NotImplementedError()
 
+    def send_frames(self, frames):
+        raise NotImplementedError()
+
+    def flush(self):
+        pass
+
     def register_handler(self, message_type, handler):
         raise NotImplementedError()
 
@@ -21,28 +29,44 @@ class MissingPrinterException(Exception):
 
 
 class UsbPacketCommunicator(Communicator):
-    def __init__(self, queue_size):
+    def __init__(self, queue_size, buffer_size=0, loopback=False):
         self._handlers = {}
         self._device = None
         self.sent_bytes = 0
+        self.sent_batches = 0
         self.last_sent_time = time.time()
         self.send_time = 0
         self._detached = False
         self._queue_size = queue_size
-        logger.info("Starting Usb Communications. Queue: {0:d}".format(self._queue_size))
+        self._buffer_size = buffer_size
+        self._loopback = loopback or LoopbackPeachyUSB.enabled()
+        self._buffer = bytearray(buffer_size)
+        self._buffered = 0
+        self._lock = threading.Lock()
+        logger.info("Starting Usb Communications. Queue: {0:d} Buffer: {1:d}".format(self._queue_size, self._buffer_size))
 
     def __del__(self):
         self.close()
 
     def start(self):
-        self._device = PeachyUSB(self._queue_size)
+        if self._loopback:
+            self._device = LoopbackPeachyUSB.from_environment(self._queue_size)
+        else:
+            self._device = PeachyUSB(self._queue_size)
         self._device.set_read_callback(self._process)
         if not self._device:
             raise MissingPrinterException()
 
     def close(self):
+        if not self._detached:
+            try:
+                self.flush()
+            except MissingPrinterException:
+                pass
         dev = self._device
         self._device = None
+        if dev:
+            dev.close()
         del dev
 
     def _process(self, data, length):
@@ -58,31 +82,77 @@ class UsbPacketCommunicator(Communicator):
             raise MissingPrinterException(self._detached)
         self._send(message)
 
+    def send_frames(self, frames):
+        if self._detached:
+            raise MissingPrinterException(self._detached)
+        with self._lock:
+            if self._buffer_size:
+                self._buffer_frames(frames)
+            else:
+                self._write_each(frames)
+
+    def flush(self):
+        if self._detached:
+            raise MissingPrinterException(self._detached)
+        with self._lock:
+            self._flush()
+
     def _send(self, message):
+        if message.TYPE_ID == 99:
+            if self._device:
+                time.sleep(1.0 / 2000.0)
+            return
+        with self._lock:
+            if self._buffer_size and message.TYPE_ID == MoveMessage.TYPE_ID:
+                self._buffer_frames(message.frame())
+            else:
+                self._flush()
+                self._write(message.frame())
+
+    def _buffer_frames(self, frames):
+        if self._buffered + len(frames) > self._buffer_size:
+            self._flush()
+        if len(frames) > self._buffer_size:
+            self._write(frames)
+        else:
+            self._buffer[self._buffered:self._buffered + len(frames)] = frames
+            self._buffered += len(frames)
+
+    def _write_each(self, frames):
+        index = 0
+        while index < len(frames):
+            end = index + 1 + ord(frames[index])
+            self._write(frames[index:end])
+            index = end
+
+    def _flush(self):
+        if self._buffered:
+            data = str(self._buffer[:self._buffered])
+            self._buffered = 0
+            self._write(data)
+
+    def _write(self, data):
         if not self._device:
             return
         try:
-            if message.TYPE_ID != 99:
-                per_start_time = time.time()
-                data = chr(message.TYPE_ID) + message.get_bytes()
-                data = chr(len(data)) + data
-                self._device.write(data)
-                per_end_time = time.time() - per_start_time
-                self.send_time = self.send_time + per_end_time
-                self.sent_bytes += len(data)
-                if self.sent_bytes > 100000:
-                    seconds = time.time() - self.last_sent_time
-                    real_time_per_byte = (seconds * 1000.0) / (self.sent_bytes / 1024)
-                    cpu_time_per_byte = (self.send_time * 1000.0) / (self.sent_bytes / 1024)
-                    bps = self.sent_bytes / seconds
-                    self.last_sent_time = time.time()
-                    self.send_time = 0
-                    self.sent_bytes = 0
-                    logger.info("Real Time   : %.2f uspKB" % real_time_per_byte)
-                    logger.info("CPU Time    : %.2f uspKB" % cpu_time_per_byte)
-                    logger.info("Bytes       : %.2f bps" % bps)
-            else:
-                time.sleep(1.0 / 2000.0)
+            per_start_time = time.time()
+            self._device.write(data)
+            per_end_time = time.time() - per_start_time
+            self.send_time = self.send_time + per_end_time
+            self.sent_bytes += len(data)
+            self.sent_batches += 1
+            if self.sent_bytes > 100000:
+                seconds = time.time() - self.last_sent_time
+                bytes_per_batch = float(self.sent_bytes) / self.sent_batches
+                cpu_time_per_batch = (self.send_time * 1000000.0) / self.sent_batches
+                bps = self.sent_bytes / seconds
+                logger.info("Batches     : %d of %.0f bytes" % (self.sent_batches, bytes_per_batch))
+                logger.info("CPU Time    : %.2f us per batch" % cpu_time_per_batch)
+                logger.info("Bytes       : %.2f bps" % bps)
+                self.last_sent_time = time.time()
+                self.send_time = 0
+                self.sent_bytes = 0
+                self.sent_batches = 0
 
         except (PeachyUSBException), e:
             if e.value == -1 or e.value == -4:
@@ -104,5 +174,8 @@ class NullCommunicator(Communicator):
     def send(self, message):
         pass
 
+    def send_frames(self, frames):
+        pass
+
     def register_handler(self, message_type, handler):
         pass
@@ -33,6 +33,9 @@ class CircutConfiguration(ConfigurationBase):
         self._data_rate = self.get(source, u'data_rate', 0)
         self._print_queue_length = self.get(source, u'print_queue_length', 500)
         self._calibration_queue_length = self.get(source, u'calibration_queue_length', 50)
+        self._write_buffer_size = self.get(source, u'write_buffer_size', 0)
+        self._use_loopback = self.get(source, u'use_loopback', False)
+        self._use_hold_messages = self.get(source, u'use_hold_messages', False)
 
     @property
     def software_revision(self):
@@ -106,6 +109,42 @@ class CircutConfiguration(ConfigurationBase):
         else:
             raise ValueError("calibration_queue_length must be of type %s was %s" % (_type, type(value)))
 
+    @property
+    def write_buffer_size(self):
+        return self._write_buffer_size
+
+    @write_buffer_size.setter
+    def write_buffer_size(self, value):
+        _type = types.IntType
+        if type(value) == _type:
+            self._write_buffer_size = value
+        else:
+            raise ValueError("write_buffer_size must be of type %s was %s" % (_type, type(value)))
+
+    @property
+    def use_loopback(self):
+        return self._use_loopback
+
+    @use_loopback.setter
+    def use_loopback(self, value):
+        _type = types.BooleanType
+        if type(value) == _type:
+            self._use_loopback = value
+        else:
+            raise ValueError("use_loopback must be of type %s was %s" % (_type, type(value)))
+
+    @property
+    def use_hold_messages(self):
+        return self._use_hold_messages
+
+    @use_hold_messages.setter
+    def use_hold_messages(self, value):
+        _type = types.BooleanType
+        if type(value) == _type:
+            self._use_hold_messages = value
+        else:
+            raise ValueError("use_hold_messages must be of type %s was %s" % (_type, type(value)))
+
 
 class CureRateConfiguration(ConfigurationBase):
     def __init__(self, source={}):
@@ -348,6 +387,12 @@ class OptionsConfiguration(ConfigurationBase):
         self._wait_after_move_milliseconds = self.get(source, u'wait_after_move_milliseconds', 20)
         self._write_wav_files = self.get(source, u'write_wav_files', False)
         self._write_wav_files_folder = self.get(source, u'write_wav_files_folder', 'tmp')
+        self._use_chunked_gcode = self.get(source, u'use_chunked_gcode', False)
+        self._use_simplification = self.get(source, u'use_simplification', False)
+        self._use_travel_optimizer = self.get(source, u'use_travel_optimizer', False)
+        self._prefetch_layers = self.get(source, u'prefetch_layers', 0)
+        self._layer_cache_size_mb = self.get(source, u'layer_cache_size_mb', 500)
+        self._use_layer_cache = self.get(source, u'use_layer_cache', False)
 
     @property
     def write_wav_files(self):
@@ -558,6 +603,78 @@ class OptionsConfiguration(ConfigurationBase):
         else:
             raise ValueError("print_queue_delay must be of %s" % (str(_type)))
 
+    @property
+    def use_layer_cache(self):
+        return self._use_layer_cache
+
+    @use_layer_cache.setter
+    def use_layer_cache(self, value):
+        _type = types.BooleanType
+        if type(value) == _type:
+            self._use_layer_cache = value
+        else:
+            raise ValueError("use_layer_cache must be of %s" % (str(_type)))
+
+    @property
+    def layer_cache_size_mb(self):
+        return self._layer_cache_size_mb
+
+    @layer_cache_size_mb.setter
+    def layer_cache_size_mb(self, value):
+        _type = types.IntType
+        if type(value) == _type:
+            self._layer_cache_size_mb = value
+        else:
+            raise ValueError("layer_cache_size_mb must be of %s" % (str(_type)))
+
+    @property
+    def prefetch_layers(self):
+        return self._prefetch_layers
+
+    @prefetch_layers.setter
+    def prefetch_layers(self, value):
+        _type = types.IntType
+        if type(value) == _type:
+            self._prefetch_layers = value
+        else:
+            raise ValueError("Prefetch layers must be of %s" % (str(_type)))
+
+    @property
+    def use_travel_optimizer(self):
+        return self._use_travel_optimizer
+
+    @use_travel_optimizer.setter
+    def use_travel_optimizer(self, value):
+        _type = types.BooleanType
+        if type(value) == _type:
+            self._use_travel_optimizer = value
+        else:
+            raise ValueError("use_travel_optimizer must be of %s" % (str(_type)))
+
+    @property
+    def use_simplification(self):
+        return self._use_simplification
+
+    @use_simplification.setter
+    def use_simplification(self, value):
+        _type = types.BooleanType
+        if type(value) == _type:
+            self._use_simplification = value
+        else:
+            raise ValueError("use_simplification must be of %s" % (str(_type)))
+
+    @property
+    def use_chunked_gcode(self):
+        return self._use_chunked_gcode
+
+    @use_chunked_gcode.setter
+    def use_chunked_gcode(self, value):
+        _type = types.BooleanType
+        if type(value) == _type:
+            self._use_chunked_gcode = value
+        else:
+            raise ValueError("use_chunked_gcode must be of %s" % (str(_type)))
+
 
 class DripperConfiguration(ConfigurationBase):
     def __init__(self, source={}):
@@ -640,6 +757,7 @@ class CalibrationConfiguration(ConfigurationBase):
         self._flip_x_axis = self.get(source, u'flip_x_axis', False)
         self._flip_y_axis = self.get(source, u'flip_y_axis', False)
         self._swap_axis = self.get(source, u'swap_axis', False)
+        self._fit_cache = dict(self.get(source, u'fit_cache', {}))
 
     @property
     def print_area_x(self):
@@ -761,6 +879,18 @@ class CalibrationConfiguration(ConfigurationBase):
         else:
             raise ValueError("Max Deflection must be of %s" % (str(_type)))
 
+    @property
+    def fit_cache(self):
+        return self._fit_cache
+
+    @fit_cache.setter
+    def fit_cache(self, value):
+        _type = types.DictType
+        if type(value) == _type:
+            self._fit_cache = value
+        else:
+            raise ValueError("fit_cache must be of type %s" % str(_type))
+
 
 class SerialConfiguration(ConfigurationBase):
     def __init__(self, source={}):
@@ -929,6 +1059,12 @@ class ConfigurationGenerator(object):
         configuration.options.use_overlap                  = False
         configuration.options.print_queue_delay            = 0.0
         configuration.options.pre_layer_delay              = 0.0
+        configuration.options.use_chunked_gcode            = False
+        configuration.options.use_simplification           = False
+        configuration.options.use_travel_optimizer         = False
+        configuration.options.prefetch_layers              = 0
+        configuration.options.layer_cache_size_mb          = 500
+        configuration.options.use_layer_cache              = False
 
         configuration.dripper.drips_per_mm                 = 280.0
         configuration.dripper.max_lead_distance_mm         = 1.0
@@ -940,6 +1076,7 @@ class ConfigurationGenerator(object):
         configuration.calibration.height                   = 40.0
         configuration.calibration.lower_points             = {(1.0, 1.0):( 40.0,  40.0), ( 1.0, 0.0):( 40.0, -40.0), (0.0, 0.0):( -40.0, -40.0), (0.0, 1.0):(-40.0, 40.0)}
         configuration.calibration.upper_points             = {(1.0, 1.0):( 30.0,  30.0), ( 1.0, 0.0):( 30.0, -30.0), (0.0, 0.0):( -30.0, -30.0), (0.0, 1.0):(-30.0, 30.0)}
+        configuration.calibration.fit_cache                = {}
 
         configuration.serial.on                            = False
         configuration.serial.port                          = "COM2"
@@ -969,5 +1106,8 @@ class ConfigurationGenerator(object):
         configuration.circut.data_rate                     = 0
         configuration.circut.print_queue_length            = 500
         configuration.circut.calibration_queue_length      = 50
+        configuration.circut.write_buffer_size             = 0
+        configuration.circut.use_loopback                  = False
+        configuration.circut.use_hold_messages             = False
 
         return configuration
@@ -2,7 +2,7 @@ import os
 import json
 import types
 import logging
-import time
+import threading
 logger = logging.getLogger('peachy')
 import re
 
@@ -19,9 +19,11 @@ class CircutSourcedConfigurationManager(ConfigurationManager):
     def __init__(self):
         self.printer_details = None
         self.usb_queue_length = 50
+        self._identified = threading.Event()
 
     def _ident_call_back(self, message):
         self.printer_details = message
+        self._identified.set()
 
     def load(self, printer_name=None):
         if printer_name is not None:
@@ -78,12 +80,11 @@ class CircutSourcedConfigurationManager(ConfigurationManager):
 
     def _get_printer_details(self):
         communicator = UsbPacketCommunicator(self.usb_queue_length)
+        self._identified.clear()
         communicator.register_handler(IAmMessage, self._ident_call_back)
         communicator.start()
         communicator.send(IdentifyMessage())
-        until = time.time() + 5.0
-        while (not self.printer_details and time.time() < until):
-            time.sleep(0.1)
+        self._identified.wait(5.0)
         communicator.close()
         if not self.printer_details:
             raise MissingPrinterException()
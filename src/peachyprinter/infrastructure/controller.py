@@ -6,6 +6,7 @@ import traceback
 from peachyprinter.domain.commands import *
 from peachyprinter.infrastructure.machine import MachineError
 from peachyprinter.infrastructure.communicator import MissingPrinterException
+from peachyprinter.infrastructure.layer_prefetcher import LayerPrefetcher
 
 class Controller(threading.Thread,):
     def __init__(self,
@@ -14,6 +15,7 @@ class Controller(threading.Thread,):
                  layer_generator,
                  status,
                  abort_on_error=True,
+                 prefetch_layers=0,
                  ):
         threading.Thread.__init__(self)
 
@@ -24,7 +26,8 @@ class Controller(threading.Thread,):
         self._failed = False
 
         self._abort_on_error = abort_on_error
-        self._layer_generator = layer_generator
+        self._prefetch_layers = prefetch_layers
+        self._layer_generator = self._prefetch(layer_generator)
         self._layer_processing = layer_processer
         self._writer = layer_writer
         self._status = status
@@ -36,6 +39,8 @@ class Controller(threading.Thread,):
         with self._run_lock:
             logger.info('Running Controller')
             self._process_layers()
+            with self._generator_lock:
+                self._close_prefetch(self._layer_generator)
             if self._failed:
                 self._status.set_failed()
             elif self._complete:
@@ -50,36 +55,62 @@ class Controller(threading.Thread,):
         logger.info("Generator change requested")
         with self._generator_lock:
             self._layer_processing.abort_current_command()
-            self._layer_generator = layer_generator
+            self._close_prefetch(self._layer_generator)
+            self._layer_generator = self._prefetch(layer_generator)
 
     def get_status(self):
         return self._status.status()
 
+    def get_status_since(self, cursor=None):
+        return self._status.status_since(cursor)
+
+    def subscribe(self, call_back, **kwargs):
+        return self._status.subscribe(call_back, **kwargs)
+
     def close(self):
         logger.info('Controller shutdown requested')
         self._shutting_down = True
         self._layer_processing.abort_current_command()
         self._run_lock.acquire()
         self._run_lock.release()
+        self._status.close()
 
     def _process_layers(self):
         while not self._shutting_down:
             try:
                 with self._generator_lock:
                     layer = self._layer_generator.next()
+                    self._update_prefetch_status()
                 self._layer_processing.process(layer)
             except StopIteration:
                 logger.info('Layers Complete')
                 self._complete = True
                 return
             except MissingPrinterException as mpe:
-                self._status.add_error(MachineError(str(mpe), self._status.status()['current_layer']))
+                self._status.add_error(MachineError(str(mpe), self._status.current_layer))
                 self._failed = True
                 logger.error('Unexpected Error: %s' % str(mpe))
                 return
             except Exception as ex:
-                self._status.add_error(MachineError(str(ex), self._status.status()['current_layer']))
+                self._status.add_error(MachineError(str(ex), self._status.current_layer))
                 logger.error('Unexpected Error: %s' % str(ex))
                 traceback.print_exc()
                 if self._abort_on_error:
                     return
+
+    def _prefetch(self, layer_generator):
+        if self._prefetch_layers > 0:
+            return LayerPrefetcher(layer_generator, self._prefetch_layers)
+        return layer_generator
+
+    def _close_prefetch(self, layer_generator):
+        if isinstance(layer_generator, LayerPrefetcher):
+            layer_generator.close()
+
+    def _update_prefetch_status(self):
+        if isinstance(self._layer_generator, LayerPrefetcher):
+            self._status.set_layer_queue(
+                self._layer_generator.queue_depth,
+                self._layer_generator.producer_stall_time,
+                self._layer_generator.consumer_stall_time,
+                )
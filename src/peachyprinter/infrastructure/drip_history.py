@@ -0,0 +1,100 @@
+import math
+import time
+import numpy
+import logging
+logger = logging.getLogger('peachy')
+
+
+class DripHistory(object):
+    '''Fixed size record of drip times. Times are written twice into a buffer of double the length so the
+    retained history is always one contiguous slice, handed out as a read only view without copying.
+    Rolling rates are kept for each window in rate_windows by advancing a start index per window, and
+    an exponentially weighted rate with a time constant of ewma_seconds is updated on every drip.'''
+
+    DEFAULT_RATE_WINDOWS = (1.0, 10.0, 60.0)
+
+    def __init__(self, length=500, rate_windows=DEFAULT_RATE_WINDOWS, ewma_seconds=5.0):
+        if length < 1:
+            raise Exception("Drip history length must be at least 1")
+        if not rate_windows or min(rate_windows) <= 0:
+            raise Exception("Drip rate windows must be greater then 0")
+        if ewma_seconds <= 0:
+            raise Exception("Drip rate time constant must be greater then 0")
+        self._length = length
+        self._rate_windows = tuple(rate_windows)
+        self._ewma_seconds = float(ewma_seconds)
+        self._buffer = numpy.zeros(length * 2)
+        self.reset()
+
+    def reset(self):
+        self._count = 0
+        self._window_starts = [0] * len(self._rate_windows)
+        self._ewma = 0.0
+
+    def __len__(self):
+        return min(self._count, self._length)
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def rate_windows(self):
+        return self._rate_windows
+
+    @property
+    def latest(self):
+        if not self._count:
+            return None
+        return self._buffer[(self._count - 1) % self._length]
+
+    @property
+    def view(self):
+        '''Retained drip times, oldest first. The view is only valid until the next append; copy it to keep it.'''
+        size = len(self)
+        start = (self._count - size) % self._length
+        view = self._buffer[start:start + size]
+        view.flags.writeable = False
+        return view
+
+    def append(self, timestamp, drips=1):
+        if drips <= 0:
+            return
+        latest = self.latest
+        written = min(drips, self._length)
+        positions = numpy.arange(self._count + drips - written, self._count + drips) % self._length
+        self._buffer[positions] = timestamp
+        self._buffer[positions + self._length] = timestamp
+        self._count += drips
+        if latest is not None and timestamp > latest:
+            seconds = timestamp - latest
+            weight = 1.0 - math.exp(-seconds / self._ewma_seconds)
+            self._ewma += weight * (drips / seconds - self._ewma)
+
+    def average(self, drips):
+        '''Drips per second across the last drips entries, 0.0 until that many have been recorded.'''
+        if len(self) < drips:
+            return 0.0
+        seconds = self.latest - self._buffer[(self._count - drips) % self._length]
+        if seconds > 0:
+            return drips / seconds
+        return 0.0
+
+    @property
+    def ewma(self):
+        return self._ewma
+
+    def rates(self, now=None):
+        '''Drips per second over each rate window ending at now. Each window only ever moves forward, so calls
+        with increasing times are amortized constant time.'''
+        now = time.time() if now is None else now
+        oldest = self._count - len(self)
+        rates = {}
+        for index, window in enumerate(self._rate_windows):
+            start = max(self._window_starts[index], oldest)
+            cutoff = now - window
+            while start < self._count and self._buffer[start % self._length] <= cutoff:
+                start += 1
+            self._window_starts[index] = start
+            rates[window] = (self._count - start) / window
+        return rates
@@ -1,4 +1,10 @@
+import bisect
 import collections
+import json
+import math
+import os
+import re
+import numpy
 from peachyprinter.domain.commands import *
 from peachyprinter.domain.layer_generator import LayerGenerator
 import logging
@@ -6,23 +12,221 @@ logger = logging.getLogger('peachy')
 
 
 class GCodeReader(object):
-    def __init__(self, file_object, scale=1.0, start_height=None):
+    def __init__(self, file_object, scale=1.0, start_height=None, layer_index=None, chunked=False, chord_error=None, samples_per_second=None):
         self._start_height = start_height
+        self._layer_index = layer_index
+        self._chunked = chunked
+        self._chord_error = chord_error
+        self._samples_per_second = samples_per_second
         self.file_object = file_object
         self.scale = scale
 
     def check(self):
-        layers = GCodeToLayerGenerator(self.file_object, scale=self.scale, start_height=self._start_height)
+        layers = self._layer_generator()
         for layer in layers:
             pass
         return layers.errors
 
     def get_layers(self):
-        return GCodeToLayerGenerator(self.file_object, scale=self.scale, start_height=self._start_height)
+        return self._layer_generator()
+
+    def _layer_generator(self):
+        options = {'scale': self.scale, 'start_height': self._start_height}
+        if self._layer_index:
+            options['layer_index'] = self._layer_index
+        if self._chunked:
+            options['chunked'] = True
+        if self._chord_error:
+            options['chord_error'] = self._chord_error
+        if self._samples_per_second:
+            options['samples_per_second'] = self._samples_per_second
+        return GCodeToLayerGenerator(self.file_object, **options)
+
+
+class GCodeLayerIndex(object):
+    VERSION = 1
+    SUFFIX = '.layerindex'
+
+    def __init__(self, entries, scale=1.0, size=None, mtime=None):
+        self.entries = entries
+        self._heights = [entry['z'] for entry in entries]
+        self.scale = scale
+        self.size = size
+        self.mtime = mtime
+
+    @classmethod
+    def build(cls, file_object, scale=1.0):
+        reader = GCodeCommandReader(scale=scale)
+        entries = []
+        offset = 0
+        line_number = 0
+        for line in iter(file_object.readline, ''):
+            line_offset = offset
+            offset += len(line)
+            line_number += 1
+            gcode = line.strip()
+            if not gcode.startswith('G'):
+                continue
+            details = gcode.split(' ')
+            if details[0] == 'G20':
+                reader._units_inches(gcode)
+            elif details[0] == 'G21':
+                reader._units_mm(gcode)
+            elif details[0] in reader._COMMAND_HANDLERS:
+                x_mm, y_mm, z_mm, feed_rate = cls._scan_draw(reader, details)
+                if details[0] in reader._ARC_COMMANDS:
+                    # Arcs leave an omitted axis where it was rather than ignoring the move.
+                    x_mm = reader._current_xy[0] if x_mm is None else x_mm
+                    y_mm = reader._current_xy[1] if y_mm is None else y_mm
+                if z_mm is not None and (not entries or z_mm > entries[-1]['z']):
+                    # The layer starts at this line so it is recorded with
+                    # the state from before the line was parsed. Lower or
+                    # repeated heights are ignored as the reader ignores them.
+                    entries.append(dict(reader.get_state(), z=z_mm, offset=line_offset, line=line_number - 1))
+                if feed_rate is not None:
+                    reader._mm_per_s = reader._to_mm_per_second(feed_rate)
+                if z_mm is not None:
+                    if not (reader._current_z_pos and reader._current_z_pos > z_mm):
+                        reader._update_layer_height(reader._current_z_pos, z_mm)
+                        reader._current_z_pos = z_mm
+                    if x_mm is not None or y_mm is not None:
+                        reader._current_xy = [x_mm, y_mm]
+                elif x_mm is not None and y_mm is not None:
+                    reader._current_xy = [x_mm, y_mm]
+        return cls(entries, scale)
+
+    @classmethod
+    def _scan_draw(cls, reader, details):
+        x_mm, y_mm, z_mm, feed_rate = None, None, None, None
+        for detail in details[1:]:
+            try:
+                if detail[0] == 'X':
+                    x_mm = reader._to_mm(float(detail[1:])) * reader.scale
+                elif detail[0] == 'Y':
+                    y_mm = reader._to_mm(float(detail[1:])) * reader.scale
+                elif detail[0] == 'Z':
+                    z_mm = reader._to_mm(float(detail[1:])) * reader.scale
+                elif detail[0] == 'F':
+                    feed_rate = float(detail[1:])
+            except (IndexError, ValueError):
+                pass
+        return x_mm, y_mm, z_mm, feed_rate
+
+    @classmethod
+    def index_file_name(cls, file_name):
+        return file_name + cls.SUFFIX
+
+    @classmethod
+    def load_or_build(cls, file_name, scale=1.0):
+        stat = os.stat(file_name)
+        index_file_name = cls.index_file_name(file_name)
+        try:
+            with open(index_file_name, 'r') as index_file:
+                data = json.load(index_file)
+            if (data['version'] == cls.VERSION and data['scale'] == scale and
+                    data['size'] == stat.st_size and data['mtime'] == stat.st_mtime):
+                return cls(data['entries'], scale, stat.st_size, stat.st_mtime)
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+        logger.info("Building layer index for %s" % file_name)
+        with open(file_name, 'rb') as gcode_file:
+            layer_index = cls.build(gcode_file, scale)
+        layer_index.size = stat.st_size
+        layer_index.mtime = stat.st_mtime
+        try:
+            with open(index_file_name, 'w') as index_file:
+                json.dump(layer_index.to_dict(), index_file)
+        except (IOError, OSError) as ex:
+            logger.warning("Could not save layer index %s: %s" % (index_file_name, ex))
+        return layer_index
+
+    def to_dict(self):
+        return {'version': self.VERSION, 'scale': self.scale, 'size': self.size, 'mtime': self.mtime, 'entries': self.entries}
+
+    def entry_for_height(self, height):
+        position = bisect.bisect_left(self._heights, height)
+        if position < len(self.entries):
+            return self.entries[position]
+        return None
+
+
+class GCodeLine(object):
+    def __init__(self, line_number, gcode):
+        self.line_number = line_number
+        self.gcode = gcode
+
+
+class GCodeRun(object):
+    def __init__(self, line_numbers, x, y, feed_rate, extrude):
+        self.line_numbers = line_numbers
+        self.x = x
+        self.y = y
+        self.feed_rate = feed_rate
+        self.extrude = extrude
+
+    def __len__(self):
+        return len(self.line_numbers)
+
+
+class GCodeChunkTokenizer(object):
+    '''Reads G-code in large blocks rather than line by line. A single regular expression pass over each block
+    yields one row of fields per line: blank, comment and machine lines come back empty, G0/G1 lines with their
+    F, X, Y, E, F fields in that order come back as columns, and anything else comes back whole. Runs of G0/G1
+    lines are returned as a GCodeRun of field columns and every other line as a GCodeLine for the command reader.'''
+
+    CHUNK_SIZE = 1024 * 1024
+    _NUMBER = r'([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)'
+    _LINE = re.compile(
+        r'^[ \t]*(?:'
+        r'(?:[;MO]|G90)[^\n]*|'
+        r'(G(?:0|1|01))(?: F%(n)s)?(?: X%(n)s)?(?: Y%(n)s)?(?: E%(n)s)?(?: F%(n)s)?|'
+        r'([^\n]*?)'
+        r')[ \t\r]*$' % {'n': _NUMBER}, re.M)
+
+    def __init__(self, file_object, line_number=0, chunk_size=None):
+        self._file_object = file_object
+        self._chunk_size = chunk_size or self.CHUNK_SIZE
+        self._remainder = ''
+        self.line_number = line_number
+
+    def read(self):
+        block = self._file_object.read(self._chunk_size)
+        if not block:
+            if not self._remainder:
+                return None
+            block, self._remainder = self._remainder, ''
+        else:
+            block = self._remainder + block
+            end = block.rfind('\n') + 1
+            block, self._remainder = block[:end], block[end:]
+            if not block:
+                return []
+        return self._tokenize(block)
+
+    def _tokenize(self, block):
+        line_count = block.count('\n') + (0 if block.endswith('\n') else 1)
+        rows = self._LINE.findall(block)[:line_count]
+        if len(rows) != line_count:
+            logger.error("G-code tokenizer lost track of lines")
+            raise Exception("G-code tokenizer lost track of lines")
+        commands, feed_before, x, y, extrude, feed_after, other = [numpy.array(column) for column in zip(*rows)]
+        feed_rate = numpy.where(feed_after != '', feed_after, feed_before)
+        line_numbers = numpy.arange(self.line_number + 1, self.line_number + 1 + line_count)
+
+        others = numpy.flatnonzero(other != '')
+        laterals = numpy.flatnonzero(commands != '')
+        tokens = []
+        for (index, run) in enumerate(numpy.split(laterals, numpy.searchsorted(laterals, others))):
+            if len(run):
+                tokens.append(GCodeRun(line_numbers[run], x[run], y[run], feed_rate[run], extrude[run]))
+            if index < len(others):
+                tokens.append(GCodeLine(int(line_numbers[others[index]]), other[others[index]].strip()))
+        self.line_number += line_count
+        return tokens
 
 
 class GCodeToLayerGenerator(LayerGenerator):
-    def __init__(self, file_object, scale=1.0, start_height=None):
+    def __init__(self, file_object, scale=1.0, start_height=None, layer_index=None, chunked=False, chord_error=None, samples_per_second=None):
         super(GCodeToLayerGenerator, self).__init__()
         self.errors = []
         self._start_height = start_height
@@ -30,9 +234,24 @@ class GCodeToLayerGenerator(LayerGenerator):
         self._file_object = file_object
         self._line_number = 0
         self._current_z = 0.0
-        self._gcode_command_reader = GCodeCommandReader(scale=scale)
+        if chord_error or samples_per_second:
+            self._gcode_command_reader = GCodeCommandReader(scale=scale, chord_error=chord_error, samples_per_second=samples_per_second)
+        else:
+            self._gcode_command_reader = GCodeCommandReader(scale=scale)
         self._command_queue = collections.deque()
         self._file_complete = False
+        self._chunked = chunked
+        self._tokenizer = None
+        if layer_index and start_height:
+            self._seek(layer_index.entry_for_height(start_height))
+
+    def _seek(self, entry):
+        if entry is None:
+            return
+        logger.info("Resuming at line %s for height %s" % (entry['line'] + 1, entry['z']))
+        self._file_object.seek(entry['offset'])
+        self._line_number = entry['line']
+        self._gcode_command_reader.set_state(entry)
 
     def __iter__(self):
         return self
@@ -41,9 +260,10 @@ class GCodeToLayerGenerator(LayerGenerator):
         return self.next()
 
     def next(self):
-        layer = self._get_layer(None)
+        get_layer = self._get_array_layer if self._chunked else self._get_layer
+        layer = get_layer()
         while layer.z < self._start_height:
-            layer = self._get_layer(None)
+            layer = get_layer()
         return layer
 
     def _populate_buffer(self):
@@ -60,6 +280,76 @@ class GCodeToLayerGenerator(LayerGenerator):
         except StopIteration:
             self._file_complete = True
 
+    def _populate_chunk(self):
+        if self._tokenizer is None:
+            self._tokenizer = GCodeChunkTokenizer(self._file_object, self._line_number)
+        tokens = self._tokenizer.read()
+        if tokens is None:
+            self._file_complete = True
+            return
+        for token in tokens:
+            if isinstance(token, GCodeRun):
+                lateral, failed = self._gcode_command_reader.to_arrays(token.x, token.y, token.feed_rate, token.extrude)
+                for index in failed:
+                    self._report_error(int(token.line_numbers[index]), "Feed Rate Never Specified")
+                if len(lateral):
+                    self._command_queue.append(lateral)
+            else:
+                try:
+                    self._command_queue.extend(self._gcode_command_reader.to_command(token.gcode))
+                except Exception as ex:
+                    self._report_error(token.line_number, ex.message)
+        self._line_number = self._tokenizer.line_number
+
+    def _report_error(self, line_number, message):
+        logger.error("Error %s: %s" % (line_number, message))
+        self.errors.append("Error %s: %s" % (line_number, message))
+
+    def _get_array_layer(self):
+        z = None
+        pieces = []
+        while True:
+            try:
+                item = self._command_queue.popleft()
+            except IndexError:
+                if not self._file_complete:
+                    self._populate_chunk()
+                    continue
+                if pieces:
+                    return self._to_array_layer(z, pieces)
+                raise StopIteration
+            if type(item) == VerticalMove:
+                if pieces:
+                    self._command_queue.appendleft(item)
+                    return self._to_array_layer(z, pieces)
+                z = item.end
+            else:
+                pieces.append(item)
+
+    def _to_array_layer(self, z, pieces):
+        arrays = []
+        commands = []
+        for piece in pieces:
+            if isinstance(piece, ArrayLayer):
+                if commands:
+                    arrays.append(ArrayLayer.from_commands(0.0, commands))
+                    commands = []
+                arrays.append(piece)
+            else:
+                commands.append(piece)
+        if commands:
+            arrays.append(ArrayLayer.from_commands(0.0, commands))
+        rows = sum(len(array) for array in arrays)
+        if arrays[-1].kinds[-1] == ArrayLayer.MOVE:
+            rows -= 1
+        return ArrayLayer(
+            0.0 if z is None else z,
+            numpy.concatenate([array.starts for array in arrays])[:rows],
+            numpy.concatenate([array.ends for array in arrays])[:rows],
+            numpy.concatenate([array.speeds for array in arrays])[:rows],
+            numpy.concatenate([array.kinds for array in arrays])[:rows],
+            )
+
     def _clean_up_unneed_moves(self, layer):
         if (type(layer.commands[-1]) == LateralMove):
             layer.commands = layer.commands[:-1]
@@ -93,8 +383,11 @@ class GCodeToLayerGenerator(LayerGenerator):
 
 class GCodeCommandReader(object):
     _INCHES2MM = 25.4
+    DEFAULT_CHORD_ERROR = 0.01
+    ARC_TEMPLATE_LIMIT = 1024
+    _arc_templates = {}
 
-    def __init__(self, verbose=False, scale=1.0):
+    def __init__(self, verbose=False, scale=1.0, chord_error=None, samples_per_second=None):
         super(GCodeCommandReader, self).__init__()
         self._mm_per_s = 100
         self._current_xy = [0.0, 0.0]
@@ -102,6 +395,24 @@ class GCodeCommandReader(object):
         self._layer_height = None
         self._units = 'mm'
         self.scale = scale
+        self.chord_error = chord_error or self.DEFAULT_CHORD_ERROR
+        self.samples_per_second = samples_per_second
+
+    def get_state(self):
+        return {
+            'units': self._units,
+            'mm_per_s': self._mm_per_s,
+            'current_xy': list(self._current_xy),
+            'current_z_pos': self._current_z_pos,
+            'layer_height': self._layer_height,
+            }
+
+    def set_state(self, state):
+        self._units = state['units']
+        self._mm_per_s = state['mm_per_s']
+        self._current_xy = list(state['current_xy'])
+        self._current_z_pos = state['current_z_pos']
+        self._layer_height = state['layer_height']
 
     def to_command(self, gcode):
         if self._can_ignore(gcode):
@@ -149,6 +460,142 @@ class GCodeCommandReader(object):
         else:
             return []
 
+    def to_arrays(self, x, y, feed_rate, extrude):
+        '''Converts columns of X, Y, F and E field strings from consecutive G0/G1 lines without a Z field into an
+        ArrayLayer of lateral moves and draws, advancing the reader state as to_command would line by line. Missing
+        fields are empty strings. Returns the layer and the indexes of lines that failed for want of a feed rate.'''
+        x = self._to_mm(self._to_floats(x)) * self.scale
+        y = self._to_mm(self._to_floats(y)) * self.scale
+        feed_rate = self._to_floats(feed_rate)
+        extrude = self._to_floats(extrude)
+
+        specified = numpy.where(numpy.isnan(feed_rate), -1, numpy.arange(len(feed_rate)))
+        specified = numpy.maximum.accumulate(specified)
+        speeds = numpy.where(specified >= 0, self._to_mm_per_second(feed_rate[specified]), self._mm_per_s)
+        self._mm_per_s = speeds[-1].item()
+
+        failed = speeds == 0
+        valid = ~(numpy.isnan(x) | numpy.isnan(y) | failed)
+        ends = numpy.column_stack((x, y))[valid]
+        starts = numpy.vstack(([self._current_xy], ends[:-1]))[:len(ends)]
+        writes = numpy.where(numpy.isnan(extrude), 0.0, extrude)[valid] > 0.0
+        if len(ends):
+            self._current_xy = ends[-1].tolist()
+        kinds = numpy.where(writes, ArrayLayer.DRAW, ArrayLayer.MOVE)
+        return ArrayLayer(0.0, starts, ends, speeds[valid], kinds), numpy.flatnonzero(failed)
+
+    def _to_floats(self, values):
+        values = numpy.asarray(values)
+        return numpy.where(values == '', 'nan', values).astype(numpy.float64)
+
+    def _command_arc(self, line):
+        command_details = line.split(' ')
+        clockwise = command_details[0] in ['G2', 'G02']
+        x_mm = None
+        y_mm = None
+        z_mm = None
+        offset = [None, None]
+        radius = None
+        write = False
+
+        for detail in command_details[1:]:
+            detail_type = detail[0]
+            if detail_type == 'X':
+                x_mm = self._to_mm(float(detail[1:])) * self.scale
+            elif detail_type == 'Y':
+                y_mm = self._to_mm(float(detail[1:])) * self.scale
+            elif detail_type == 'Z':
+                z_mm = self._to_mm(float(detail[1:])) * self.scale
+            elif detail_type == 'I':
+                offset[0] = self._to_mm(float(detail[1:])) * self.scale
+            elif detail_type == 'J':
+                offset[1] = self._to_mm(float(detail[1:])) * self.scale
+            elif detail_type == 'R':
+                radius = self._to_mm(float(detail[1:])) * self.scale
+            elif detail_type == 'F':
+                self._mm_per_s = self._to_mm_per_second(float(detail[1:]))
+            elif detail_type == 'E':
+                write = float(detail[1:]) > 0.0
+            else:
+                logger.error("Warning gcode subcode [%s] not supported in command: [%s]" % (detail_type, line))
+
+        if not self._mm_per_s:
+            logger.error("Feed Rate Never Specified")
+            raise Exception("Feed Rate Never Specified")
+        start = self._current_xy
+        end = [start[0] if x_mm is None else x_mm, start[1] if y_mm is None else y_mm]
+        if radius is not None:
+            if offset != [None, None]:
+                logger.error("Arc cannot specify both R and I/J: %s" % line)
+                raise Exception("Arc cannot specify both R and I/J: %s" % line)
+            center = self._arc_center(start, end, radius, clockwise)
+        elif offset != [None, None]:
+            center = [start[0] + (offset[0] or 0.0), start[1] + (offset[1] or 0.0)]
+        else:
+            logger.error("Arc requires I/J or R: %s" % line)
+            raise Exception("Arc requires I/J or R: %s" % line)
+
+        commands = []
+        if z_mm is not None:
+            logger.warning("Helical arcs are not supported, moving vertically before the arc")
+            commands = self._get_vertical_movement(z_mm, write)
+        points = self._arc_points(start, end, center, clockwise, full_circle=radius is None)
+        command_type = LateralDraw if write else LateralMove
+        for point in points:
+            commands.append(command_type(self._current_xy, point, self._mm_per_s))
+            self._current_xy = point
+        return commands
+
+    def _arc_center(self, start, end, radius, clockwise):
+        dx, dy = end[0] - start[0], end[1] - start[1]
+        chord = math.hypot(dx, dy)
+        if chord == 0.0:
+            logger.error("Arc radius form requires an end point distinct from the start")
+            raise Exception("Arc radius form requires an end point distinct from the start")
+        height = math.sqrt(max(radius * radius - chord * chord / 4.0, 0.0))
+        # Positive R takes the short way round, so the centre sits to the right of
+        # the chord for clockwise arcs and to the left for counterclockwise ones.
+        side = (-1.0 if clockwise else 1.0) * (1.0 if radius > 0 else -1.0)
+        return [start[0] + dx / 2.0 - side * height * dy / chord, start[1] + dy / 2.0 + side * height * dx / chord]
+
+    def _arc_points(self, start, end, center, clockwise, full_circle=True):
+        start_angle = math.atan2(start[1] - center[1], start[0] - center[0])
+        end_angle = math.atan2(end[1] - center[1], end[0] - center[0])
+        sweep = (start_angle - end_angle) if clockwise else (end_angle - start_angle)
+        sweep = sweep % (2 * math.pi)
+        if full_circle and start == end:
+            sweep = 2 * math.pi
+        radius = math.hypot(start[0] - center[0], start[1] - center[1])
+        segments = self._arc_segments(radius, sweep)
+        template = self._arc_template(segments, -sweep if clockwise else sweep)
+        points = complex(center[0], center[1]) + complex(start[0] - center[0], start[1] - center[1]) * template
+        points = numpy.column_stack((points.real, points.imag)).tolist()
+        points[-1] = list(end)
+        return points
+
+    def _arc_segments(self, radius, sweep):
+        '''Enough segments that no chord strays further than chord_error from the arc, but none shorter than the
+        distance travelled in one sample, below which the extra points cannot be drawn.'''
+        minimum = max(1, int(math.ceil(sweep / (math.pi / 2.0))))
+        if radius <= self.chord_error:
+            return minimum
+        segments = int(math.ceil(sweep / (2.0 * math.acos(1.0 - self.chord_error / radius))))
+        if self.samples_per_second:
+            sample_distance = self._mm_per_s / float(self.samples_per_second)
+            segments = min(segments, int(radius * sweep / sample_distance))
+        return max(segments, minimum)
+
+    @classmethod
+    def _arc_template(cls, segments, sweep):
+        '''Points of an arc of sweep radians starting at 1 + 0j, as powers of the unit arc of one radian split into
+        segments. The unit arcs are shared by every arc with the same number of segments, whatever its sweep.'''
+        unit_arc = cls._arc_templates.get(segments)
+        if unit_arc is None:
+            unit_arc = numpy.exp(1j * numpy.arange(1, segments + 1) / float(segments))
+            if len(cls._arc_templates) < cls.ARC_TEMPLATE_LIMIT:
+                unit_arc = cls._arc_templates.setdefault(segments, unit_arc)
+        return unit_arc ** sweep
+
     def _get_vertical_movement(self, z_mm, write):
         self._zaxis_change(z_mm)
         commands = []
@@ -213,19 +660,27 @@ class GCodeCommandReader(object):
 
     def _units_mm(self, line):
         self._units = 'mm'
+        return []
 
     def _units_inches(self, line):
         self._units = 'inches'
+        return []
 
     _COMMAND_HANDLERS = {
         'G01': _command_draw,
         'G1' : _command_draw,
         'G0' : _command_draw,
         'G01': _command_draw,
+        'G2' : _command_arc,
+        'G02': _command_arc,
+        'G3' : _command_arc,
+        'G03': _command_arc,
         'G21': _units_mm,
         'G20': _units_inches
     }
 
+    _ARC_COMMANDS = ['G2', 'G02', 'G3', 'G03']
+
     _IGNORABLE_PREFIXES = [
     ';', # Comment
     'M', # Miscilanious / Machine Specific
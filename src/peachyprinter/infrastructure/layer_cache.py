@@ -0,0 +1,157 @@
+import os
+import bisect
+import hashlib
+import tempfile
+import numpy
+import logging
+logger = logging.getLogger('peachy')
+
+import peachyprinter.config as config
+from peachyprinter.domain.commands import ArrayLayer
+from peachyprinter.domain.layer_generator import LayerGenerator
+from peachyprinter.infrastructure.gcode_layer_generator import GCodeToLayerGenerator
+
+
+class CompiledLayerFile(object):
+    MAGIC = 'PEACHYLC'
+    VERSION = 1
+    HEADER = numpy.dtype([('magic', 'S8'), ('version', '<u4'), ('layer_count', '<u4'), ('table_offset', '<u8')])
+    TABLE = numpy.dtype([('z', '<f8'), ('offset', '<u8'), ('count', '<u4')])
+    SEGMENT = numpy.dtype([('start', '<f4', (2,)), ('end', '<f4', (2,)), ('speed', '<f4'), ('kind', 'u1')])
+
+    @classmethod
+    def write(cls, file_name, layers):
+        table = []
+        offset = 0
+        with open(file_name, 'wb') as out_file:
+            out_file.write(numpy.zeros(1, dtype=cls.HEADER).tostring())
+            for layer in layers:
+                if not isinstance(layer, ArrayLayer):
+                    layer = ArrayLayer.from_layer(layer)
+                segments = numpy.empty(len(layer), dtype=cls.SEGMENT)
+                segments['start'] = layer.starts
+                segments['end'] = layer.ends
+                segments['speed'] = layer.speeds
+                segments['kind'] = layer.kinds
+                out_file.write(segments.tostring())
+                table.append((layer.z, offset, len(layer)))
+                offset += len(layer)
+            table_offset = out_file.tell()
+            out_file.write(numpy.array(table, dtype=cls.TABLE).tostring())
+            out_file.seek(0)
+            header = numpy.array([(cls.MAGIC, cls.VERSION, len(table), table_offset)], dtype=cls.HEADER)
+            out_file.write(header.tostring())
+        return len(table)
+
+    def __init__(self, file_name):
+        self._data = numpy.memmap(file_name, dtype=numpy.uint8, mode='r')
+        header = self._data[:self.HEADER.itemsize].view(self.HEADER)[0]
+        if header['magic'] != self.MAGIC or header['version'] != self.VERSION:
+            raise Exception("Not a compiled layer file: %s" % file_name)
+        table_offset = int(header['table_offset'])
+        table_end = table_offset + int(header['layer_count']) * self.TABLE.itemsize
+        self.table = self._data[table_offset:table_end].view(self.TABLE)
+        self.segments = self._data[self.HEADER.itemsize:table_offset].view(self.SEGMENT)
+
+    def __len__(self):
+        return len(self.table)
+
+    def layer(self, index):
+        z, offset, count = self.table[index]
+        segments = self.segments[offset:offset + count]
+        return ArrayLayer(float(z), segments['start'], segments['end'], segments['speed'], segments['kind'])
+
+    def close(self):
+        self.table = None
+        self.segments = None
+        self._data = None
+
+
+class CompiledLayerGenerator(LayerGenerator):
+    def __init__(self, file_name, start_height=None):
+        self._compiled = CompiledLayerFile(file_name)
+        self._index = 0
+        if start_height:
+            self._index = bisect.bisect_left(self._compiled.table['z'].tolist(), start_height)
+
+    def next(self):
+        if self._compiled is None or self._index >= len(self._compiled):
+            raise StopIteration
+        layer = self._compiled.layer(self._index)
+        self._index += 1
+        return layer
+
+    def close(self):
+        if self._compiled:
+            self._compiled.close()
+            self._compiled = None
+
+
+class LayerCache(object):
+    EXTENSION = '.layers'
+    FOLDER = 'layer_cache'
+
+    def __init__(self, cache_folder=None, max_size_mb=500):
+        if cache_folder is None:
+            cache_folder = os.path.join(config.PEACHY_PATH, self.FOLDER)
+        self._cache_folder = cache_folder
+        self._max_size = max_size_mb * 1024 * 1024
+
+    def get_layers(self, file_name, scale=1.0, start_height=None, chord_error=None, samples_per_second=None):
+        compiled_file_name = self.compiled_file_name(file_name, scale, chord_error, samples_per_second)
+        if os.path.isfile(compiled_file_name):
+            logger.info("Using compiled layers for %s" % file_name)
+            os.utime(compiled_file_name, None)
+        elif not self._compile(file_name, scale, chord_error, samples_per_second, compiled_file_name):
+            return None
+        return CompiledLayerGenerator(compiled_file_name, start_height=start_height)
+
+    def compiled_file_name(self, file_name, scale, chord_error=None, samples_per_second=None):
+        file_hash = hashlib.sha1()
+        with open(file_name, 'rb') as source:
+            for chunk in iter(lambda: source.read(1024 * 1024), ''):
+                file_hash.update(chunk)
+        file_hash.update(repr(float(scale)))
+        file_hash.update(repr((chord_error, samples_per_second)))
+        return os.path.join(self._cache_folder, file_hash.hexdigest() + self.EXTENSION)
+
+    def _compile(self, file_name, scale, chord_error, samples_per_second, compiled_file_name):
+        if not os.path.isdir(self._cache_folder):
+            os.makedirs(self._cache_folder)
+        logger.info("Compiling layers for %s" % file_name)
+        handle, temp_file_name = tempfile.mkstemp(dir=self._cache_folder)
+        os.close(handle)
+        try:
+            with open(file_name, 'r') as source:
+                layers = GCodeToLayerGenerator(source, scale=scale, chord_error=chord_error, samples_per_second=samples_per_second)
+                CompiledLayerFile.write(temp_file_name, layers)
+            if layers.errors:
+                logger.warning("Not caching layers for %s, file has %s errors" % (file_name, len(layers.errors)))
+                os.remove(temp_file_name)
+                return False
+            if os.path.isfile(compiled_file_name):
+                os.remove(compiled_file_name)
+            os.rename(temp_file_name, compiled_file_name)
+        except Exception:
+            if os.path.isfile(temp_file_name):
+                os.remove(temp_file_name)
+            raise
+        self._evict(compiled_file_name)
+        return True
+
+    def _evict(self, keep):
+        cached = []
+        for name in os.listdir(self._cache_folder):
+            if name.endswith(self.EXTENSION):
+                path = os.path.join(self._cache_folder, name)
+                stat = os.stat(path)
+                cached.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for (_, size, _) in cached)
+        for (_, size, path) in sorted(cached):
+            if total <= self._max_size:
+                break
+            if path == keep:
+                continue
+            logger.info("Evicting compiled layers %s" % path)
+            os.remove(path)
+            total -= size
@@ -1,12 +1,21 @@
 import time
+import numpy
+import itertools
 import logging
 logger = logging.getLogger('peachy')
 from peachyprinter.domain.commands import *
 from peachyprinter.infrastructure.commander import NullCommander
-from threading import Lock
+from threading import Lock, Event
+from collections import namedtuple
+from functools import partial
+
+
+CompiledLayer = namedtuple('CompiledLayer', ['layer', 'key', 'frames', 'xyz', 'speed', 'laser_on', 'bounds'])
+SubLayerPlan = namedtuple('SubLayerPlan', ['geometry', 'key', 'view', 'first_draw', 'starts', 'ends', 'speeds', 'powers', 'xy', 'speed', 'laser_on', 'bounds'])
 
 
 class LayerWriter():
+    HOLD_SECONDS = 0.1
 
     def __init__(self,
                  disseminator,
@@ -19,6 +28,8 @@ class LayerWriter():
                  wait_speed=None,
                  post_fire_delay_speed=None,
                  slew_delay_speed=None,
+                 compile_repeated_layers=False,
+                 hold_while_waiting=False,
                  ):
         self._post_fire_delay_speed = post_fire_delay_speed
         self._slew_delay_speed = slew_delay_speed
@@ -37,6 +48,17 @@ class LayerWriter():
         self._shutting_down = False
         self._shutdown = False
         self._lock = Lock()
+        self._stopped = Event()
+
+        self._compile_repeated_layers = compile_repeated_layers
+        self._hold_while_waiting = hold_while_waiting
+        self._compiled = None
+        self.replayed_layers = 0
+
+        self._sublayer_plan = None
+        self._recording = None
+        self._first_draw = None
+        self.reused_sublayers = 0
 
     def _almost_equal(self, a, b):
         return (a == b or (abs(a - b) <= self._move_distance_to_ignore))
@@ -47,40 +69,153 @@ class LayerWriter():
     def process_layer(self, layer):
         if self._shutting_down or self._shutdown:
             raise Exception("LayerWriter already shutdown")
-        min_x, max_x, min_y, max_y, layer_height = None, None, None, None, None
         with self._lock:
             if self._disseminator:
                 self._disseminator.next_layer(layer.z)
-            for command in layer.commands:
-                # logger.info("Processing command: %s" % command)
-                if self._shutting_down:
-                    break
-                if self._abort_current_command:
-                    logger.info("Aborting Current Command")
-                    self._abort_current_command = False
-                    break
-                if type(command) == LateralDraw:
-                    if layer_height is None:
-                        min_x = command.start[0]
-                        max_x = command.start[0]
-                        min_y = command.start[1]
-                        max_y = command.start[1]
-                        layer_height = layer.z
-                    x, y = command.start
-                    min_x = x if x < min_x else min_x
-                    max_x = x if x > max_x else max_x
-                    min_y = y if y < min_y else min_y
-                    max_y = y if y > max_y else max_y
-                    x, y = command.end
-                    min_x = x if x < min_x else min_x
-                    max_x = x if x > max_x else max_x
-                    min_y = y if y < min_y else min_y
-                    max_y = y if y > max_y else max_y
-                    if not self._same_posisition(self._state.xy, command.start):
-                        self._move_lateral(
-                            command.start, layer.z, command.speed)
-                    self._draw_lateral(command.end, layer.z, command.speed)
-        return [[min_x, max_x], [min_y, max_y], layer_height]
+            if isinstance(layer, SubLayer):
+                bounds = self._write_sublayer(layer)
+            elif self._compile_repeated_layers and self._disseminator:
+                bounds = self._playback(layer)
+            else:
+                bounds, completed = self._write_layer(layer)
+            if self._disseminator:
+                self._disseminator.flush()
+        return bounds
+
+    def _playback(self, layer):
+        key = self._playback_key(layer)
+        compiled = self._compiled
+        if compiled and compiled.layer is layer and compiled.key == key and not (self._shutting_down or self._abort_current_command):
+            self._disseminator.replay(compiled.frames)
+            self._state.set_state(compiled.xyz, compiled.speed)
+            if compiled.laser_on:
+                self._laser_control.set_laser_on()
+            else:
+                self._laser_control.set_laser_off()
+            self.replayed_layers += 1
+            return compiled.bounds
+        self._compiled = None
+        if not layer.repeats:
+            bounds, completed = self._write_layer(layer)
+            return bounds
+        self._disseminator.start_recording()
+        try:
+            bounds, completed = self._write_layer(layer)
+        finally:
+            frames = self._disseminator.stop_recording()
+        if completed and frames is not None:
+            self._compiled = CompiledLayer(layer, key, frames, self._state.xyz, self._state.speed, self._laser_control.laser_is_on(), bounds)
+        return bounds
+
+    def _playback_key(self, layer):
+        return (
+            layer.z,
+            self._path_to_points.transformer,
+            self._laser_control.default_laser_power(),
+            self._laser_control.laser_is_on(),
+            self.laser_off_override,
+            tuple(self._state.xyz),
+            self._state.speed,
+            )
+
+    def _write_sublayer(self, layer):
+        plan = self._sublayer_plan
+        key = self._sublayer_key()
+        if plan and plan.geometry is layer.geometry and plan.key == key and plan.view == self._sublayer_view(layer) and not (self._shutting_down or self._abort_current_command):
+            return self._reuse_sublayer(plan, layer)
+        self._sublayer_plan = None
+        if not layer.repeats:
+            bounds, completed = self._write_layer(layer)
+            return bounds
+        self._recording = []
+        self._first_draw = None
+        try:
+            bounds, completed = self._write_layer(layer)
+            writes = self._recording
+        finally:
+            self._recording = None
+        if completed and self._first_draw:
+            start, end, speed, body = self._first_draw
+            writes = numpy.array(writes[body:], dtype=numpy.float64).reshape(-1, 6)
+            self._sublayer_plan = SubLayerPlan(
+                layer.geometry, key, self._sublayer_view(layer), (start, end, speed),
+                writes[:, 0:2], writes[:, 2:4], writes[:, 4], writes[:, 5],
+                self._state.xy, self._state.speed, self._laser_control.laser_is_on(), bounds)
+        return bounds
+
+    def _sublayer_key(self):
+        return (self.laser_off_override, self._laser_control.default_laser_power())
+
+    def _sublayer_view(self, layer):
+        return (layer.offset, [(tuple(command.start), tuple(command.end), command.speed) for command in layer.tail])
+
+    def _reuse_sublayer(self, plan, layer):
+        # Only the lead in to the first draw depends on where the last layer
+        # ended, everything after it is resampled in one pass at the new height.
+        start, end, speed = plan.first_draw
+        if not self._same_posisition(self._state.xy, start):
+            self._move_lateral(start, layer.z, speed)
+        self._draw_lateral(end, layer.z, speed)
+        if len(plan.starts):
+            points, powers = self._path_to_points.process_many(
+                plan.starts, plan.ends, plan.speeds, plan.powers > 0.0, layer.z, self._laser_control.default_laser_power())
+            if self._disseminator:
+                self._disseminator.process(points, powers)
+        self._state.set_state([plan.xy[0], plan.xy[1], layer.z], plan.speed)
+        if plan.laser_on:
+            self._laser_control.set_laser_on()
+        else:
+            self._laser_control.set_laser_off()
+        self.reused_sublayers += 1
+        [[min_x, max_x], [min_y, max_y], layer_height] = plan.bounds
+        return [[min_x, max_x], [min_y, max_y], layer.z]
+
+    def _write_layer(self, layer):
+        min_x, max_x, min_y, max_y, layer_height = None, None, None, None, None
+        for (is_draw, start, end, speed) in self._segments(layer):
+            if self._shutting_down:
+                return [[min_x, max_x], [min_y, max_y], layer_height], False
+            if self._abort_current_command:
+                logger.info("Aborting Current Command")
+                self._abort_current_command = False
+                return [[min_x, max_x], [min_y, max_y], layer_height], False
+            if is_draw:
+                if layer_height is None:
+                    min_x = start[0]
+                    max_x = start[0]
+                    min_y = start[1]
+                    max_y = start[1]
+                    layer_height = layer.z
+                x, y = start
+                min_x = x if x < min_x else min_x
+                max_x = x if x > max_x else max_x
+                min_y = y if y < min_y else min_y
+                max_y = y if y > max_y else max_y
+                x, y = end
+                min_x = x if x < min_x else min_x
+                max_x = x if x > max_x else max_x
+                min_y = y if y < min_y else min_y
+                max_y = y if y > max_y else max_y
+                if not self._same_posisition(self._state.xy, start):
+                    self._move_lateral(
+                        start, layer.z, speed)
+                self._draw_lateral(end, layer.z, speed)
+                if self._recording is not None and self._first_draw is None:
+                    self._first_draw = (start, end, speed, len(self._recording))
+        return [[min_x, max_x], [min_y, max_y], layer_height], True
+
+    def _segments(self, layer):
+        if isinstance(layer, SubLayer):
+            if not layer.offset and not layer.tail:
+                return self._segments(layer.geometry)
+            return itertools.chain(
+                itertools.islice(self._segments(layer.geometry), layer.offset, None),
+                itertools.islice(self._segments(layer.geometry), layer.offset),
+                ((type(command) == LateralDraw, command.start, command.end, command.speed) for command in layer.tail),
+                )
+        if isinstance(layer, ArrayLayer):
+            return ((kind == ArrayLayer.DRAW, start, end, speed) for (kind, start, end, speed) in layer.segments())
+        return ((type(command) == LateralDraw, command.start, command.end, command.speed) for command in layer.commands)
 
     def _move_lateral(self, (to_x, to_y), to_z, speed):
         if self._override_move_speed:
@@ -111,6 +246,8 @@ class LayerWriter():
     def _write_lateral(self, to_x, to_y, to_z, speed):
         to_xyz = [to_x, to_y, to_z]
         path = self._path_to_points.process(self._state.xyz, to_xyz, speed)
+        if self._recording is not None:
+            self._recording.append((self._state.x, self._state.y, to_x, to_y, speed, self._laser_control.laser_power()))
         if self._disseminator:
             self._disseminator.process(path)
         self._state.set_state(to_xyz, speed)
@@ -118,17 +255,50 @@ class LayerWriter():
     def abort_current_command(self):
         self._abort_current_command = True
         with self._lock:
+            if self._disseminator:
+                self._disseminator.flush()
             self._state.set_state((0.0, 0.0, self._state.z), self._state.speed)
 
     def wait_till_time(self, wait_time):
+        if self._hold_while_waiting and self._disseminator:
+            self._hold_till_time(wait_time)
+            return
         while time.time() <= wait_time:
             if self._shutting_down:
                 return
             self._move_lateral(
                 self._state.xy, self._state.z, self._state.speed)
 
+    def _hold_till_time(self, wait_time):
+        seconds = wait_time - time.time()
+        if seconds <= 0 or self._shutting_down:
+            return
+        self._laser_control.set_laser_off()
+        self._hold(seconds)
+        self._stopped.wait(seconds)
+
+    def wait_until(self, until, cancelled):
+        '''Keeps the head in place with the laser off until until returns True. until is called with a timeout in
+        seconds, or None to wait as long as it takes, and must block rather than poll; it is the only thing that wakes
+        the wait, so it should also return once cancelled returns True. When holding while waiting, holds are sent
+        HOLD_SECONDS at a time, as the next layer cannot start until the last hold sent has played out.'''
+        self._laser_control.set_laser_off()
+        if not (self._hold_while_waiting and self._disseminator):
+            until(None)
+            return
+        while not (self._shutting_down or cancelled()):
+            self._hold(self.HOLD_SECONDS)
+            if until(self.HOLD_SECONDS):
+                return
+
+    def _hold(self, seconds):
+        position, samples = self._path_to_points.hold(self._state.xyz, seconds)
+        if samples:
+            self._disseminator.hold(position, samples)
+
     def terminate(self):
         self._shutting_down = True
+        self._stopped.set()
         with self._lock:
             self._shutdown = True
             try:
@@ -199,6 +369,8 @@ class LayerProcessing():
 
     def abort_current_command(self):
         self._abort_current_command = True
+        if self._zaxis:
+            self._zaxis.interrupt()
         self._writer.abort_current_command()
         with self._lock:
             self._state.set_state((0.0, 0.0, self._state.z), self._state.speed)
@@ -213,20 +385,25 @@ class LayerProcessing():
         logger.info("Ahead (Unacceptably) by: %s" % ahead_by_distance)
         return False
 
+    def _waiting_cancelled(self):
+        return self._shutting_down or self._abort_current_command
+
     def _wait_till(self, height):
         while self._zaxis.current_z_location_mm() < height:
-            if self._shutting_down or self._abort_current_command:
+            if self._waiting_cancelled():
                 return
             if not self._status.waiting_for_drips:
                 self._commander.send_command(self._dripper_on_command)
             self._status.set_waiting_for_drips()
-            self._writer.wait_till_time(time.time() + (0.1))
+            self._writer.wait_until(partial(self._zaxis.wait_for_height, height, cancelled=self._waiting_cancelled), self._waiting_cancelled)
         if self._status.waiting_for_drips:
             self._commander.send_command(self._dripper_off_command)
         self._status.set_not_waiting_for_drips()
 
     def terminate(self):
         self._shutting_down = True
+        if self._zaxis:
+            self._zaxis.interrupt()
         with self._lock:
             self._shutdown = True
             self._commander.send_command(self._print_ended_command)
@@ -28,6 +28,29 @@ class StubLayerGenerator(LayerGenerator):
 # -----------Pattern  Generators ----------------
 
 
+class LoopingPatternGenerator(LayerGenerator):
+    '''Repeats a test pattern's layer without rebuilding it. A new layer is only asked for when the pattern's speed,
+    radius or height change, and the same layer object is then handed out on every loop so the layer writer can replay it.'''
+
+    def __init__(self, pattern):
+        self._pattern = pattern
+        self._settings = None
+        self._layer = None
+
+    def next(self):
+        settings = self._pattern.settings()
+        if self._layer is not None and settings == self._settings:
+            return self._layer
+        layer = self._pattern.next()
+        if settings == self._settings:
+            layer.repeats = True
+            self._layer = layer
+        else:
+            self._settings = settings
+            self._layer = None
+        return layer
+
+
 class SinglePointGenerator(LayerGenerator):
     def __init__(self, starting_xy=[0.0, 0.0]):
         self.xy = starting_xy
@@ -501,6 +524,13 @@ class AdvancedCureTestGenerator(LayerGenerator):
 # -----------Augmenting Generators ----------------
 
 
+def _draw_breaks(layer, draw_index, tollerance):
+    '''For each pair of consecutive draws in draw_index, True when the second does not continue on from the first.'''
+    gaps = np.diff(draw_index) > 1
+    jumps = np.hypot(*(layer.starts[draw_index[1:]] - layer.ends[draw_index[:-1]]).T) > tollerance
+    return gaps | jumps
+
+
 class SubLayerGenerator(LayerGenerator):
     def __init__(self, layer_generator, sub_layer_height, tollerance=0.001):
         self._layer_generator = layer_generator
@@ -516,19 +546,21 @@ class SubLayerGenerator(LayerGenerator):
                 distance_to_next_layer = self._next.z - self._current_layer.z
                 # logger.debug('%f8' % distance_to_next_layer)
                 if distance_to_next_layer / 2.0 >= self._sub_layer_height - self._tollerance:
-                    current_z = self._current_layer.z
-                    self._current_layer.z = current_z + self._sub_layer_height
-                    self._current_layer = self._current_layer
+                    self._current_layer = SubLayer(self._current_layer.geometry, self._current_layer.z + self._sub_layer_height)
                 else:
-                    self._current_layer = self._next
+                    self._current_layer = SubLayer(self._next, self._next.z)
                     self._load_layer()
             else:
-                self._current_layer = self._next
+                self._current_layer = SubLayer(self._next, self._next.z)
                 self._load_layer()
+            self._current_layer.repeats = self._running and self._repeats_layer(self._current_layer)
             return self._current_layer
         else:
             raise StopIteration
 
+    def _repeats_layer(self, layer):
+        return (self._next.z - layer.z) / 2.0 >= self._sub_layer_height - self._tollerance
+
     def _load_layer(self):
         try:
             self._next = self._layer_generator.next()
@@ -552,10 +584,17 @@ class ShuffleGenerator(LayerGenerator):
         return self._shuffle(self._layer_generator.next())
 
     def _shuffle(self, layer):
-        shuffle_amount = int(self._shuffle_point) % len(layer.commands)
-        layer.commands = layer.commands[shuffle_amount:] + layer.commands[:shuffle_amount]
+        count = len(layer.commands)
+        if count == 0:
+            return layer
+        shuffle_amount = int(self._shuffle_point) % count
         self._shuffle_point += self._amount
-        return layer
+        if isinstance(layer, SubLayer) and not layer.tail:
+            repeats = layer.repeats and int(self._shuffle_point) % count == shuffle_amount
+            return SubLayer(layer.geometry, layer.z, (layer.offset + shuffle_amount) % count, repeats=repeats)
+        if isinstance(layer, SubLayer):
+            layer = Layer(layer.z, list(layer.commands))
+        return SubLayer(layer, layer.z, shuffle_amount)
 
     def _load_layer(self):
         try:
@@ -565,6 +604,8 @@ class ShuffleGenerator(LayerGenerator):
 
 
 class OverLapGenerator(LayerGenerator):
+    CHUNK_SIZE = 16
+
     def __init__(self, layer_generator, overlap_mm=1.0):
         self._layer_generator = layer_generator
         self._tollerance = 0.01
@@ -579,33 +620,47 @@ class OverLapGenerator(LayerGenerator):
     def _same_spot(self, pos1, pos2):
         return (abs(pos1[0] - pos2[0]) < self._tollerance) and (abs(pos1[0] - pos2[0]) < self._tollerance)
 
-    def _overlap_command(self, command, amount):
-        x = command.end[0] - command.start[0]
-        y = command.end[1] - command.start[1]
-        magnatude = math.sqrt(x**2 + y**2)
-        if magnatude == 0.0:
-            return ([], amount)
-        elif magnatude >= amount:
-            vector = [(x / magnatude) * amount, (y / magnatude) * amount]
-            end_pos = [command.start[0] + vector[0], command.start[1] + vector[1]]
-            return ([LateralDraw(command.start, end_pos, command.speed)], 0.0)
-        else:
-            return ([LateralDraw(command.start, command.end, command.speed)], amount - magnatude)
+    def _overlap_tail(self, commands, threshold):
+        tail = []
+        remainder = self.overlap_mm
+        index = 0
+        chunk_size = self.CHUNK_SIZE
+        while remainder > threshold and index < len(commands):
+            chunk = commands[index:index + chunk_size]
+            moves = [i for (i, command) in enumerate(chunk) if type(command) == LateralMove]
+            if moves:
+                chunk = chunk[:moves[0]]
+            if chunk:
+                starts = np.array([command.start[:2] for command in chunk], dtype=np.float64)
+                vectors = np.array([command.end[:2] for command in chunk], dtype=np.float64) - starts
+                lengths = np.hypot(vectors[:, 0], vectors[:, 1])
+                remaining = remainder - np.concatenate(([0.0], np.cumsum(lengths)[:-1]))
+                active = np.count_nonzero(remaining > threshold)
+                cut = np.flatnonzero(lengths[:active] >= remaining[:active])
+                whole = cut[0] if len(cut) else active
+                tail.extend([chunk[i] for i in np.flatnonzero(lengths[:whole] > 0.0)])
+                if len(cut):
+                    end = starts[whole] + vectors[whole] / lengths[whole] * remaining[whole]
+                    tail.append(LateralDraw(chunk[whole].start, end.tolist(), chunk[whole].speed))
+                    return tail
+                remainder = remainder - lengths[:whole].sum()
+                if whole < len(chunk):
+                    return tail
+            if moves:
+                return tail
+            index += chunk_size
+            chunk_size *= 2
+        return tail
 
     def _overlap_layer(self, layer, threshold=0.001):
-        new_commands = []
-        index = 0
-        remainder = self.overlap_mm
-        while remainder > threshold:  # almost
-            if len(layer.commands) <= index:
-                break
-            if type(layer.commands[index]) == LateralMove:
-                break
-            new_command, remainder = self._overlap_command(layer.commands[index], remainder)
-            new_commands = new_commands + new_command
-            index += 1
-        commands = layer.commands + new_commands
-        return Layer(layer.z, commands=commands)
+        tail = self._overlap_tail(layer.commands, threshold)
+        if not tail:
+            return layer
+        if isinstance(layer, SubLayer) and not layer.tail:
+            return SubLayer(layer.geometry, layer.z, layer.offset, tail, layer.repeats)
+        if isinstance(layer, SubLayer):
+            layer = Layer(layer.z, list(layer.commands))
+        return SubLayer(layer, layer.z, 0, tail)
 
     def _should_overlap(self, layer):
         first_command = layer.commands[0]
@@ -622,3 +677,259 @@ class OverLapGenerator(LayerGenerator):
             return self._overlap_layer(next_layer)
         else:
             return next_layer
+
+
+class TravelOptimizerGenerator(LayerGenerator):
+    '''Reorders the polylines in each layer to cut down the laser off travel between them. Layers are split into
+    polylines at moves and position jumps, chained from the nearest free end using a grid index, and then improved
+    with 2-opt limited to a window of neighbouring polylines. Polylines may be drawn in reverse.'''
+
+    def __init__(self, layer_generator, window=32, passes=2, tollerance=0.001):
+        self._layer_generator = layer_generator
+        self._window = window
+        self._passes = passes
+        self._tollerance = tollerance
+        self._position = (0.0, 0.0)
+        self.last_travel = (0.0, 0.0)
+        self.travel_before = 0.0
+        self.travel_after = 0.0
+
+    def next(self):
+        layer = self._layer_generator.next()
+        if isinstance(layer, ArrayLayer):
+            return self._optimize(layer)
+        if any(type(command) not in ArrayLayer._KINDS for command in layer.commands):
+            return layer
+        return self._optimize(ArrayLayer.from_layer(layer)).to_layer()
+
+    def _optimize(self, layer):
+        draw_index = np.flatnonzero(layer.kinds == ArrayLayer.DRAW)
+        if len(draw_index) == 0:
+            return layer
+        bounds = self._polyline_bounds(layer, draw_index)
+        firsts = draw_index[bounds[:-1]]
+        lasts = draw_index[bounds[1:] - 1]
+        heads = [tuple(point) for point in layer.starts[firsts].tolist()]
+        tails = [tuple(point) for point in layer.ends[lasts].tolist()]
+
+        original = [(polyline, False) for polyline in range(len(heads))]
+        order = self._two_opt(self._nearest_neighbour(heads, tails), heads, tails)
+        before = self._travel(original, heads, tails)
+        after = self._travel(order, heads, tails)
+        if after >= before:
+            order, after = original, before
+
+        self.last_travel = (before, after)
+        self.travel_before += before
+        self.travel_after += after
+        logger.info("Layer %.3f travel: %.2f mm before, %.2f mm after reordering %d polylines" % (layer.z, before, after, len(heads)))
+
+        result = self._build_layer(layer, draw_index, bounds, firsts, order)
+        self._position = tuple(result.ends[-1].tolist())
+        return result
+
+    def _polyline_bounds(self, layer, draw_index):
+        breaks = np.flatnonzero(_draw_breaks(layer, draw_index, self._tollerance)) + 1
+        return np.concatenate(([0], breaks, [len(draw_index)]))
+
+    def _ends(self, (polyline, reverse), heads, tails):
+        if reverse:
+            return tails[polyline], heads[polyline]
+        return heads[polyline], tails[polyline]
+
+    def _distance(self, a, b):
+        return math.hypot(a[0] - b[0], a[1] - b[1])
+
+    def _travel(self, order, heads, tails):
+        travel = 0.0
+        position = self._position
+        for item in order:
+            entry, exit = self._ends(item, heads, tails)
+            travel += self._distance(position, entry)
+            position = exit
+        return travel
+
+    def _nearest_neighbour(self, heads, tails):
+        count = len(heads)
+        endpoints = heads + tails
+        points = np.array(endpoints)
+        low = points.min(axis=0)
+        extent = max(float((points.max(axis=0) - low).max()), self._tollerance)
+        cell = extent / max(math.sqrt(count), 1.0)
+        size = int(extent / cell) + 1
+        grid = {}
+        for (index, (x, y)) in enumerate(endpoints):
+            grid.setdefault((int((x - low[0]) / cell), int((y - low[1]) / cell)), []).append(index)
+
+        used = [False] * count
+        order = []
+        position = self._position
+        for step in range(count):
+            cx = int(math.floor((position[0] - low[0]) / cell))
+            cy = int(math.floor((position[1] - low[1]) / cell))
+            ring = max(0, -cx, cx - size, -cy, cy - size)
+            best, best_distance = None, None
+            while best is None or best_distance > (ring - 1) * cell:
+                for key in self._ring(cx, cy, ring, size):
+                    entries = grid.get(key)
+                    if not entries:
+                        continue
+                    entries[:] = [index for index in entries if not used[index % count]]
+                    for index in entries:
+                        distance = self._distance(position, endpoints[index])
+                        if best is None or distance < best_distance:
+                            best, best_distance = index, distance
+                ring += 1
+            item = (best % count, best >= count)
+            used[item[0]] = True
+            order.append(item)
+            position = self._ends(item, heads, tails)[1]
+        return order
+
+    def _ring(self, cx, cy, ring, size):
+        if ring == 0:
+            return [(cx, cy)]
+        columns = range(max(cx - ring, 0), min(cx + ring, size) + 1)
+        rows = range(max(cy - ring + 1, 0), min(cy + ring - 1, size) + 1)
+        cells = []
+        for y in (cy - ring, cy + ring):
+            if 0 <= y <= size:
+                cells.extend([(x, y) for x in columns])
+        for x in (cx - ring, cx + ring):
+            if 0 <= x <= size:
+                cells.extend([(x, y) for y in rows])
+        return cells
+
+    def _two_opt(self, order, heads, tails):
+        order = list(order)
+        ends = [self._ends(item, heads, tails) for item in order]
+        for iteration in range(self._passes):
+            improved = False
+            for i in range(-1, len(order) - 1):
+                for j in range(i + 1, min(len(order), i + 1 + self._window)):
+                    a = self._position if i < 0 else ends[i][1]
+                    b = ends[i + 1][0]
+                    c = ends[j][1]
+                    change = self._distance(a, c) - self._distance(a, b)
+                    if j + 1 < len(order):
+                        d = ends[j + 1][0]
+                        change += self._distance(b, d) - self._distance(c, d)
+                    if change < -1e-9:
+                        order[i + 1:j + 1] = [(polyline, not reverse) for (polyline, reverse) in reversed(order[i + 1:j + 1])]
+                        ends[i + 1:j + 1] = [(exit, entry) for (entry, exit) in reversed(ends[i + 1:j + 1])]
+                        improved = True
+            if not improved:
+                break
+        return order
+
+    def _build_layer(self, layer, draw_index, bounds, firsts, order):
+        '''Joins the polylines with moves, leaving out the move where a polyline starts where the last ended, or
+        where the first starts where the layer already began drawing, so layers still open with a draw.'''
+        kinds, starts, ends, speeds = [], [], [], []
+        position = np.array(self._position, dtype=np.float64)
+        for (index, (polyline, reverse)) in enumerate(order):
+            indexes = draw_index[bounds[polyline]:bounds[polyline + 1]]
+            if reverse:
+                indexes = indexes[::-1]
+                polyline_starts, polyline_ends = layer.ends[indexes], layer.starts[indexes]
+            else:
+                polyline_starts, polyline_ends = layer.starts[indexes], layer.ends[indexes]
+            entry = tuple(polyline_starts[0].tolist())
+            drawn_from = layer.kinds[0] == ArrayLayer.DRAW and index == 0 and self._distance(layer.starts[0], entry) <= self._tollerance
+            if not drawn_from and self._distance(position, entry) > self._tollerance:
+                move = firsts[polyline] - 1
+                move_speed = layer.speeds[move] if move >= 0 and layer.kinds[move] == ArrayLayer.MOVE else layer.speeds[indexes[0]]
+                kinds.append([ArrayLayer.MOVE])
+                starts.append([position])
+                ends.append(polyline_starts[:1])
+                speeds.append([move_speed])
+            kinds.append([ArrayLayer.DRAW] * len(indexes))
+            starts.append(polyline_starts)
+            ends.append(polyline_ends)
+            speeds.append(layer.speeds[indexes])
+            position = polyline_ends[-1]
+        return ArrayLayer(layer.z, np.concatenate(starts), np.concatenate(ends), np.concatenate(speeds), np.concatenate(kinds))
+
+
+class SimplifyGenerator(LayerGenerator):
+    '''Removes vertices that bend a run of draws by less than the tolerance (Ramer-Douglas-Peucker), merging collinear
+    and sub resolution segments before they are sampled. Runs end at moves, position jumps and speed changes, and the
+    ends of each run are never moved. All runs in a layer are simplified together with numpy.'''
+
+    def __init__(self, layer_generator, tolerance, tollerance=0.001):
+        self._layer_generator = layer_generator
+        self._tolerance = tolerance
+        self._tollerance = tollerance
+        self.last_reduction = (0, 0)
+        self.commands_before = 0
+        self.commands_after = 0
+
+    def next(self):
+        layer = self._layer_generator.next()
+        if isinstance(layer, ArrayLayer):
+            return self._simplify(layer)
+        if any(type(command) not in ArrayLayer._KINDS for command in layer.commands):
+            return layer
+        return self._simplify(ArrayLayer.from_layer(layer)).to_layer()
+
+    def _simplify(self, layer):
+        draw_index = np.flatnonzero(layer.kinds == ArrayLayer.DRAW)
+        if len(draw_index) < 2:
+            return layer
+        breaks = _draw_breaks(layer, draw_index, self._tollerance) | (np.diff(layer.speeds[draw_index]) != 0)
+        run_id = np.concatenate(([0], np.cumsum(breaks)))
+        run_firsts = np.concatenate(([0], np.flatnonzero(breaks) + 1))
+
+        end_vertex = np.arange(len(draw_index)) + run_id + 1
+        start_vertex = run_firsts + np.arange(len(run_firsts))
+        vertices = np.empty((len(draw_index) + len(run_firsts), 2))
+        vertices[end_vertex] = layer.ends[draw_index]
+        vertices[start_vertex] = layer.starts[draw_index[run_firsts]]
+
+        keep = self._keep(vertices, start_vertex, np.concatenate((start_vertex[1:] - 1, [len(vertices) - 1])))
+
+        vertex_index = np.arange(len(vertices))
+        last_kept = np.maximum.accumulate(np.where(keep, vertex_index, -1))
+        rows = np.ones(len(layer), dtype=bool)
+        rows[draw_index] = keep[end_vertex]
+        starts = layer.starts.copy()
+        starts[draw_index] = vertices[last_kept[end_vertex - 1]]
+
+        before, after = len(layer), int(rows.sum())
+        self.last_reduction = (before, after)
+        self.commands_before += before
+        self.commands_after += after
+        logger.info("Layer %.3f simplified from %d to %d commands" % (layer.z, before, after))
+        return ArrayLayer(layer.z, starts[rows], layer.ends[rows], layer.speeds[rows], layer.kinds[rows])
+
+    def _keep(self, vertices, firsts, lasts):
+        keep = np.zeros(len(vertices), dtype=bool)
+        keep[firsts] = True
+        keep[lasts] = True
+        lows, highs = firsts, lasts
+        while True:
+            open_ranges = highs - lows > 1
+            lows, highs = lows[open_ranges], highs[open_ranges]
+            if len(lows) == 0:
+                return keep
+            counts = highs - lows - 1
+            range_id = np.repeat(np.arange(len(lows)), counts)
+            offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            interior = lows[range_id] + 1 + np.arange(counts.sum()) - offsets[range_id]
+            distances = self._distances(vertices[interior], vertices[lows][range_id], vertices[highs][range_id])
+
+            furthest = np.maximum.reduceat(distances, offsets)
+            at_furthest = np.flatnonzero(distances == furthest[range_id])
+            ranges, first = np.unique(range_id[at_furthest], return_index=True)
+            split = interior[at_furthest[first]]
+            splitting = furthest[ranges] > self._tolerance
+            ranges, split = ranges[splitting], split[splitting]
+            keep[split] = True
+            lows, highs = np.concatenate((lows[ranges], split)), np.concatenate((split, highs[ranges]))
+
+    def _distances(self, points, starts, ends):
+        chords = ends - starts
+        lengths = (chords ** 2).sum(axis=1)
+        along = ((points - starts) * chords).sum(axis=1) / np.where(lengths > 0, lengths, 1.0)
+        nearest = starts + np.clip(along, 0.0, 1.0)[:, np.newaxis] * chords
+        return np.hypot(*(points - nearest).T)
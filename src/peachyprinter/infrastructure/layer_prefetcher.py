@@ -0,0 +1,97 @@
+import threading
+import logging
+import time
+import Queue
+logger = logging.getLogger('peachy')
+
+from peachyprinter.infrastructure.layer_generators import LayerGenerator
+
+
+class LayerPrefetcher(LayerGenerator):
+    '''Pulls layers from a generator on its own thread, keeping up to depth layers queued ahead of the consumer.
+    Exceptions raised by the wrapped generator are handed to the consumer in order.'''
+
+    POLL_SECONDS = 0.1
+
+    def __init__(self, layer_generator, depth=4):
+        if depth < 1:
+            raise Exception("Prefetch depth must be at least 1")
+        self._layer_generator = layer_generator
+        self._queue = Queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._finished = False
+        self._producer_stall_time = 0.0
+        self._consumer_stall_time = 0.0
+        self._thread = threading.Thread(target=self._produce, name='LayerPrefetcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def depth(self):
+        return self._queue.maxsize
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    @property
+    def producer_stall_time(self):
+        return self._producer_stall_time
+
+    @property
+    def consumer_stall_time(self):
+        return self._consumer_stall_time
+
+    def next(self):
+        if self._finished:
+            raise StopIteration
+        started = time.time()
+        while True:
+            try:
+                layer, error = self._queue.get(timeout=self.POLL_SECONDS)
+                break
+            except Queue.Empty:
+                if self._stop.is_set():
+                    self._finished = True
+                    raise StopIteration
+        self._consumer_stall_time += time.time() - started
+        if error is not None:
+            if isinstance(error, StopIteration):
+                self._finished = True
+            raise error
+        return layer
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+        self._thread.join()
+        self.flush()
+
+    def flush(self):
+        try:
+            while True:
+                self._queue.get_nowait()
+        except Queue.Empty:
+            pass
+
+    def _produce(self):
+        while not self._stop.is_set():
+            try:
+                item = (self._layer_generator.next(), None)
+            except StopIteration as si:
+                self._put((None, si))
+                return
+            except Exception as ex:
+                logger.error('Layer prefetch failed: %s' % str(ex))
+                item = (None, ex)
+            self._put(item)
+
+    def _put(self, item):
+        started = time.time()
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=self.POLL_SECONDS)
+                break
+            except Queue.Full:
+                pass
+        self._producer_stall_time += time.time() - started
@@ -1,4 +1,10 @@
 import datetime
+import threading
+import collections
+import time
+import numpy
+
+from peachyprinter.infrastructure.status_dispatcher import StatusDispatcher, StatusEvent, StatusSubscription
 
 
 class MachineState(object):
@@ -26,14 +32,29 @@ class MachineError(object):
         self.layer = layer
 
 
+StatusCursor = collections.namedtuple('StatusCursor', ['version', 'axis', 'errors', 'drip_time'])
+
+
 class MachineStatus(object):
-    def __init__(self):
+    '''Status of a running print. Every change bumps a version number, and status_since(cursor) returns only the
+    values, layer axis data, errors and drip times added since the cursor it was handed last time. Per layer axis
+    data is kept in a growable array and only the most recent error_limit errors are retained. Layer, drip, error
+    and status events can also be pushed to subscribers, see subscribe.'''
+
+    AXIS_COLUMNS = 5
+
+    def __init__(self, error_limit=100):
+        self._lock = threading.Lock()
+        self._dispatcher = None
+        self._version = 0
+        self._field_versions = {}
         self._current_layer = 0
         self._laser_state = False
         self._waiting_for_drips = True
         self._height = 0.0
         self._model_height = 0.0
-        self._errors = []
+        self._errors = collections.deque(maxlen=error_limit)
+        self._error_count = 0
         self._start_time = datetime.datetime.now()
         self._stop_time = None
         self._complete = False
@@ -41,49 +62,131 @@ class MachineStatus(object):
         self._failed = False
         self._drips = 0
         self._drips_per_second = 0
-        self._drip_history = []
-        self._axis = []
+        self._drip_history = numpy.zeros(0)
+        self._axis = numpy.zeros((16, self.AXIS_COLUMNS))
+        self._axis_count = 0
         self._skipped_layers = 0
+        self._layer_queue_depth = 0
+        self._layer_producer_stall_time = 0.0
+        self._layer_consumer_stall_time = 0.0
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def current_layer(self):
+        return self._current_layer
+
+    def _changed(self, *fields):
+        self._version += 1
+        for field in fields:
+            self._field_versions[field] = self._version
+
+    def _publish(self, event_type, data):
+        if self._dispatcher:
+            self._dispatcher.publish(StatusEvent(event_type, self._version, time.time(), data))
+
+    def subscribe(self, call_back, events=None, max_rate=10.0, queue_length=100):
+        '''Calls call_back with lists of StatusEvents from a dispatch thread, no more then max_rate times a second.
+        events limits the event types delivered, see StatusSubscription.EVENTS. Close the returned subscription to stop.'''
+        subscription = StatusSubscription(call_back, events, max_rate, queue_length)
+        with self._lock:
+            if self._dispatcher is None:
+                self._dispatcher = StatusDispatcher()
+            return self._dispatcher.subscribe(subscription)
+
+    def close(self):
+        with self._lock:
+            dispatcher, self._dispatcher = self._dispatcher, None
+        if dispatcher:
+            dispatcher.close()
 
     def drip_call_back(self, drips, height, drips_per_second, drip_history=[]):
-        self._height = height
-        self._drips = drips
-        self._drips_per_second = drips_per_second
-        self._drip_history = drip_history
+        '''drip_history is kept as it is handed over, not copied. The z axes hand over a copy of their history
+        that nothing else holds, so it must not be changed afterwards.'''
+        with self._lock:
+            self._height = height
+            self._drips = drips
+            self._drips_per_second = drips_per_second
+            self._drip_history = drip_history
+            self._changed('height', 'drips', 'drips_per_second', 'drip_history')
+            self._publish('drip', {'drips': drips, 'height': height, 'drips_per_second': drips_per_second})
 
     def add_layer(self):
-        self._current_layer += 1
+        with self._lock:
+            self._current_layer += 1
+            self._changed('current_layer')
+            self._publish('layer_started', {'layer': self._current_layer})
 
     def skipped_layer(self):
-        self._skipped_layers += 1
+        with self._lock:
+            self._skipped_layers += 1
+            self._changed('skipped_layers')
+            self._publish('layer_skipped', {'layer': self._current_layer})
+
+    def set_layer_queue(self, queue_depth, producer_stall_time, consumer_stall_time):
+        with self._lock:
+            self._layer_queue_depth = queue_depth
+            self._layer_producer_stall_time = producer_stall_time
+            self._layer_consumer_stall_time = consumer_stall_time
+            self._changed('layer_queue_depth', 'layer_producer_stall_time', 'layer_consumer_stall_time')
 
     def add_error(self, error):
-        self._errors.append(error)
+        with self._lock:
+            self._errors.append(error)
+            self._error_count += 1
+            self._changed('errors')
+            self._publish('error', self._formatted_errors([error])[0])
 
     def add_axis_data(self, axis):
-        self._axis.append(axis)
+        [[min_x, max_x], [min_y, max_y], height] = axis
+        with self._lock:
+            if self._axis_count == len(self._axis):
+                self._axis = numpy.resize(self._axis, (len(self._axis) * 2, self.AXIS_COLUMNS))
+            self._axis[self._axis_count] = numpy.array([min_x, max_x, min_y, max_y, height], dtype=float)
+            self._axis_count += 1
+            self._changed('axis')
+            self._publish('layer_completed', {'layer': self._current_layer, 'axis': [[min_x, max_x], [min_y, max_y], height]})
 
     def set_waiting_for_drips(self):
-        self._waiting_for_drips = True
+        with self._lock:
+            if not self._waiting_for_drips:
+                self._waiting_for_drips = True
+                self._changed('waiting_for_drips')
 
     @property
     def waiting_for_drips(self):
         return self._waiting_for_drips
 
     def set_not_waiting_for_drips(self):
-        self._waiting_for_drips = False
+        with self._lock:
+            if self._waiting_for_drips:
+                self._waiting_for_drips = False
+                self._changed('waiting_for_drips')
 
     def set_model_height(self, model_height):
-        self._model_height = model_height
+        with self._lock:
+            self._model_height = model_height
+            self._changed('model_height')
 
     def set_complete(self):
-        self._complete = True
+        with self._lock:
+            self._complete = True
+            self._changed()
+            self._publish('status', {'status': self._status()})
 
     def set_aborted(self):
-        self._aborted = True
+        with self._lock:
+            self._aborted = True
+            self._changed()
+            self._publish('status', {'status': self._status()})
 
     def set_failed(self):
-        self._failed = True
+        with self._lock:
+            self._failed = True
+            self._changed()
+            self._publish('status', {'status': self._status()})
 
     def _elapsed_time(self):
         return datetime.datetime.now() - self._start_time
@@ -100,22 +203,70 @@ class MachineStatus(object):
         else:
             return 'Running'
 
-    def _formatted_errors(self):
-        return [{'time': error.timestamp, 'message': error.message, 'layer': error.layer} for error in self._errors]
+    def _formatted_errors(self, errors):
+        return [{'time': error.timestamp, 'message': error.message, 'layer': error.layer} for error in errors]
 
-    def status(self):
+    def _formatted_axis(self, start):
+        axis = self._axis[start:self._axis_count].astype(object)
+        axis[numpy.isnan(self._axis[start:self._axis_count])] = None
+        return [[[min_x, max_x], [min_y, max_y], height] for (min_x, max_x, min_y, max_y, height) in axis.tolist()]
+
+    def _values(self):
         return {
-            'start_time': self._start_time,
-            'elapsed_time': self._elapsed_time(),
             'current_layer': self._current_layer,
-            'status': self._status(),
-            'errors': self._formatted_errors(),
             'waiting_for_drips': self._waiting_for_drips,
             'height': self._height,
             'drips': self._drips,
             'drips_per_second': self._drips_per_second,
             'model_height': self._model_height,
             'skipped_layers': self._skipped_layers,
-            'drip_history': self._drip_history,
-            'axis': self._axis
+            'layer_queue_depth': self._layer_queue_depth,
+            'layer_producer_stall_time': self._layer_producer_stall_time,
+            'layer_consumer_stall_time': self._layer_consumer_stall_time,
         }
+
+    def _cursor(self):
+        drip_time = self._drip_history[-1] if len(self._drip_history) else None
+        return StatusCursor(self._version, self._axis_count, self._error_count, drip_time)
+
+    def status(self):
+        with self._lock:
+            status = self._values()
+            status.update({
+                'version': self._version,
+                'start_time': self._start_time,
+                'elapsed_time': self._elapsed_time(),
+                'status': self._status(),
+                'errors': self._formatted_errors(self._errors),
+                'drip_history': list(self._drip_history),
+                'axis': self._formatted_axis(0),
+            })
+            return status
+
+    def status_since(self, cursor=None):
+        '''Returns what changed after cursor, or everything when cursor is None. version, cursor, status and
+        elapsed_time are always present. axis, errors and drip_history hold only the entries added since the cursor,
+        and missed_errors counts errors dropped from the log before they could be returned.'''
+        with self._lock:
+            if cursor is None:
+                cursor = StatusCursor(-1, 0, 0, None)
+            changes = dict((field, value) for (field, value) in self._values().items() if self._field_versions.get(field, 0) > cursor.version)
+            if cursor.version < 0:
+                changes['start_time'] = self._start_time
+            if self._axis_count > cursor.axis:
+                changes['axis'] = self._formatted_axis(cursor.axis)
+            if self._error_count > cursor.errors:
+                new_errors = min(self._error_count - cursor.errors, len(self._errors))
+                changes['errors'] = self._formatted_errors(list(self._errors)[-new_errors:])
+                changes['missed_errors'] = self._error_count - cursor.errors - new_errors
+            if self._field_versions.get('drip_history', 0) > cursor.version:
+                history = numpy.asarray(self._drip_history)
+                start = 0 if cursor.drip_time is None else numpy.searchsorted(history, cursor.drip_time, 'right')
+                changes['drip_history'] = history[start:].tolist()
+            changes.update({
+                'version': self._version,
+                'cursor': self._cursor(),
+                'status': self._status(),
+                'elapsed_time': self._elapsed_time(),
+            })
+            return changes
@@ -1,7 +1,8 @@
 import logging
 logger = logging.getLogger('peachy')
+import numpy
 try:
-    from messages_pb2 import Move, DripRecorded, SetDripCount, MoveToDripCount, IAm
+    from messages_pb2 import Move, DripRecorded, SetDripCount, MoveToDripCount, IAm, Hold
 except Exception as ex:
     logger.error(
         "\033[91m Cannot import protobuf classes, Have you compiled your protobuf files?\033[0m")
@@ -18,6 +19,26 @@ class ProtoBuffableMessage(object):
     def from_bytes(cls, proto_bytes):
         raise NotImplementedError()
 
+    def frame(self):
+        data = chr(self.TYPE_ID) + self.get_bytes()
+        return chr(len(data)) + data
+
+
+_VARINT_MAX = 10
+_VARINT_SHIFTS = numpy.arange(_VARINT_MAX, dtype=numpy.uint64) * numpy.uint64(7)
+
+
+def _varints(values):
+    '''Protobuf varint encodes integers returning (bytes, valid) arrays of shape (N, 10); negatives use the 10 byte form'''
+    values = numpy.asarray(values, dtype=numpy.int64).view(numpy.uint64)
+    groups = (values[:, numpy.newaxis] >> _VARINT_SHIFTS) & numpy.uint64(0x7F)
+    lengths = _VARINT_MAX - numpy.argmax(groups[:, ::-1] != 0, axis=1)
+    lengths[values == 0] = 1
+    positions = numpy.arange(_VARINT_MAX)
+    more = positions < (lengths - 1)[:, numpy.newaxis]
+    encoded = groups.astype(numpy.uint8) | (more.astype(numpy.uint8) << 7)
+    return encoded, positions < lengths[:, numpy.newaxis]
+
 
 class MoveMessage(ProtoBuffableMessage):
     TYPE_ID = 2
@@ -56,6 +77,36 @@ class MoveMessage(ProtoBuffableMessage):
         decoded.ParseFromString(proto_bytes)
         return cls(decoded.x, decoded.y, decoded.laserPower)
 
+    @classmethod
+    def frames(cls, x_positions, y_positions, laser_power):
+        '''Encodes a batch of moves as the framed byte stream produced by calling frame() on each MoveMessage.
+        laser_power is either one power for every move or one per move.'''
+        x_bytes, x_valid = _varints(x_positions)
+        y_bytes, y_valid = _varints(y_positions)
+        count = len(x_bytes)
+        if numpy.ndim(laser_power):
+            power_bytes, power_valid = _varints(laser_power)
+        else:
+            power_bytes, power_valid = _varints([laser_power])
+            power_bytes = power_bytes[:, power_valid[0]]
+            power_valid = power_valid[:, power_valid[0]]
+        size = 4 + x_valid.sum(axis=1) + y_valid.sum(axis=1) + power_valid.sum(axis=1)
+
+        rows = numpy.empty((count, 2 + 1 + _VARINT_MAX + 1 + _VARINT_MAX + 1 + power_bytes.shape[1]), dtype=numpy.uint8)
+        valid = numpy.ones(rows.shape, dtype=bool)
+        rows[:, 0] = size
+        rows[:, 1] = cls.TYPE_ID
+        rows[:, 2] = 0x08
+        rows[:, 3:13] = x_bytes
+        valid[:, 3:13] = x_valid
+        rows[:, 13] = 0x10
+        rows[:, 14:24] = y_bytes
+        valid[:, 14:24] = y_valid
+        rows[:, 24] = 0x18
+        rows[:, 25:] = power_bytes
+        valid[:, 25:] = power_valid
+        return rows[valid].tostring()
+
     def __eq__(self, other):
         if (self.__class__ == other.__class__ and
                 self._x_pos == other._x_pos and
@@ -242,3 +293,62 @@ class IAmMessage(ProtoBuffableMessage):
 
     def __repr__(self):
         return "Serial Number: {}\n Sofware Revision: {}\nHardware Revision: {}\nData Rate: {}".format(self._sn, self._swrev, self._hwrev, self._dataRate)
+
+
+class HoldMessage(ProtoBuffableMessage):
+    '''Holds the mirrors at one position and laser power for a number of samples, standing in for that many
+    identical MoveMessages.'''
+    TYPE_ID = 9
+
+    def __init__(self, x_pos, y_pos, laser_power, samples):
+        self._x_pos = x_pos
+        self._y_pos = y_pos
+        self._laser_power = laser_power
+        self._samples = samples
+
+    @property
+    def x_pos(self):
+        return self._x_pos
+
+    @property
+    def y_pos(self):
+        return self._y_pos
+
+    @property
+    def laser_power(self):
+        return self._laser_power
+
+    @property
+    def samples(self):
+        return self._samples
+
+    def get_bytes(self):
+        encoded = Hold()
+        encoded.x = self._x_pos
+        encoded.y = self._y_pos
+        encoded.laserPower = self._laser_power
+        encoded.samples = self._samples
+        if encoded.IsInitialized():
+            return encoded.SerializeToString()
+        else:
+            logger.error("Protobuf Message encoding incomplete. Did the spec change? Have you compiled your proto files?")
+            raise Exception("Protobuf Message encoding incomplete")
+
+    @classmethod
+    def from_bytes(cls, proto_bytes):
+        decoded = Hold()
+        decoded.ParseFromString(proto_bytes)
+        return cls(decoded.x, decoded.y, decoded.laserPower, decoded.samples)
+
+    def __eq__(self, other):
+        if (self.__class__ == other.__class__ and
+                self._x_pos == other._x_pos and
+                self._y_pos == other._y_pos and
+                self._laser_power == other._laser_power and
+                self._samples == other._samples):
+            return True
+        else:
+            return False
+
+    def __repr__(self):
+        return "x:y={}:{}, laser_power={}, samples={}".format(self._x_pos, self._y_pos, self._laser_power, self._samples)
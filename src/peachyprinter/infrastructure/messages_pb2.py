@@ -13,7 +13,7 @@ from google.protobuf import descriptor_pb2
 DESCRIPTOR = _descriptor.FileDescriptor(
   name='messages.proto',
   package='',
-  serialized_pb='\n\x0emessages.proto\"0\n\x04Move\x12\t\n\x01x\x18\x01 \x02(\x05\x12\t\n\x01y\x18\x02 \x02(\x05\x12\x12\n\nlaserPower\x18\x03 \x02(\r\"\x1d\n\x0c\x44ripRecorded\x12\r\n\x05\x64rips\x18\x01 \x02(\r\"\x1d\n\x0cSetDripCount\x12\r\n\x05\x64rips\x18\x01 \x02(\r\" \n\x0fMoveToDripCount\x12\r\n\x05\x64rips\x18\x01 \x02(\r\"\n\n\x08Identify\"A\n\x03IAm\x12\r\n\x05swrev\x18\x01 \x02(\t\x12\r\n\x05hwrev\x18\x02 \x02(\t\x12\n\n\x02sn\x18\x03 \x02(\t\x12\x10\n\x08\x64\x61taRate\x18\x04 \x02(\r\"&\n\x07Measure\x12\n\n\x02id\x18\x01 \x02(\x05\x12\x0f\n\x07\x63hannel\x18\x02 \x02(\x05')
+  serialized_pb='\n\x0emessages.proto\"0\n\x04Move\x12\t\n\x01x\x18\x01 \x02(\x05\x12\t\n\x01y\x18\x02 \x02(\x05\x12\x12\n\nlaserPower\x18\x03 \x02(\r\"\x1d\n\x0c\x44ripRecorded\x12\r\n\x05\x64rips\x18\x01 \x02(\r\"\x1d\n\x0cSetDripCount\x12\r\n\x05\x64rips\x18\x01 \x02(\r\" \n\x0fMoveToDripCount\x12\r\n\x05\x64rips\x18\x01 \x02(\r\"\n\n\x08Identify\"A\n\x03IAm\x12\r\n\x05swrev\x18\x01 \x02(\t\x12\r\n\x05hwrev\x18\x02 \x02(\t\x12\n\n\x02sn\x18\x03 \x02(\t\x12\x10\n\x08\x64\x61taRate\x18\x04 \x02(\r\"&\n\x07Measure\x12\n\n\x02id\x18\x01 \x02(\x05\x12\x0f\n\x07\x63hannel\x18\x02 \x02(\x05\"A\n\x04Hold\x12\t\n\x01x\x18\x01 \x02(\x05\x12\t\n\x01y\x18\x02 \x02(\x05\x12\x12\n\nlaserPower\x18\x03 \x02(\r\x12\x0f\n\x07samples\x18\x04 \x02(\r')
 
 
 
@@ -248,6 +248,55 @@ _MEASURE = _descriptor.Descriptor(
   serialized_end=281,
 )
 
+
+_HOLD = _descriptor.Descriptor(
+  name='Hold',
+  full_name='Hold',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='x', full_name='Hold.x', index=0,
+      number=1, type=5, cpp_type=1, label=2,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='y', full_name='Hold.y', index=1,
+      number=2, type=5, cpp_type=1, label=2,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='laserPower', full_name='Hold.laserPower', index=2,
+      number=3, type=13, cpp_type=3, label=2,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='samples', full_name='Hold.samples', index=3,
+      number=4, type=13, cpp_type=3, label=2,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  extension_ranges=[],
+  serialized_start=283,
+  serialized_end=348,
+)
+
 DESCRIPTOR.message_types_by_name['Move'] = _MOVE
 DESCRIPTOR.message_types_by_name['DripRecorded'] = _DRIPRECORDED
 DESCRIPTOR.message_types_by_name['SetDripCount'] = _SETDRIPCOUNT
@@ -255,6 +304,7 @@ DESCRIPTOR.message_types_by_name['MoveToDripCount'] = _MOVETODRIPCOUNT
 DESCRIPTOR.message_types_by_name['Identify'] = _IDENTIFY
 DESCRIPTOR.message_types_by_name['IAm'] = _IAM
 DESCRIPTOR.message_types_by_name['Measure'] = _MEASURE
+DESCRIPTOR.message_types_by_name['Hold'] = _HOLD
 
 class Move(_message.Message):
   __metaclass__ = _reflection.GeneratedProtocolMessageType
@@ -298,5 +348,11 @@ class Measure(_message.Message):
 
   # @@protoc_insertion_point(class_scope:Measure)
 
+class Hold(_message.Message):
+  __metaclass__ = _reflection.GeneratedProtocolMessageType
+  DESCRIPTOR = _HOLD
+
+  # @@protoc_insertion_point(class_scope:Hold)
+
 
 # @@protoc_insertion_point(module_scope)
@@ -1,8 +1,9 @@
 import logging
 logger = logging.getLogger('peachy')
 import sys
+import numpy
 from peachyprinter.domain.disseminator import Disseminator
-from peachyprinter.infrastructure.messages import MoveMessage
+from peachyprinter.infrastructure.messages import MoveMessage, HoldMessage
 
 
 class MicroDisseminator(Disseminator):
@@ -13,18 +14,46 @@ class MicroDisseminator(Disseminator):
         self._communication = comunication
         self.LASER_MAX = pow(2, 8) - 1
         self.DEFLECTION_MAX = pow(2, self.BIT_DEPTH) - 1
+        self._recording = None
 
-    def process(self, data):
+    def process(self, data, laser_powers=None):
+        if len(data) == 0:
+            return
+        if laser_powers is None:
+            laser_power = int(self._laser_control.laser_power() * self.LASER_MAX)
+        else:
+            laser_power = (numpy.asarray(laser_powers, dtype=numpy.float64) * self.LASER_MAX).astype(numpy.int64)
+        data = numpy.asarray(data, dtype=numpy.float64)
+        x_scaled = (data[:, 0] * self.DEFLECTION_MAX).astype(numpy.int64)
+        y_scaled = (data[:, 1] * self.DEFLECTION_MAX).astype(numpy.int64)
+        frames = MoveMessage.frames(x_scaled, y_scaled, laser_power)
+        if self._recording is not None:
+            self._recording.extend(frames)
+        self._communication.send_frames(frames)
+
+    def hold(self, position, samples):
         laser_power = int(self._laser_control.laser_power() * self.LASER_MAX)
-        for (x, y) in data:
-            x_scaled = int(x * self.DEFLECTION_MAX)
-            y_scaled = int(y * self.DEFLECTION_MAX)
-            data = MoveMessage(x_scaled, y_scaled, laser_power)
-            self._communication.send(data)
+        x_scaled = int(position[0] * self.DEFLECTION_MAX)
+        y_scaled = int(position[1] * self.DEFLECTION_MAX)
+        self._communication.send(HoldMessage(x_scaled, y_scaled, laser_power, samples))
 
     def next_layer(self, height):
         pass
 
+    def flush(self):
+        self._communication.flush()
+
+    def start_recording(self):
+        self._recording = bytearray()
+
+    def stop_recording(self):
+        frames = self._recording
+        self._recording = None
+        return None if frames is None else str(frames)
+
+    def replay(self, frames):
+        self._communication.send_frames(frames)
+
     @property
     def samples_per_second(self):
         return self._data_rate
@@ -16,47 +16,131 @@ class PathToPoints(object):
         self._left_over_start = None
         self._last_z = 0.0
         self._reported_small_warning = False
+        self.clipped_points = 0
 
     def _distance(self, a, b):
         a2 = math.pow((a[0] - b[0]), 2)
         b2 = math.pow((a[1] - b[1]), 2)
         return math.sqrt(a2 + b2)
 
-    def _get_points(self, start, end, points):
-        start = self._transformer.transform(start)
-        end = self._transformer.transform(end)
-        x_points = numpy.linspace(start[0], end[0], num=points, endpoint=True)
-        y_points = numpy.linspace(start[1], end[1], num=points, endpoint=True)
-        return numpy.column_stack((x_points, y_points))
-
     def process(self, start, end, speed):
+        '''Samples one segment, sharing the left over carry and interpolation of process_many. The start and end
+        are transformed at their own heights.'''
         with self._lock:
-            if start[2] > self._last_z:
-                self._left_over_samples = 0.0
-                self._left_over_start = None
-                self._last_z = start[2]
-                self._reported_small_warning = False
+            self._start_height(start[2])
             distance = self._distance(start, end)
             if distance == 0:
                 distance = self.laser_size
-            seconds = distance / speed
-            samples = (self.samples_per_second * seconds) + self._left_over_samples
-            if samples < 2.0:
-                if not self._reported_small_warning:
-                    logger.info("The data in the model is too complex skipping vertex(s) at height %s mm" % start[2])
-                    self._reported_small_warning = True
-                if not self._left_over_start:
-                    self._left_over_start = start
-                self._left_over_samples = samples
+            starts = numpy.array([start[:2]], dtype=float)
+            samples = numpy.array([self.samples_per_second * distance / speed])
+            origins = starts.copy()
+            if not self._carry_left_over_samples(starts, samples, origins, start[2])[0]:
                 return numpy.empty((0, 2))
+            transformed, clipped = self._transformer.transform_many([[origins[0][0], origins[0][1], start[2]], end])
+            self._report_clipped(clipped, end[2])
+            return self._interpolate(transformed[:1], transformed[1:], samples.astype(int))
+
+    def _start_height(self, z):
+        if z > self._last_z:
+            self._left_over_samples = 0.0
+            self._left_over_start = None
+            self._last_z = z
+            self._reported_small_warning = False
+
+    def hold(self, position, seconds):
+        '''Returns the deflection for position and the number of samples spanning seconds, for a disseminator to hold
+        in place of streaming that many identical points.'''
+        transformed, clipped = self._transformer.transform_many([position])
+        self._report_clipped(clipped, position[2])
+        return transformed[0], int(self.samples_per_second * seconds)
+
+    def process_many(self, starts, ends, speeds, draws, z, laser_power=1.0):
+        starts = numpy.asarray(starts, dtype=float).reshape(-1, 2)
+        ends = numpy.asarray(ends, dtype=float).reshape(-1, 2)
+        speeds = numpy.asarray(speeds, dtype=float).reshape(-1)
+        draws = numpy.asarray(draws, dtype=bool).reshape(-1)
+        with self._lock:
+            self._start_height(z)
+            if len(starts) == 0:
+                return numpy.empty((0, 2)), numpy.empty((0,))
+
+            distances = numpy.sqrt(numpy.sum((starts - ends) ** 2, axis=1))
+            distances[distances == 0] = self.laser_size
+            samples = self.samples_per_second * (distances / speeds)
+            origins = starts.copy()
+            emit = self._carry_left_over_samples(starts, samples, origins, z)
+
+            origins = origins[emit]
+            ends = ends[emit]
+            counts = samples[emit].astype(int)
+            powers = numpy.where(draws[emit], laser_power, 0.0)
+            if len(counts) == 0:
+                return numpy.empty((0, 2)), numpy.empty((0,))
+
+            origins, ends = numpy.split(self._transform_many(numpy.vstack((origins, ends)), z), 2)
+            return self._interpolate(origins, ends, counts), numpy.repeat(powers, counts)
+
+    def _carry_left_over_samples(self, starts, samples, origins, z):
+        # Only vertices too short to sample need the sequential carry, every
+        # other segment is emitted as is.
+        emit = samples >= 2.0
+        short = numpy.flatnonzero(~emit)
+        carry = self._left_over_samples
+        carry_start = self._left_over_start[:2] if self._left_over_start else None
+        last = -1
+        for index in short:
+            if carry and index != last + 1:
+                self._absorb_carry(samples, origins, last + 1, carry, carry_start)
+                carry, carry_start = 0.0, None
+            total = samples[index] + carry
+            if total >= 2.0:
+                emit[index] = True
+                samples[index] = total
+                if carry_start is not None:
+                    origins[index] = carry_start
+                carry, carry_start = 0.0, None
             else:
-                self._left_over_samples = 0.0
-                if self._left_over_start:
-                    points = self._get_points(self._left_over_start, end, samples)
-                    self._left_over_start = None
-                    return points
-                else:
-                    return self._get_points(start, end, samples)
+                if not self._reported_small_warning:
+                    logger.info("The data in the model is too complex skipping vertex(s) at height %s mm" % z)
+                    self._reported_small_warning = True
+                if carry_start is None:
+                    carry_start = starts[index]
+                carry = total
+            last = index
+        if carry and last + 1 < len(samples):
+            self._absorb_carry(samples, origins, last + 1, carry, carry_start)
+            carry, carry_start = 0.0, None
+        self._left_over_samples = carry
+        self._left_over_start = [carry_start[0], carry_start[1], z] if carry_start is not None else None
+        return emit
+
+    def _absorb_carry(self, samples, origins, index, carry, carry_start):
+        samples[index] += carry
+        if carry_start is not None:
+            origins[index] = carry_start
+
+    def _transform_many(self, points, z):
+        xyz = numpy.column_stack((points, numpy.full(len(points), z, dtype=float)))
+        transformed, clipped = self._transformer.transform_many(xyz)
+        self._report_clipped(clipped, z)
+        return transformed
+
+    def _report_clipped(self, clipped, z):
+        if clipped:
+            self.clipped_points += clipped
+            logger.warning("Bounds of printer exceeded by %d point(s) at height %s mm" % (clipped, z))
+
+    def _interpolate(self, origins, ends, counts):
+        offsets = numpy.cumsum(counts) - counts
+        step_index = numpy.arange(counts.sum()) - numpy.repeat(offsets, counts)
+        steps = (ends - origins) / (counts - 1)[:, numpy.newaxis]
+        points = numpy.repeat(origins, counts, axis=0) + step_index[:, numpy.newaxis] * numpy.repeat(steps, counts, axis=0)
+        points[offsets + counts - 1] = ends
+        return points
+
+    @property
+    def transformer(self):
+        return self._transformer
 
     def set_transformer(self, transformer):
         with self._lock:
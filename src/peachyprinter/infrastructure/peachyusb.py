@@ -1,5 +1,7 @@
 from peachyprinter.libraries import load_library
 import ctypes
+import logging
+logger = logging.getLogger('peachy')
 
 class peachyusb_t(ctypes.Structure):
     pass
@@ -20,7 +22,11 @@ def _load_library():
     dll.peachyusb_write.restype = None
     return dll
 
-lib = _load_library()
+try:
+    lib = _load_library()
+except Exception as ex:
+    logger.error("libPeachyUSB unavailable, only the loopback device can be used: %s" % str(ex))
+    lib = None
 
 lib_version = "Not Implemented"
 
@@ -29,12 +35,19 @@ class PeachyUSBException(Exception):
 
 class PeachyUSB(object):
     def __init__(self, capacity):
+        self.context = None
+        if not lib:
+            raise PeachyUSBException("libPeachyUSB not available")
         self.context = lib.peachyusb_init(capacity)
         if not self.context:
             raise PeachyUSBException("No printer found")
 
     def __del__(self):
-        lib.peachyusb_shutdown(self.context)
+        self.close()
+
+    def close(self):
+        if self.context:
+            lib.peachyusb_shutdown(self.context)
         self.context = None
 
     def write(self, buf):
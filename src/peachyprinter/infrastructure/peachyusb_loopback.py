@@ -0,0 +1,184 @@
+import os
+import time
+import random
+import threading
+import collections
+import logging
+logger = logging.getLogger('peachy')
+
+from peachyprinter.infrastructure.messages import MoveMessage, HoldMessage, SetDripCountMessage, MoveToDripCountMessage, IdentifyMessage, IAmMessage, DripRecordedMessage
+
+
+class LoopbackPeachyUSB(object):
+    '''Stand-in for PeachyUSB that needs no hardware. Frames written are queued and drained at a modelled
+    bytes per second rate on a background thread, decoded as the printer would, and replies are delivered
+    through the read callback. A HoldMessage keeps the device busy for its samples at the data rate. Selected with the PEACHY_USB_LOOPBACK environment variable or circut.use_loopback.'''
+
+    ENVIRONMENT_VARIABLE = 'PEACHY_USB_LOOPBACK'
+    TICK_SECONDS = 0.001
+
+    def __init__(self, capacity, bytes_per_second=128000, jitter=0.0, drips_per_second=0.0, data_rate=8000):
+        self._capacity = capacity
+        self._bytes_per_second = float(bytes_per_second)
+        self._jitter = jitter
+        self._drips_per_second = drips_per_second
+        self._data_rate = data_rate
+
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._read_callback = None
+        self._running = True
+
+        self._drips = 0
+        self.target_drips = None
+        self.frames_written = 0
+        self.frames_drained = 0
+        self.moves_drained = 0
+        self.holds_drained = 0
+        self.held_samples = 0
+        self._hold_until = 0.0
+        self.underruns = 0
+        self.starved_time = 0.0
+        self.last_move = None
+        self._first_write_time = None
+
+        self._thread = threading.Thread(target=self._drain, name='LoopbackPeachyUSB')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @classmethod
+    def enabled(cls):
+        return bool(os.environ.get(cls.ENVIRONMENT_VARIABLE))
+
+    @classmethod
+    def from_environment(cls, capacity):
+        settings = {}
+        for (name, key) in [('bytes_per_second', 'BYTES_PER_SECOND'), ('jitter', 'JITTER'), ('drips_per_second', 'DRIPS_PER_SECOND'), ('data_rate', 'DATA_RATE')]:
+            value = os.environ.get('%s_%s' % (cls.ENVIRONMENT_VARIABLE, key))
+            if value:
+                settings[name] = float(value)
+        logger.info("Using loopback usb device: %s" % settings)
+        return cls(capacity, **settings)
+
+    def write(self, buf):
+        frames = self._split_frames(buf)
+        with self._condition:
+            while self._running and len(self._queue) >= self._capacity:
+                self._condition.wait(self.TICK_SECONDS)
+            if self._first_write_time is None:
+                self._first_write_time = time.time()
+            self._queue.extend(frames)
+            self.frames_written += len(frames)
+
+    def set_read_callback(self, func):
+        self._read_callback = func
+
+    def emit(self, message):
+        data = chr(message.TYPE_ID) + message.get_bytes()
+        if self._read_callback:
+            self._read_callback(data, len(data))
+
+    def close(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    @property
+    def samples_per_second(self):
+        if self._first_write_time is None:
+            return 0.0
+        return self.moves_drained / max(time.time() - self._first_write_time, self.TICK_SECONDS)
+
+    def status(self):
+        return {
+            'queue_depth': self.queue_depth,
+            'frames_written': self.frames_written,
+            'frames_drained': self.frames_drained,
+            'moves_drained': self.moves_drained,
+            'holds_drained': self.holds_drained,
+            'held_samples': self.held_samples,
+            'samples_per_second': self.samples_per_second,
+            'underruns': self.underruns,
+            'starved_time': self.starved_time,
+            }
+
+    def _split_frames(self, buf):
+        frames = []
+        index = 0
+        while index < len(buf):
+            length = ord(buf[index])
+            frame = buf[index + 1:index + 1 + length]
+            if length == 0 or len(frame) != length:
+                logger.error("Loopback usb device received a truncated frame")
+                raise Exception("Loopback usb device received a truncated frame")
+            frames.append(frame)
+            index += 1 + length
+        return frames
+
+    def _drain(self):
+        last_time = time.time()
+        budget = 0.0
+        starved = False
+        next_drip = None
+        while self._running:
+            time.sleep(self.TICK_SECONDS + random.uniform(0.0, self._jitter))
+            now = time.time()
+            elapsed = now - last_time
+            last_time = now
+            budget = min(budget + elapsed * self._bytes_per_second, self._bytes_per_second)
+            frames = []
+            holding = now < self._hold_until
+            with self._condition:
+                while not holding and self._queue and budget >= len(self._queue[0]) + 1:
+                    frame = self._queue.popleft()
+                    budget -= len(frame) + 1
+                    frames.append(frame)
+                    holding = ord(frame[0]) == HoldMessage.TYPE_ID
+                empty = not self._queue
+                self._condition.notify_all()
+            for frame in frames:
+                self._handle(frame)
+            if now < self._hold_until:
+                starved = False
+            elif empty and self._first_write_time is not None:
+                budget = 0.0
+                if starved:
+                    self.starved_time += elapsed
+                else:
+                    starved = True
+                    self.underruns += 1
+            else:
+                starved = False
+            if self._drips_per_second > 0:
+                if next_drip is None:
+                    next_drip = now + 1.0 / self._drips_per_second
+                while now >= next_drip:
+                    self._drips += 1
+                    self.emit(DripRecordedMessage(self._drips))
+                    next_drip += 1.0 / self._drips_per_second
+
+    def _handle(self, frame):
+        self.frames_drained += 1
+        message_type_id = ord(frame[0])
+        if message_type_id == MoveMessage.TYPE_ID:
+            self.moves_drained += 1
+            self.last_move = MoveMessage.from_bytes(frame[1:])
+        elif message_type_id == HoldMessage.TYPE_ID:
+            hold = HoldMessage.from_bytes(frame[1:])
+            self.holds_drained += 1
+            self.held_samples += hold.samples
+            self.moves_drained += hold.samples
+            self.last_move = MoveMessage(hold.x_pos, hold.y_pos, hold.laser_power)
+            self._hold_until = time.time() + hold.samples / float(self._data_rate)
+        elif message_type_id == SetDripCountMessage.TYPE_ID:
+            self._drips = SetDripCountMessage.from_bytes(frame[1:]).drips
+        elif message_type_id == MoveToDripCountMessage.TYPE_ID:
+            self.target_drips = MoveToDripCountMessage.from_bytes(frame[1:]).drips
+        elif message_type_id == IdentifyMessage.TYPE_ID:
+            self.emit(IAmMessage('loopback', 'loopback', 'loopback', int(self._data_rate)))
@@ -3,12 +3,14 @@ import sys
 import numpy as np
 import math
 import logging
+import multiprocessing
 logger = logging.getLogger('peachy')
 
 np.seterr(all='raise')
 
 sys.path.insert(0,os.path.join(os.path.dirname(__file__), '..'))
 from peachyprinter.domain.transformer import Transformer
+from peachyprinter.infrastructure.transformer import calibration_key, cached_fit, store_fit
 
 class SquareTransform(object):
     def __init__(self,points):
@@ -22,6 +24,13 @@ class SquareTransform(object):
         [kx, ky, k] = [ deflections.item(i, 0) for i in range(3) ]
         return [kx/k, ky/k]
 
+    def fit_many(self, x, y):
+        matrix = np.asarray(self.transformation_matrix)
+        kx = matrix[0, 0] * x + matrix[0, 1] * y + matrix[0, 2]
+        ky = matrix[1, 0] * x + matrix[1, 1] * y + matrix[1, 2]
+        k = matrix[2, 0] * x + matrix[2, 1] * y + matrix[2, 2]
+        return kx / k, ky / k
+
     def _generate_transformation_matrix(self,points):
         base_matrix = self._build_forward_matrix(points)
         solutions_vector = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1]
@@ -50,12 +59,30 @@ class SquareTransform(object):
                 augment[2][column] = -1
         return augment
 
+def _fit_errors((fit_x, fit_y, targets, candidates)):
+    '''Least squares residuals of the bent monomial fit for a batch of (xbend, ybend, scale) candidates'''
+    with np.errstate(all='ignore'):
+        xbend, ybend, scale = candidates[:, 0:1], candidates[:, 1:2], candidates[:, 2:3]
+        x = xbend * (scale * np.arctan(fit_x / scale)) + (1.0 - xbend) * fit_x
+        y = ybend * (scale * np.arctan(fit_y / scale)) + (1.0 - ybend) * fit_y
+        design = np.concatenate([term[..., np.newaxis] for term in (x ** 3, x ** 2 * y, x * y ** 2, y ** 3, x ** 2, x * y, y ** 2, x, y, np.ones_like(x))], axis=-1)
+        u, singular, vt = np.linalg.svd(design, full_matrices=False)
+        projected = np.einsum('bnk,nt->bkt', u, targets) / singular[:, :, np.newaxis]
+        solution = np.einsum('bkj,bkt->bjt', vt, projected)
+        residual = targets[np.newaxis] - np.einsum('bnj,bjt->bnt', design, solution)
+        return (residual ** 2).sum(axis=(1, 2))
+
+
 class PointTransformer(Transformer):
-    def __init__(self, calibration_points):
+    SHORTLIST_TOLERANCE = 1e-6
+
+    def __init__(self, calibration_points, grid_resolution=None, processes=None, fit_cache=None):
         if len(calibration_points) < 12:
             logger.error("Not Enough Calibration Points")
             raise Exception("Not Enough Calibration Points")
 
+        self._processes = processes
+        self._pool = None
         self.squarer = SquareTransform(calibration_points[:4])
         self.monomials = [
             lambda x,y : x**3,
@@ -70,34 +97,68 @@ class PointTransformer(Transformer):
             lambda x,y : 1
         ]
 
-        self.calibrated_bend_x, self.calibrated_bend_y, self.coeffecient_vector_x, self.coeffecient_vector_y, self.calibrated_scale = self._get_best_bends(calibration_points,self.monomials)
+        key = calibration_key(calibration_points)
+        fit = cached_fit(fit_cache, 'point', key)
+        if fit:
+            self.calibrated_bend_x = fit['bend_x']
+            self.calibrated_bend_y = fit['bend_y']
+            self.coeffecient_vector_x = np.array(fit['coeffecient_vector_x'])
+            self.coeffecient_vector_y = np.array(fit['coeffecient_vector_y'])
+            self.calibrated_scale = fit['scale']
+        else:
+            self.calibrated_bend_x, self.calibrated_bend_y, self.coeffecient_vector_x, self.coeffecient_vector_y, self.calibrated_scale = self._get_best_bends(calibration_points,self.monomials)
+            store_fit(fit_cache, 'point', key, {
+                'bend_x': self.calibrated_bend_x,
+                'bend_y': self.calibrated_bend_y,
+                'coeffecient_vector_x': np.asarray(self.coeffecient_vector_x).ravel().tolist(),
+                'coeffecient_vector_y': np.asarray(self.coeffecient_vector_y).ravel().tolist(),
+                'scale': self.calibrated_scale,
+                })
+
+        actuals = np.array([actual for (deflection, actual) in calibration_points], dtype=float)
+        self._grid_bounds = (actuals[:, 0].min(), actuals[:, 0].max(), actuals[:, 1].min(), actuals[:, 1].max())
+        if grid_resolution is not None and grid_resolution < 2:
+            logger.error("Grid resolution must be at least 2")
+            raise Exception("Grid resolution must be at least 2")
+        self._grid_resolution = grid_resolution
+        self._grid = None
+        self.grid_max_error = None
+        self._fit_cache = fit_cache
+        self._grid_key = calibration_key(calibration_points, grid_resolution) if grid_resolution else None
 
     def _get_best_bends(self,points,monomials):
-        best_bend = self._find_best_bends(
-            points,
-            monomials,
-            range(1,2001, 500),
-            range(1, 2001, 500),
-            range(1, 2001, 500),
-            500,
-            (0, 0, 0 ,0, 0, 10.0)
-            )
+        if self._processes and self._processes > 1:
+            self._pool = multiprocessing.Pool(self._processes)
+        try:
+            best_bend = self._find_best_bends(
+                points,
+                monomials,
+                range(1,2001, 500),
+                range(1, 2001, 500),
+                range(1, 2001, 500),
+                500,
+                (0, 0, 0 ,0, 0, 10.0)
+                )
+        finally:
+            if self._pool:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
         logger.info("Best Bend: %s,%s: %s" % (best_bend[0],best_bend[1], best_bend[4]))
         return best_bend[:5]
 
     factor = 1000.0
     def _find_best_bends(self,points,monomials, scale_range, x_range, y_range, step, best_bend):
-        for s in scale_range:
-            for y in y_range:
-                for x in x_range:
-                    xbend = x / self.factor
-                    ybend = y / self.factor
-                    scale = s / self.factor
-                    (coeffecient_vector_d1, error_d1), (coeffecient_vector_d2 , error_d2)= self._get_coeffecient_vectors(points, monomials,xbend,ybend,scale )
-                    error = error_d1[0] + error_d2[0]
-                    if best_bend[5] > error:
-                        logger.info('New Best: %s %s : %s -> %s' % (xbend, ybend, scale, error ))
-                        best_bend = (xbend, ybend, coeffecient_vector_d1,coeffecient_vector_d2, scale, error)
+        candidates = [(x / self.factor, y / self.factor, s / self.factor) for s in scale_range for y in y_range for x in x_range]
+        if candidates:
+            errors = self._candidate_errors(points, np.array(candidates))
+            for index in self._shortlist(errors):
+                xbend, ybend, scale = candidates[index]
+                (coeffecient_vector_d1, error_d1), (coeffecient_vector_d2 , error_d2)= self._get_coeffecient_vectors(points, monomials,xbend,ybend,scale )
+                error = error_d1[0] + error_d2[0]
+                if best_bend[5] > error:
+                    logger.info('New Best: %s %s : %s -> %s' % (xbend, ybend, scale, error ))
+                    best_bend = (xbend, ybend, coeffecient_vector_d1,coeffecient_vector_d2, scale, error)
         new_step = int(step - math.ceil(step / 2.0))
         if new_step > 0:
             x_range = range(int(best_bend[0] * self.factor) - step, int(best_bend[0] * self.factor) + step, new_step)
@@ -107,6 +168,25 @@ class PointTransformer(Transformer):
         else:
             return best_bend
 
+    def _candidate_errors(self, points, candidates):
+        actuals = np.array([actual for (deflection, actual) in points], dtype=float)
+        targets = np.array([deflection for (deflection, actual) in points], dtype=float)
+        fit_x, fit_y = self.squarer.fit_many(actuals[:, 0], actuals[:, 1])
+        if self._pool:
+            chunks = np.array_split(candidates, self._processes)
+            return np.concatenate(self._pool.map(_fit_errors, [(fit_x, fit_y, targets, chunk) for chunk in chunks if len(chunk)]))
+        return _fit_errors((fit_x, fit_y, targets, candidates))
+
+    def _shortlist(self, errors):
+        # The batched errors pick out the candidates worth an exact lstsq, keeping
+        # grid order so ties resolve to the same bend as a full sequential search.
+        finite = errors[np.isfinite(errors)]
+        if len(finite) == 0:
+            return range(len(errors))
+        minimum = finite.min()
+        limit = minimum + max(abs(minimum) * self.SHORTLIST_TOLERANCE, 1e-12)
+        return [index for (index, error) in enumerate(errors) if not np.isfinite(error) or error <= limit]
+
     def _get_coeffecient_vectors(self, points, monomials,xbend,ybend,scale):
         target_deflection_1 = []
         target_deflection_2 = []
@@ -133,9 +213,93 @@ class PointTransformer(Transformer):
 
     def transform(self,xyz):
         x,y,z = xyz
+        if self._grid_resolution:
+            transform_x, transform_y = self.transform_many([xyz])[0][0]
+            return [transform_x, transform_y, z]
         fit_x, fit_y = self.squarer.fit(x,y)
         bend_x,bend_y = self._bend(fit_x, fit_y,self.calibrated_bend_x,self.calibrated_bend_y, self.calibrated_scale)
 
         transform_x = sum( [ m * a(bend_x,bend_y) for (m,a) in zip(self.coeffecient_vector_x, self.monomials)] )
         transform_y = sum( [ m * a(bend_x,bend_y) for (m,a) in zip(self.coeffecient_vector_y, self.monomials)] )
         return [ transform_x,transform_y, z ]
+
+    def transform_many(self, xyz):
+        xyz = np.asarray(xyz, dtype=float).reshape(-1, 3)
+        x, y = xyz[:, 0], xyz[:, 1]
+        if not self._grid_resolution:
+            return self._exact_many(x, y), 0
+        x0, x1, y0, y1 = self._grid_bounds
+        inside = (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+        transformed = np.empty((len(xyz), 2))
+        transformed[inside] = self._interpolate(x[inside], y[inside])
+        if not inside.all():
+            transformed[~inside] = self._exact_many(x[~inside], y[~inside])
+        return transformed, 0
+
+    def _exact_many(self, x, y):
+        fit_x, fit_y = self.squarer.fit_many(x, y)
+        bend_x, bend_y = self._bend_many(fit_x, fit_y, self.calibrated_bend_x, self.calibrated_bend_y, self.calibrated_scale)
+        terms = self._monomial_matrix(bend_x, bend_y)
+        return np.column_stack((terms.dot(self.coeffecient_vector_x), terms.dot(self.coeffecient_vector_y)))
+
+    def _bend_many(self, x, y, xbend, ybend, scale):
+        bent_x = xbend * (scale * np.arctan(x / scale)) + (1.0 - xbend) * x
+        bent_y = ybend * (scale * np.arctan(y / scale)) + (1.0 - ybend) * y
+        return (bent_x, bent_y)
+
+    def _monomial_matrix(self, x, y):
+        return np.column_stack((x ** 3, x ** 2 * y, x * y ** 2, y ** 3, x ** 2, x * y, y ** 2, x, y, np.ones_like(x)))
+
+    def _lookup_grid(self):
+        if self._grid is None:
+            grid = cached_fit(self._fit_cache, 'point_grid', self._grid_key)
+            if grid:
+                self._grid = (np.array(grid['grid_d1']), np.array(grid['grid_d2']))
+                self.grid_max_error = grid['max_error']
+                return self._grid
+            x0, x1, y0, y1 = self._grid_bounds
+            grid_x, grid_y = np.meshgrid(np.linspace(x0, x1, self._grid_resolution), np.linspace(y0, y1, self._grid_resolution))
+            values = self._exact_many(grid_x.ravel(), grid_y.ravel())
+            shape = (self._grid_resolution, self._grid_resolution)
+            self._grid = (values[:, 0].reshape(shape), values[:, 1].reshape(shape))
+            self.grid_max_error = self._grid_error()
+            logger.info("Lookup grid %sx%s built, max interpolation error: %s" % (self._grid_resolution, self._grid_resolution, self.grid_max_error))
+            store_fit(self._fit_cache, 'point_grid', self._grid_key, {
+                'grid_d1': self._grid[0].tolist(),
+                'grid_d2': self._grid[1].tolist(),
+                'max_error': self.grid_max_error,
+                })
+        return self._grid
+
+    def _interpolate(self, x, y):
+        grid_d1, grid_d2 = self._lookup_grid()
+        x0, x1, y0, y1 = self._grid_bounds
+        last = self._grid_resolution - 1
+        fx = (x - x0) / (x1 - x0) * last
+        fy = (y - y0) / (y1 - y0) * last
+        ix = np.clip(np.floor(fx).astype(int), 0, last - 1)
+        iy = np.clip(np.floor(fy).astype(int), 0, last - 1)
+        tx = fx - ix
+        ty = fy - iy
+        result = np.empty((len(x), 2))
+        for (column, grid) in enumerate((grid_d1, grid_d2)):
+            bottom = grid[iy, ix] * (1.0 - tx) + grid[iy, ix + 1] * tx
+            top = grid[iy + 1, ix] * (1.0 - tx) + grid[iy + 1, ix + 1] * tx
+            result[:, column] = bottom * (1.0 - ty) + top * ty
+        return result
+
+    def _grid_error(self):
+        x0, x1, y0, y1 = self._grid_bounds
+        cells = self._grid_resolution - 1
+        half_x = (x1 - x0) / cells / 2.0
+        half_y = (y1 - y0) / cells / 2.0
+        sample_x, sample_y = np.meshgrid(np.linspace(x0, x1 - 2 * half_x, cells) + half_x, np.linspace(y0, y1 - 2 * half_y, cells) + half_y)
+        sample_x, sample_y = sample_x.ravel(), sample_y.ravel()
+        difference = self._interpolate(sample_x, sample_y) - self._exact_many(sample_x, sample_y)
+        return float(np.sqrt((difference ** 2).sum(axis=1)).max())
+
+    def lookup_grid_error(self):
+        if not self._grid_resolution:
+            return None
+        self._lookup_grid()
+        return self.grid_max_error
@@ -0,0 +1,126 @@
+import threading
+import collections
+import time
+import logging
+logger = logging.getLogger('peachy')
+
+
+StatusEvent = collections.namedtuple('StatusEvent', ['type', 'version', 'time', 'data'])
+
+
+class StatusSubscription(object):
+    '''A subscriber to status events. Events wait in a queue of at most queue_length entries, the oldest being dropped
+    when it is full, and are handed to call_back as a list no more then max_rate times a second. Only the newest
+    pending event of a COALESCED type is kept.'''
+
+    EVENTS = ('layer_started', 'layer_completed', 'layer_skipped', 'drip', 'error', 'status')
+    COALESCED = ('drip',)
+
+    def __init__(self, call_back, events=None, max_rate=10.0, queue_length=100):
+        events = self.EVENTS if events is None else tuple(events)
+        for event in events:
+            if event not in self.EVENTS:
+                raise Exception("Unknown status event: %s" % event)
+        if max_rate <= 0:
+            raise Exception("Subscription rate must be greater then 0")
+        if queue_length < 1:
+            raise Exception("Subscription queue length must be at least 1")
+        self.call_back = call_back
+        self._events = set(events)
+        self._period = 1.0 / max_rate
+        self._pending = collections.deque(maxlen=queue_length)
+        self._latest = {}
+        self._next_delivery = 0.0
+        self._dispatcher = None
+        self.dropped = 0
+
+    def close(self):
+        if self._dispatcher:
+            self._dispatcher.unsubscribe(self)
+
+    def _offer(self, event):
+        if event.type not in self._events:
+            return
+        if event.type in self.COALESCED:
+            self._latest[event.type] = event
+            return
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self._pending.append(event)
+
+    def _has_pending(self):
+        return bool(self._pending or self._latest)
+
+    def _due_in(self, now):
+        return self._next_delivery - now
+
+    def _take(self, now):
+        events = list(self._pending) + self._latest.values()
+        events.sort(key=lambda event: event.version)
+        self._pending.clear()
+        self._latest.clear()
+        self._next_delivery = now + self._period
+        return events
+
+
+class StatusDispatcher(object):
+    '''Delivers status events to subscriptions from its own thread. publish only queues the event, so a slow
+    subscriber never holds up the thread reporting the change.'''
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._subscriptions = []
+        self._running = True
+        self._thread = threading.Thread(target=self._dispatch, name='StatusDispatcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def subscribe(self, subscription):
+        with self._condition:
+            subscription._dispatcher = self
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._condition:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def publish(self, event):
+        with self._condition:
+            for subscription in self._subscriptions:
+                subscription._offer(event)
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _dispatch(self):
+        while True:
+            with self._condition:
+                deliveries = self._due(time.time())
+                while self._running and not deliveries:
+                    self._condition.wait(self._wait_time(time.time()))
+                    deliveries = self._due(time.time())
+                if not self._running:
+                    deliveries.extend((subscription, subscription._take(time.time())) for subscription in self._subscriptions if subscription._has_pending())
+            for (subscription, events) in deliveries:
+                try:
+                    subscription.call_back(events)
+                except Exception as ex:
+                    logger.error("Status subscriber failed: %s" % ex)
+            if not self._running:
+                return
+
+    def _due(self, now):
+        return [(subscription, subscription._take(now)) for subscription in self._subscriptions if subscription._has_pending() and subscription._due_in(now) <= 0]
+
+    def _wait_time(self, now):
+        waits = [subscription._due_in(now) for subscription in self._subscriptions if subscription._has_pending()]
+        if waits:
+            return max(min(waits), 0.001)
+        return None
@@ -1,7 +1,9 @@
 import threading
 import time
 import math
+import numpy
 from peachyprinter.domain.zaxis import ZAxis
+from peachyprinter.infrastructure.drip_history import DripHistory
 import logging
 logger = logging.getLogger('peachy')
 
@@ -26,8 +28,11 @@ class TimedDripZAxis(ZAxis, threading.Thread):
         self._time_to_wait = 1.0 / (calls_back_per_second * 1.0)
         self._last_drip = 0.0
         self._height_history = self._starting_height
-        self._drip_history = [time.time()]
         self._drip_history_length = 500
+        self._drip_history = DripHistory(self._drip_history_length)
+        self._drip_history.append(time.time())
+        self._started = threading.Event()
+        self._stopping = threading.Event()
 
     def set_call_back(self, call_back):
         self._call_back = call_back
@@ -39,12 +44,14 @@ class TimedDripZAxis(ZAxis, threading.Thread):
         self._height_history = self._height_history + (drips / self._drips_per_mm)
         self.start_time = time.time()
         self._drips_per_second = dps
+        self._height_updated()
 
     def get_drips_per_second(self):
         return self._drips_per_second
 
     def set_drips_per_mm(self, drips_per_mm):
         self._drips_per_mm = drips_per_mm
+        self._height_updated()
 
     def current_z_location_mm(self):
         if self.running:
@@ -54,32 +61,35 @@ class TimedDripZAxis(ZAxis, threading.Thread):
         else:
             return self._height_history
 
+    def _seconds_until_height(self, height_mm):
+        if not self.running or self._drips_per_second <= 0:
+            return None
+        return (height_mm - self.current_z_location_mm()) * self._drips_per_mm / self._drips_per_second
+
     def update_data(self):
-        if len(self._drip_history) > self._drip_history_length:
-            self._drip_history = self._drip_history[-self._drip_history_length:]
         if self._call_back:
             tme = time.time()
             current_time = tme - self.start_time
             drips = current_time * self._drips_per_second
             height = drips / self._drips_per_mm
-            new_drips = int(math.floor((tme - self._drip_history[-1]) * self._drips_per_second))
-            for i in range(0, new_drips):
-                self._drip_history.append(tme)
-            self._call_back(math.ceil(self._last_drip + drips), self._height_history + height, self._drips_per_second, self._drip_history)
+            new_drips = int(math.floor((tme - self._drip_history.latest) * self._drips_per_second))
+            self._drip_history.append(tme, new_drips)
+            self._call_back(math.ceil(self._last_drip + drips), self._height_history + height, self._drips_per_second, numpy.array(self._drip_history.view))
+        self._height_updated()
 
     def start(self):
         threading.Thread.start(self)
-        while self.start_time == 0:
-            time.sleep(0.1)
+        self._started.wait()
 
     def run(self):
         self.running = True
         self.start_time = time.time()
+        self._started.set()
         while self.running:
             start = time.time()
             self.update_data()
             delta = time.time() - start
-            time.sleep(max(0, self._time_to_wait - delta))
+            self._stopping.wait(max(0, self._time_to_wait - delta))
         self.shutdown = True
 
     def move_to(self, height_mm):
@@ -88,8 +98,8 @@ class TimedDripZAxis(ZAxis, threading.Thread):
     def close(self):
         if self.running:
             self.running = False
-            while not self.shutdown:
-                time.sleep(0.1)
+            self._stopping.set()
+            self.join()
 
 
 class PhotoZAxis(ZAxis):
@@ -117,6 +127,11 @@ class PhotoZAxis(ZAxis):
                 self.callback()
         return self._current_height
 
+    def _seconds_until_height(self, height_mm):
+        if self._time_of_change is None:
+            return None
+        return self._time_of_change - time.time()
+
     def set_call_back(self, call_back):
         self._call_back = call_back
 
@@ -3,6 +3,36 @@ import logging
 logger = logging.getLogger('peachy')
 from peachyprinter.domain.transformer import Transformer
 import threading
+import hashlib
+from collections import OrderedDict
+
+
+def calibration_key(*parts):
+    '''Stable hash of calibration inputs (numbers, point dicts and lists) for keying cached fits'''
+    def normalise(value):
+        if isinstance(value, dict):
+            return sorted((normalise(key), normalise(item)) for (key, item) in value.items())
+        if isinstance(value, (list, tuple)):
+            return tuple(normalise(item) for item in value)
+        return float(value)
+    return hashlib.sha1(repr(normalise(parts))).hexdigest()
+
+
+def cached_fit(fit_cache, kind, key):
+    '''The fit stored in fit_cache by kind of transformer for the calibration key, or None'''
+    if not fit_cache:
+        return None
+    return fit_cache.get('%s:%s' % (kind, key))
+
+
+def store_fit(fit_cache, kind, key, fit):
+    '''Stores fit in fit_cache under kind and calibration key, replacing older fits of that kind only, so transformers
+    of different kinds can share one cache'''
+    if fit_cache is None:
+        return
+    for name in [name for name in fit_cache if name.startswith(kind + ':')]:
+        del fit_cache[name]
+    fit_cache['%s:%s' % (kind, key)] = fit
 
 
 class OneToOneTransformer(Transformer):
@@ -10,6 +40,10 @@ class OneToOneTransformer(Transformer):
         x, y, z = xyz
         return [x, y, z]
 
+    def transform_many(self, xyz):
+        xyz = np.asarray(xyz, dtype=float).reshape(-1, 3)
+        return xyz[:, :2].copy(), 0
+
 
 'Takes Values from -1.0 to 1.0 on both axis and returns a scaled version between 0 and 1'
 
@@ -28,6 +62,13 @@ class TuningTransformer(Transformer):
         y = self._transform(y)
         return [x, y]
 
+    def transform_many(self, xyz):
+        xy = np.asarray(xyz, dtype=float).reshape(-1, 3)[:, :2]
+        clipped = int(((xy < 0.0) | (xy > 1.0)).any(axis=1).sum())
+        if clipped:
+            logger.info("Adjusting Values")
+        return ((np.clip(xy, 0.0, 1.0) - 0.5) * self._scale) + 0.5, clipped
+
     def set_scale(self, new_scale):
         self._scale = new_scale
 
@@ -45,8 +86,15 @@ class TuningTransformer(Transformer):
 
 
 class HomogenousTransformer(Transformer):
-    def __init__(self, scale, upper_height, lower_points, upper_points):
+    CACHE_SIZE = 512
+
+    def __init__(self, scale, upper_height, lower_points, upper_points, cache_size=CACHE_SIZE, fit_cache=None):
         self._lock = threading.Lock()
+        self._fit_cache = fit_cache
+        self._calibration = (upper_height, lower_points, upper_points)
+        self._cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
         self._scale = scale
         self._upper_height = upper_height
 
@@ -62,7 +110,6 @@ class HomogenousTransformer(Transformer):
         self._upper_points = [(self._scale_point(deflection, deflection_scale), distance) for (deflection, distance) in lower_points]
 
         self._get_transforms()
-        self._cache = {}
 
     def _scale_point(self, point, scale):
         x, y = point
@@ -85,12 +132,19 @@ class HomogenousTransformer(Transformer):
             ]
 
     def _get_transforms(self):
-        self._lock.acquire()
-        try:
-            self._lower_transform = self._get_transformation_matrix(self._lower_points)
-            self._upper_transform = self._get_transformation_matrix(self._upper_points)
-        finally:
-            self._lock.release()
+        key = calibration_key(self._scale, *self._calibration)
+        fit = cached_fit(self._fit_cache, 'homogenous', key)
+        if fit:
+            lower_transform = np.matrix(fit['lower_transform'])
+            upper_transform = np.matrix(fit['upper_transform'])
+        else:
+            lower_transform = self._get_transformation_matrix(self._lower_points)
+            upper_transform = self._get_transformation_matrix(self._upper_points)
+            store_fit(self._fit_cache, 'homogenous', key, {'lower_transform': lower_transform.tolist(), 'upper_transform': upper_transform.tolist()})
+        with self._lock:
+            self._lower_transform = lower_transform
+            self._upper_transform = upper_transform
+            self._cache = OrderedDict()
 
     def _get_transformation_matrix(self,mappings):
         mapping_matrix = self._build_matrix(mappings)
@@ -123,15 +177,25 @@ class HomogenousTransformer(Transformer):
 
     def _transforms_for_height(self, height):
         if height == 0:
+            self.cache_hits += 1
             return self._lower_transform
         elif height == self._upper_height:
+            self.cache_hits += 1
             return self._upper_transform
-        elif height in self._cache.keys():
-            return self._cache[height]
-        else:
+        current = self._cache.pop(height, None)
+        if current is None:
+            self.cache_misses += 1
             current = self._positional_transform(height)
-            self._cache = {height: current}
-            return current
+            if len(self._cache) >= self._cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self.cache_hits += 1
+        self._cache[height] = current
+        return current
+
+    def cache_info(self):
+        with self._lock:
+            return {'hits': self.cache_hits, 'misses': self.cache_misses, 'size': len(self._cache), 'max_size': self._cache_size}
 
     def _positional_transform(self, height):
         adjusted_height = height / self._upper_height
@@ -154,6 +218,26 @@ class HomogenousTransformer(Transformer):
             adjusted_y = min(1.0, max(0.0, y1))
             return(adjusted_x, adjusted_y)
 
+    def transform_many(self, xyz):
+        xyz = np.asarray(xyz, dtype=float).reshape(-1, 3)
+        transformed = np.empty((len(xyz), 2))
+        heights, groups = np.unique(xyz[:, 2], return_inverse=True)
+        with self._lock:
+            transforms = [np.asarray(self._transforms_for_height(height)) for height in heights]
+        order = np.argsort(groups, kind='mergesort')
+        bounds = np.cumsum(np.bincount(groups, minlength=len(heights)))
+        for (transform, rows) in zip(transforms, np.split(order, bounds[:-1])):
+            x = xyz[rows, 0]
+            y = xyz[rows, 1]
+            kx = transform[0, 0] * x + transform[0, 1] * y + transform[0, 2]
+            ky = transform[1, 0] * x + transform[1, 1] * y + transform[1, 2]
+            k = transform[2, 0] * x + transform[2, 1] * y + transform[2, 2]
+            transformed[rows, 0] = kx / k
+            transformed[rows, 1] = ky / k
+        clipped = int(((transformed < 0.0) | (transformed > 1.0)).any(axis=1).sum())
+        np.clip(transformed, 0.0, 1.0, out=transformed)
+        return transformed, clipped
+
     def set_scale(self, new_scale):
         self._scale = new_scale
         self._get_transforms()
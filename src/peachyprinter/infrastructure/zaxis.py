@@ -1,48 +1,57 @@
 import time
+import numpy
 import logging
 logger = logging.getLogger('peachy')
 from math import ceil
 from peachyprinter.domain.zaxis import ZAxis
+from peachyprinter.infrastructure.drip_history import DripHistory
 from peachyprinter.infrastructure.messages import DripRecordedMessage, SetDripCountMessage, MoveToDripCountMessage
 
 
 class SerialDripZAxis(ZAxis):
-    def __init__(self, communicator, drips_per_mm, starting_height, drip_call_back=None,):
+    def __init__(self, communicator, drips_per_mm, starting_height, drip_call_back=None, rate_windows=DripHistory.DEFAULT_RATE_WINDOWS, ewma_seconds=5.0):
         super(SerialDripZAxis, self).__init__(starting_height)
         self._communicator = communicator
         self._drips_per_mm = drips_per_mm
         self._drips = 0
         self._drip_call_back = drip_call_back
-        self.reset()
-        self._communicator.register_handler(DripRecordedMessage, self.drip_reported_handler)
-        self._drip_history = []
         self._drips_in_average = 10
         self._drip_history_length = 500
+        self._drip_history = DripHistory(self._drip_history_length, rate_windows, ewma_seconds)
+        self.reset()
+        self._communicator.register_handler(DripRecordedMessage, self.drip_reported_handler)
 
     def drip_reported_handler(self, drip_reported):
         drips_added = drip_reported.drips - self._drips
         self._drips = drip_reported.drips
         self._append_drip(drips_added)
+        self._height_updated()
         if self._drip_call_back:
             self._drip_call_back(self._drips, self.current_z_location_mm(), self.average_drips, self.drip_history)
 
     def _append_drip(self, drips_count):
-        for i in range(0, drips_count):
-            self._drip_history.append(time.time())
-        if len(self._drip_history) > self._drip_history_length:
-            self._drip_history = self._drip_history[-self._drip_history_length:]
+        self._drip_history.append(time.time(), drips_count)
 
     @property
     def average_drips(self):
-        if len(self._drip_history) >= self._drips_in_average:
-            seconds = (self._drip_history[-1] - self._drip_history[-10])
-            if seconds > 0:
-                return 10.0 / seconds
-        return 0.0
+        return self._drip_history.average(self._drips_in_average)
+
+    @property
+    def drip_rates(self):
+        return self._drip_history.rates()
+
+    @property
+    def estimated_drips_per_second(self):
+        return self._drip_history.ewma
 
     @property
     def drip_history(self):
-        return list(self._drip_history)
+        return numpy.array(self._drip_history.view)
+
+    @property
+    def drip_history_view(self):
+        '''Read only view of the drip history without copying, only valid until the next drip is recorded.'''
+        return self._drip_history.view
 
     def set_call_back(self, call_back):
         self._drip_call_back = call_back
@@ -52,13 +61,14 @@ class SerialDripZAxis(ZAxis):
         self._communicator.send(SetDripCountMessage(0))
         time.sleep(0.2)
         self._drips = 0
-        self._drip_history = []
+        self._drip_history.reset()
 
     def current_z_location_mm(self):
         return self._starting_height + (self._drips * 1.0 / self._drips_per_mm)
 
     def set_drips_per_mm(self, drips_per_mm):
         self._drips_per_mm = drips_per_mm
+        self._height_updated()
 
     def move_to(self, height_mm):
         wanted_drips = int(ceil(height_mm / self._drips_per_mm))
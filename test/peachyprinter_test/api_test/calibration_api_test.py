@@ -123,7 +123,8 @@ class CalibrationAPITests(unittest.TestCase, test_helpers.TestHelpers):
             self.mock_laser_control,
             self.mock_machine_state,
             post_fire_delay_speed=100.0,
-            slew_delay_speed=100.0
+            slew_delay_speed=100.0,
+            compile_repeated_layers=True,
             )
 
     def test_stop_should_call_stop_on_controller(self, *args):
@@ -226,14 +227,16 @@ class CalibrationAPITests(unittest.TestCase, test_helpers.TestHelpers):
         with self.assertRaises(Exception):
             calibration_api.show_test_pattern("Shrubberies")
 
+    @patch('peachyprinter.api.calibration_api.LoopingPatternGenerator')
     @patch('peachyprinter.api.calibration_api.HilbertGenerator')
-    def test_change_pattern_should_change_pattern_on_controller(self, mock_HilbertGenerator, *args):
+    def test_change_pattern_should_change_pattern_on_controller(self, mock_HilbertGenerator, mock_LoopingPatternGenerator, *args):
         self.setup_mocks(args)
         self.mock_configuration_manager.load.return_value = self.default_config
 
         calibration_api = CalibrationAPI(self.mock_configuration_manager)
         calibration_api.show_test_pattern("Hilbert Space Filling Curve")
-        self.mock_controller.change_generator.assert_called_with(self.mock_hilbert_generator)
+        mock_LoopingPatternGenerator.assert_called_with(self.mock_hilbert_generator)
+        self.mock_controller.change_generator.assert_called_with(mock_LoopingPatternGenerator.return_value)
 
     def test_current_calibration_returns_the_existing_configuration(self, *args):
         self.setup_mocks(args)
@@ -310,10 +313,41 @@ class CalibrationAPITests(unittest.TestCase, test_helpers.TestHelpers):
             self.default_config.calibration.height,
             self.default_config.calibration.lower_points,
             self.default_config.calibration.upper_points,
+            fit_cache=self.default_config.calibration.fit_cache,
             )
 
         self.mock_path_to_audio.set_transformer.assert_called_with(self.mock_homogenous_transformer)
 
+    def test_show_test_pattern_should_save_a_newly_computed_fit(self, *args):
+        self.setup_mocks(args)
+        self.mock_configuration_manager.load.return_value = self.default_config
+        calibration_api = CalibrationAPI(self.mock_configuration_manager)
+
+        def fit(*args, **kwargs):
+            kwargs['fit_cache'].update({'key': 'fit'})
+            return self.mock_homogenous_transformer
+        self.mock_HomogenousTransformer.side_effect = fit
+
+        calibration_api.show_test_pattern('Hilbert Space Filling Curve')
+
+        self.assertEquals('fit', self.mock_configuration_manager.save.call_args[0][0].calibration.fit_cache['key'])
+
+    def test_show_test_pattern_should_not_save_when_fit_was_cached(self, *args):
+        self.setup_mocks(args)
+        config = self.default_config
+        config.calibration.fit_cache = {'key': 'fit'}
+        self.mock_configuration_manager.load.return_value = config
+        calibration_api = CalibrationAPI(self.mock_configuration_manager)
+
+        def fit(*args, **kwargs):
+            kwargs['fit_cache'].update({'key': 'fit'})
+            return self.mock_homogenous_transformer
+        self.mock_HomogenousTransformer.side_effect = fit
+
+        calibration_api.show_test_pattern('Hilbert Space Filling Curve')
+
+        self.assertFalse(self.mock_configuration_manager.save.called)
+
     def test_show_line_should_replace_controllers_transformer(self, *args):
         self.setup_mocks(args)
         self.mock_configuration_manager.load.return_value = self.default_config
@@ -379,15 +413,17 @@ class CalibrationAPITests(unittest.TestCase, test_helpers.TestHelpers):
         self.assertConfigurationEqual(expected_config, self.mock_configuration_manager.save.mock_calls[0][1][0])
         self.mock_path_to_audio.set_transformer.assert_called_with(self.mock_tuning_transformer)
 
+    @patch('peachyprinter.api.calibration_api.LoopingPatternGenerator')
     @patch('peachyprinter.api.calibration_api.SquareGenerator')
-    def test_show_scale_should_use_Square_Generator_and_Tuning_Transformer(self, mock_SquareGenerator, *args):
+    def test_show_scale_should_use_Square_Generator_and_Tuning_Transformer(self, mock_SquareGenerator, mock_LoopingPatternGenerator, *args):
         self.setup_mocks(args)
         self.mock_configuration_manager.load.return_value = self.default_config
         calibration_api = CalibrationAPI(self.mock_configuration_manager)
 
         calibration_api.show_scale()
 
-        self.mock_controller.change_generator.assert_called_with(self.mock_scale_generator)
+        mock_LoopingPatternGenerator.assert_called_with(self.mock_scale_generator)
+        self.mock_controller.change_generator.assert_called_with(mock_LoopingPatternGenerator.return_value)
         self.mock_path_to_audio.set_transformer.assert_called_with(self.mock_tuning_transformer)
 
     def test_set_test_pattern_speed_changes_speeds(self, *args):
@@ -151,6 +151,7 @@ class PrintQueueAPITests(unittest.TestCase, test_helpers.TestHelpers):
             end = time.time()
             self.assertTrue(expected_delay <= end-start + 0.01, "%s was not <= %s" % (expected_delay, (end - start + 0.01)))
 
+@patch('peachyprinter.api.print_api.GCodeLayerIndex')
 @patch('peachyprinter.api.print_api.SerialDripZAxis')
 @patch('peachyprinter.api.print_api.MicroDisseminator')
 @patch('peachyprinter.api.print_api.UsbPacketCommunicator')
@@ -176,6 +177,7 @@ class PrintQueueAPITests(unittest.TestCase, test_helpers.TestHelpers):
 class PrintAPITests(unittest.TestCase, test_helpers.TestHelpers):
 
     def setup_mocks(self, args):
+        self.mock_GCodeLayerIndex =               args[22]
         self.mock_SerialDripZAxis =               args[21]
         self.mock_MicroDisseminator =             args[20]
         self.mock_UsbPacketCommunicator =         args[19]
@@ -248,6 +250,8 @@ class PrintAPITests(unittest.TestCase, test_helpers.TestHelpers):
             self.mock_GCodeReader.assert_called_with(
                 mocked_open.return_value,
                 scale=config.options.scaling_factor,
+                chord_error=config.options.laser_thickness_mm / 2.0,
+                samples_per_second=config.circut.data_rate,
                 start_height=0.0
                 )
 
@@ -255,7 +259,7 @@ class PrintAPITests(unittest.TestCase, test_helpers.TestHelpers):
             config.cure_rate.override_laser_power_amount
             )
 
-        self.mock_UsbPacketCommunicator.assert_called_with(config.circut.print_queue_length)
+        self.mock_UsbPacketCommunicator.assert_called_with(config.circut.print_queue_length, config.circut.write_buffer_size, config.circut.use_loopback)
         
         self.mock_usb_packet_communicator.start.assert_called_with()
 
@@ -272,6 +276,7 @@ class PrintAPITests(unittest.TestCase, test_helpers.TestHelpers):
             config.calibration.height,
             config.calibration.lower_points,
             config.calibration.upper_points,
+            fit_cache=config.calibration.fit_cache,
             )
 
         self.mock_PathToPoints.assert_called_with(
@@ -291,6 +296,7 @@ class PrintAPITests(unittest.TestCase, test_helpers.TestHelpers):
             wait_speed=100.0,
             post_fire_delay_speed=100.0,
             slew_delay_speed=100.0,
+            hold_while_waiting=False,
             )
 
         self.mock_SerialDripZAxis.assert_called_with(
@@ -329,10 +335,14 @@ class PrintAPITests(unittest.TestCase, test_helpers.TestHelpers):
 
         with patch('__builtin__.open', mock_open(read_data='bibble'), create=True) as mocked_open:
             api.print_gcode(gcode_path)
+            self.mock_GCodeLayerIndex.load_or_build.assert_called_with(gcode_path, scale=config.options.scaling_factor)
             self.mock_GCodeReader.assert_called_with(
                 mocked_open.return_value,
                 scale=config.options.scaling_factor,
-                start_height=expected_start_height
+                chord_error=config.options.laser_thickness_mm / 2.0,
+                samples_per_second=config.circut.data_rate,
+                start_height=expected_start_height,
+                layer_index=self.mock_GCodeLayerIndex.load_or_build.return_value
                 )
 
         self.mock_SerialDripZAxis.assert_called_with(
@@ -341,6 +351,66 @@ class PrintAPITests(unittest.TestCase, test_helpers.TestHelpers):
             expected_start_height,
             )
 
+    def test_print_gcode_should_read_gcode_in_chunks_when_chunked_gcode_on(self, *args):
+        self.setup_mocks(args)
+        gcode_path = "FakeFile"
+        config = self.default_config
+        config.options.use_chunked_gcode = True
+        api = PrintAPI(config)
+
+        with patch('__builtin__.open', mock_open(read_data='bibble'), create=True) as mocked_open:
+            api.print_gcode(gcode_path)
+            self.mock_GCodeReader.assert_called_with(
+                mocked_open.return_value,
+                scale=config.options.scaling_factor,
+                chord_error=config.options.laser_thickness_mm / 2.0,
+                samples_per_second=config.circut.data_rate,
+                start_height=0.0,
+                chunked=True
+                )
+
+    def test_print_gcode_should_use_compiled_layers_when_layer_cache_on(self, *args):
+        self.setup_mocks(args)
+        gcode_path = "FakeFile"
+        config = self.default_config
+        config.options.use_layer_cache = True
+        config.options.layer_cache_size_mb = 7
+        api = PrintAPI(config, start_height=1.5)
+
+        with patch('peachyprinter.api.print_api.LayerCache') as mock_LayerCache:
+            mock_layer_cache = mock_LayerCache.return_value
+            api.print_gcode(gcode_path)
+
+            mock_LayerCache.assert_called_with(max_size_mb=7)
+            mock_layer_cache.get_layers.assert_called_with(
+                gcode_path,
+                scale=config.options.scaling_factor,
+                start_height=1.5,
+                chord_error=config.options.laser_thickness_mm / 2.0,
+                samples_per_second=config.circut.data_rate,
+                )
+        self.assertEquals(0, self.mock_GCodeReader.call_count)
+        self.assertEquals(mock_layer_cache.get_layers.return_value, self.mock_Controller.call_args[0][2])
+
+    def test_print_gcode_should_parse_gcode_when_layers_cannot_be_compiled(self, *args):
+        self.setup_mocks(args)
+        gcode_path = "FakeFile"
+        config = self.default_config
+        config.options.use_layer_cache = True
+        api = PrintAPI(config)
+
+        with patch('peachyprinter.api.print_api.LayerCache') as mock_LayerCache:
+            mock_LayerCache.return_value.get_layers.return_value = None
+            with patch('__builtin__.open', mock_open(read_data='bibble'), create=True) as mocked_open:
+                api.print_gcode(gcode_path)
+                self.mock_GCodeReader.assert_called_with(
+                    mocked_open.return_value,
+                    scale=config.options.scaling_factor,
+                    chord_error=config.options.laser_thickness_mm / 2.0,
+                    samples_per_second=config.circut.data_rate,
+                    start_height=0.0
+                    )
+
     def test_print_gcode_should_create_required_classes_and_start_it_with_pre_layer_delay(self, *args):
         self.setup_mocks(args)
         gcode_path = "FakeFile"
@@ -390,7 +460,8 @@ class PrintAPITests(unittest.TestCase, test_helpers.TestHelpers):
             override_move_speed=config.cure_rate.move_speed,
             wait_speed=None,
             post_fire_delay_speed=100.0,
-            slew_delay_speed=100.0
+            slew_delay_speed=100.0,
+            hold_while_waiting=False,
             )
 
     def test_print_gcode_should_create_required_classes_and_start_it_with_override_speed_if_specified(self, *args):
@@ -417,7 +488,8 @@ class PrintAPITests(unittest.TestCase, test_helpers.TestHelpers):
             override_move_speed=config.cure_rate.move_speed,
             wait_speed=100.0,
             post_fire_delay_speed=100.0,
-            slew_delay_speed=100.0
+            slew_delay_speed=100.0,
+            hold_while_waiting=False,
             )
 
     def test_print_gcode_should_create_required_classes_and_start_it_without_override_speed_if_force_source_speed_flagged(self, *args):
@@ -444,7 +516,8 @@ class PrintAPITests(unittest.TestCase, test_helpers.TestHelpers):
             override_move_speed=None,
             wait_speed=100.0,
             post_fire_delay_speed=100.0,
-            slew_delay_speed=100.0
+            slew_delay_speed=100.0,
+            hold_while_waiting=False,
             )
 
     def test_print_gcode_should_print_sublayers_if_requested(self, *args):
@@ -465,6 +538,7 @@ class PrintAPITests(unittest.TestCase, test_helpers.TestHelpers):
             self.mock_sub_layer_generator,
             self.mock_machine_status,
             abort_on_error=True,
+            prefetch_layers=0,
             )
 
     def test_print_gcode_should_print_overlap_layers_if_requested(self, *args):
@@ -485,8 +559,47 @@ class PrintAPITests(unittest.TestCase, test_helpers.TestHelpers):
             self.mock_over_lap_generator,
             self.mock_machine_status,
             abort_on_error=True,
+            prefetch_layers=0,
             )
 
+    @patch('peachyprinter.api.print_api.TravelOptimizerGenerator')
+    def test_print_gcode_should_optimize_travel_before_sublayers_if_requested(self, mock_TravelOptimizerGenerator, *args):
+        self.setup_mocks(args)
+        gcode_path = "FakeFile"
+        config = self.default_config
+        config.options.use_shufflelayers = False
+        config.options.use_overlap = False
+        config.options.use_sublayers = True
+        config.options.use_travel_optimizer = True
+        api = PrintAPI(config)
+
+        with patch('__builtin__.open', mock_open(read_data='bibble'), create=True):
+            self.mock_g_code_reader.get_layers.return_value = "LayerGenerator"
+            api.print_gcode(gcode_path)
+
+        mock_TravelOptimizerGenerator.assert_called_with("LayerGenerator")
+        self.mock_SubLayerGenerator.assert_called_with(mock_TravelOptimizerGenerator.return_value, config.options.sublayer_height_mm)
+
+    @patch('peachyprinter.api.print_api.TravelOptimizerGenerator')
+    @patch('peachyprinter.api.print_api.SimplifyGenerator')
+    def test_print_gcode_should_simplify_to_half_the_laser_thickness_before_optimizing_travel(self, mock_SimplifyGenerator, mock_TravelOptimizerGenerator, *args):
+        self.setup_mocks(args)
+        gcode_path = "FakeFile"
+        config = self.default_config
+        config.options.use_shufflelayers = False
+        config.options.use_overlap = False
+        config.options.use_sublayers = False
+        config.options.use_simplification = True
+        config.options.use_travel_optimizer = True
+        api = PrintAPI(config)
+
+        with patch('__builtin__.open', mock_open(read_data='bibble'), create=True):
+            self.mock_g_code_reader.get_layers.return_value = "LayerGenerator"
+            api.print_gcode(gcode_path)
+
+        mock_SimplifyGenerator.assert_called_with("LayerGenerator", config.options.laser_thickness_mm / 2.0)
+        mock_TravelOptimizerGenerator.assert_called_with(mock_SimplifyGenerator.return_value)
+
     def test_print_gcode_should_print_shuffle_layers_if_requested(self, *args):
         self.setup_mocks(args)
         gcode_path = "FakeFile"
@@ -505,6 +618,7 @@ class PrintAPITests(unittest.TestCase, test_helpers.TestHelpers):
             self.mock_shuffle_generator,
             self.mock_machine_status,
             abort_on_error=True,
+            prefetch_layers=0,
             )
 
     def test_print_gcode_should_print_shuffle_overlap_and_sublayer_if_requested(self, *args):
@@ -530,6 +644,7 @@ class PrintAPITests(unittest.TestCase, test_helpers.TestHelpers):
             self.mock_over_lap_generator,
             self.mock_machine_status,
             abort_on_error=True,
+            prefetch_layers=0,
             )
 
     def test_print_can_be_stopped_before_started(self, *args):
@@ -572,6 +687,25 @@ class PrintAPITests(unittest.TestCase, test_helpers.TestHelpers):
 
         self.mock_controller.get_status.assert_called_with()
 
+    def test_get_status_since_calls_controller_status_since(self, *args):
+        self.setup_mocks(args)
+        api = PrintAPI(self.default_config)
+        with patch('__builtin__.open', mock_open(read_data='bibble'), create=True):
+            api.print_gcode("Spam")
+            api.get_status_since('cursor')
+
+        self.mock_controller.get_status_since.assert_called_with('cursor')
+
+    def test_subscribe_calls_controller_subscribe(self, *args):
+        self.setup_mocks(args)
+        api = PrintAPI(self.default_config)
+        call_back = lambda events: None
+        with patch('__builtin__.open', mock_open(read_data='bibble'), create=True):
+            api.print_gcode("Spam")
+            api.subscribe(call_back, events=['error'], max_rate=2.0)
+
+        self.mock_controller.subscribe.assert_called_with(call_back, events=['error'], max_rate=2.0, queue_length=100)
+
     def test_print_gcode_should_use_emulated_dripper_if_specified_in_config(self, * args):
         self.setup_mocks(args)
         gcode_path = "FakeFile"
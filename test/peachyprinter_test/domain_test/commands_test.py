@@ -0,0 +1,109 @@
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', 'src'))
+
+from test_helpers import TestHelpers
+from peachyprinter.domain.commands import *
+
+
+class ArrayLayerTests(unittest.TestCase, TestHelpers):
+    commands = [
+        LateralMove([0.0, 0.0], [1.0, 1.0], 10.0),
+        LateralDraw([1.0, 1.0], [2.0, 1.0], 20.0),
+        LateralDraw([2.0, 1.0], [2.0, 2.0], 30.0),
+    ]
+
+    def test_from_commands_stores_segments_as_arrays(self):
+        layer = ArrayLayer.from_commands(1.0, self.commands)
+
+        self.assertEqual(1.0, layer.z)
+        self.assertEqual((3, 2), layer.starts.shape)
+        self.assertEqual((3, 2), layer.ends.shape)
+        self.assertEqual([10.0, 20.0, 30.0], layer.speeds.tolist())
+        self.assertEqual([ArrayLayer.MOVE, ArrayLayer.DRAW, ArrayLayer.DRAW], layer.kinds.tolist())
+
+    def test_commands_yields_original_commands(self):
+        layer = ArrayLayer.from_commands(1.0, self.commands)
+
+        self.assertCommandsEqual(self.commands, list(layer.commands))
+
+    def test_commands_supports_length_indexing_and_slicing(self):
+        layer = ArrayLayer.from_commands(1.0, self.commands)
+
+        self.assertEqual(3, len(layer.commands))
+        self.assertCommandEqual(self.commands[-1], layer.commands[-1])
+        self.assertCommandsEqual(self.commands[1:], layer.commands[1:])
+        with self.assertRaises(IndexError):
+            layer.commands[3]
+
+    def test_commands_can_be_replaced(self):
+        layer = ArrayLayer.from_commands(1.0, self.commands)
+
+        layer.commands = layer.commands[1:] + layer.commands[:1]
+
+        self.assertCommandsEqual(self.commands[1:] + self.commands[:1], list(layer.commands))
+
+    def test_to_layer_and_from_layer_round_trip(self):
+        layer = Layer(2.0, list(self.commands))
+
+        result = ArrayLayer.from_layer(layer).to_layer()
+
+        self.assertLayerEquals(layer, result)
+
+    def test_vertical_moves_are_not_supported(self):
+        with self.assertRaises(Exception):
+            ArrayLayer.from_commands(1.0, [VerticalMove(0.0, 1.0, 10.0)])
+
+    def test_empty_layer(self):
+        layer = ArrayLayer(1.0)
+
+        self.assertEqual(0, len(layer.commands))
+        self.assertEqual([], list(layer.commands))
+
+
+class SubLayerTests(unittest.TestCase, TestHelpers):
+    def test_shares_geometry_commands_at_its_own_height(self):
+        geometry = Layer(1.0, [LateralDraw([0.0, 0.0], [1.0, 1.0], 10.0)])
+        sublayer = SubLayer(geometry, 1.5)
+
+        self.assertEqual(1.5, sublayer.z)
+        self.assertEqual(0.5, sublayer.z_offset)
+        self.assertTrue(sublayer.commands is geometry.commands)
+        self.assertEqual(1.0, geometry.z)
+
+    def test_replacing_commands_does_not_change_shared_geometry(self):
+        geometry = Layer(1.0, [LateralDraw([0.0, 0.0], [1.0, 1.0], 10.0), LateralDraw([1.0, 1.0], [2.0, 2.0], 10.0)])
+        sublayer = SubLayer(geometry, 1.5)
+
+        sublayer.commands = sublayer.commands[1:]
+
+        self.assertEqual(2, len(geometry.commands))
+        self.assertEqual(1, len(sublayer.commands))
+        self.assertFalse(sublayer.geometry is geometry)
+
+    def test_offset_and_tail_are_read_without_copying_geometry(self):
+        commands = [LateralDraw([float(i), 0.0], [float(i + 1), 0.0], 10.0) for i in range(4)]
+        tail = [LateralDraw([0.0, 0.0], [0.5, 0.0], 10.0)]
+        geometry = Layer(1.0, commands)
+        sublayer = SubLayer(geometry, 1.0, offset=2, tail=tail)
+
+        expected = commands[2:] + commands[:2] + tail
+        self.assertEqual(5, len(sublayer.commands))
+        self.assertCommandsEqual(expected, list(sublayer.commands))
+        self.assertTrue(sublayer.commands[0] is commands[2])
+        self.assertTrue(sublayer.commands[-1] is tail[0])
+        self.assertCommandsEqual(expected[1:3], sublayer.commands[1:3])
+        self.assertTrue(geometry.commands is commands)
+
+    def test_offset_works_over_array_layers(self):
+        geometry = ArrayLayer.from_commands(1.0, ArrayLayerTests.commands)
+        sublayer = SubLayer(geometry, 2.0, offset=1)
+
+        self.assertCommandsEqual(ArrayLayerTests.commands[1:] + ArrayLayerTests.commands[:1], list(sublayer.commands))
+
+
+if __name__ == '__main__':
+    unittest.main()
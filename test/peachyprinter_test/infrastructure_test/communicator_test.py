@@ -2,14 +2,109 @@ import unittest
 import sys
 import os
 import time
-from mock import patch
+from mock import patch, call
 import serial
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', 'src'))
 
-from peachyprinter.infrastructure.messages import DripRecordedMessage
+from peachyprinter.infrastructure.messages import DripRecordedMessage, MoveMessage, SetDripCountMessage
+from peachyprinter.infrastructure.communicator import UsbPacketCommunicator
 
 
-# if __name__ == '__main__':
-    # unittest.main()
+@patch('peachyprinter.infrastructure.communicator.PeachyUSB')
+class UsbPacketCommunicatorTests(unittest.TestCase):
+
+    def test_send_writes_each_message_when_unbuffered(self, mock_PeachyUSB):
+        mock_device = mock_PeachyUSB.return_value
+        communicator = UsbPacketCommunicator(50)
+        communicator.start()
+
+        communicator.send(MoveMessage(1, 2, 255))
+        communicator.send(MoveMessage(3, 4, 255))
+
+        mock_device.write.assert_has_calls([call(MoveMessage(1, 2, 255).frame()), call(MoveMessage(3, 4, 255).frame())])
+
+    def test_send_frames_writes_each_message_when_unbuffered(self, mock_PeachyUSB):
+        mock_device = mock_PeachyUSB.return_value
+        communicator = UsbPacketCommunicator(50)
+        communicator.start()
+
+        communicator.send_frames(MoveMessage(1, 2, 255).frame() + SetDripCountMessage(3).frame())
+
+        mock_device.write.assert_has_calls([call(MoveMessage(1, 2, 255).frame()), call(SetDripCountMessage(3).frame())])
+        self.assertEquals(2, mock_device.write.call_count)
+
+    def test_send_frames_of_moves_makes_one_write_per_move_when_buffer_size_0(self, mock_PeachyUSB):
+        mock_device = mock_PeachyUSB.return_value
+        communicator = UsbPacketCommunicator(50, buffer_size=0)
+        communicator.start()
+        x_positions = range(20)
+        y_positions = range(100, 120)
+
+        communicator.send_frames(MoveMessage.frames(x_positions, y_positions, 255))
+
+        self.assertEquals(20, mock_device.write.call_count)
+        mock_device.write.assert_has_calls([call(MoveMessage(x, y, 255).frame()) for (x, y) in zip(x_positions, y_positions)])
+
+    def test_send_frames_are_held_until_flush_when_buffered(self, mock_PeachyUSB):
+        mock_device = mock_PeachyUSB.return_value
+        communicator = UsbPacketCommunicator(50, 1024)
+        communicator.start()
+        frames = MoveMessage.frames([1, 2, 3], [4, 5, 6], 255)
+
+        communicator.send_frames(frames)
+        communicator.send(MoveMessage(7, 8, 0))
+        self.assertEquals(0, mock_device.write.call_count)
+
+        communicator.flush()
+
+        mock_device.write.assert_called_once_with(frames + MoveMessage(7, 8, 0).frame())
+
+    def test_buffer_is_written_when_full(self, mock_PeachyUSB):
+        mock_device = mock_PeachyUSB.return_value
+        first = MoveMessage.frames([1] * 10, [2] * 10, 255)
+        second = MoveMessage.frames([3] * 10, [4] * 10, 255)
+        communicator = UsbPacketCommunicator(50, len(first) + len(second) - 1)
+        communicator.start()
+
+        communicator.send_frames(first)
+        communicator.send_frames(second)
+
+        mock_device.write.assert_called_once_with(first)
+
+    def test_batches_larger_than_buffer_are_written_directly(self, mock_PeachyUSB):
+        mock_device = mock_PeachyUSB.return_value
+        small = MoveMessage(1, 1, 255).frame()
+        large = MoveMessage.frames(range(100), range(100), 255)
+        communicator = UsbPacketCommunicator(50, 64)
+        communicator.start()
+
+        communicator.send_frames(small)
+        communicator.send_frames(large)
+
+        mock_device.write.assert_has_calls([call(small), call(large)])
+
+    def test_non_move_messages_flush_and_are_written_immediately(self, mock_PeachyUSB):
+        mock_device = mock_PeachyUSB.return_value
+        communicator = UsbPacketCommunicator(50, 1024)
+        communicator.start()
+
+        communicator.send(MoveMessage(1, 2, 255))
+        communicator.send(SetDripCountMessage(0))
+
+        mock_device.write.assert_has_calls([call(MoveMessage(1, 2, 255).frame()), call(SetDripCountMessage(0).frame())])
+
+    def test_close_flushes_buffer(self, mock_PeachyUSB):
+        mock_device = mock_PeachyUSB.return_value
+        communicator = UsbPacketCommunicator(50, 1024)
+        communicator.start()
+
+        communicator.send(MoveMessage(1, 2, 255))
+        communicator.close()
+
+        mock_device.write.assert_called_once_with(MoveMessage(1, 2, 255).frame())
+
+
+if __name__ == '__main__':
+    unittest.main()
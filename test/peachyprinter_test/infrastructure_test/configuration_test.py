@@ -22,6 +22,7 @@ class CalibrationConfigurationTests(unittest.TestCase, test_helpers.TestHelpers)
         expected_flip_x_axis = "Bad Values"
         expected_flip_y_axis = "Bad Values"
         expected_swap_axis = "Bad Values"
+        expected_fit_cache = "Bad Values"
 
         calibration = CalibrationConfiguration()
 
@@ -37,6 +38,8 @@ class CalibrationConfigurationTests(unittest.TestCase, test_helpers.TestHelpers)
             calibration.flip_y_axis = expected_flip_y_axis
         with self.assertRaises(Exception):
             calibration.swap_axis = expected_swap_axis
+        with self.assertRaises(Exception):
+            calibration.fit_cache = expected_fit_cache
 
     def test_can_create_json_and_load_from_file(self):
         expected_print_area_x = 10.0
@@ -45,6 +48,7 @@ class CalibrationConfigurationTests(unittest.TestCase, test_helpers.TestHelpers)
         expected_flip_x_axis = False
         expected_flip_y_axis = False
         expected_swap_axis = False
+        expected_fit_cache = {'key': 'abc', 'lower_transform': [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]}
 
 
         original_config= Configuration()
@@ -55,6 +59,7 @@ class CalibrationConfigurationTests(unittest.TestCase, test_helpers.TestHelpers)
         original_config.calibration.flip_x_axis = expected_flip_x_axis
         original_config.calibration.flip_y_axis = expected_flip_y_axis
         original_config.calibration.swap_axis = expected_swap_axis
+        original_config.calibration.fit_cache = expected_fit_cache
 
         actual_json = json.loads(original_config.toJson())
         config = Configuration(source=actual_json)
@@ -72,6 +77,7 @@ class CalibrationConfigurationTests(unittest.TestCase, test_helpers.TestHelpers)
         self.assertEquals(expected_flip_x_axis,     config.calibration.flip_x_axis)
         self.assertEquals(expected_flip_y_axis,     config.calibration.flip_y_axis)
         self.assertEquals(expected_swap_axis,       config.calibration.swap_axis)
+        self.assertEquals(expected_fit_cache,       config.calibration.fit_cache)
 
 
 class CircutConfigurationTests(unittest.TestCase, test_helpers.TestHelpers):
@@ -82,6 +88,9 @@ class CircutConfigurationTests(unittest.TestCase, test_helpers.TestHelpers):
         expected_data_rate = True
         expected_print_queue_length = True
         expected_calibration_queue_length = True
+        expected_write_buffer_size = True
+        expected_use_loopback = "WRONG"
+        expected_use_hold_messages = "WRONG"
 
         circut = CircutConfiguration()
 
@@ -97,6 +106,12 @@ class CircutConfigurationTests(unittest.TestCase, test_helpers.TestHelpers):
             circut.print_queue_length = expected_print_queue_length
         with self.assertRaises(Exception):
             circut.calibration_queue_length = expected_calibration_queue_length
+        with self.assertRaises(Exception):
+            circut.write_buffer_size = expected_write_buffer_size
+        with self.assertRaises(Exception):
+            circut.use_loopback = expected_use_loopback
+        with self.assertRaises(Exception):
+            circut.use_hold_messages = expected_use_hold_messages
 
     def test_can_create_json_and_load_from_json(self):
         expected_software_revision = "SR1"
@@ -105,6 +120,9 @@ class CircutConfigurationTests(unittest.TestCase, test_helpers.TestHelpers):
         expected_data_rate= 9600
         expected_print_queue_length = 500
         expected_calibration_queue_length = 50
+        expected_write_buffer_size = 4096
+        expected_use_loopback = True
+        expected_use_hold_messages = True
 
         original_config = Configuration()
 
@@ -114,6 +132,9 @@ class CircutConfigurationTests(unittest.TestCase, test_helpers.TestHelpers):
         original_config.circut.data_rate = expected_data_rate
         original_config.circut.print_queue_length = expected_print_queue_length
         original_config.circut.calibration_queue_length = expected_calibration_queue_length
+        original_config.circut.write_buffer_size = expected_write_buffer_size
+        original_config.circut.use_loopback = expected_use_loopback
+        original_config.circut.use_hold_messages = expected_use_hold_messages
 
         actual_json = json.loads(original_config.toJson())
         config = Configuration(source=actual_json)
@@ -124,6 +145,9 @@ class CircutConfigurationTests(unittest.TestCase, test_helpers.TestHelpers):
         self.assertEquals(type(expected_data_rate),                 type(config.circut.data_rate))
         self.assertEquals(type(expected_print_queue_length),        type(config.circut.print_queue_length))
         self.assertEquals(type(expected_calibration_queue_length),  type(config.circut.calibration_queue_length))
+        self.assertEquals(type(expected_write_buffer_size), type(config.circut.write_buffer_size))
+        self.assertEquals(type(expected_use_loopback), type(config.circut.use_loopback))
+        self.assertEquals(type(expected_use_hold_messages), type(config.circut.use_hold_messages))
 
         self.assertEquals(expected_software_revision,        config.circut.software_revision)
         self.assertEquals(expected_hardware_revision,        config.circut.hardware_revision)
@@ -131,6 +155,9 @@ class CircutConfigurationTests(unittest.TestCase, test_helpers.TestHelpers):
         self.assertEquals(expected_data_rate,                config.circut.data_rate)
         self.assertEquals(expected_print_queue_length,       config.circut.print_queue_length)
         self.assertEquals(expected_calibration_queue_length, config.circut.calibration_queue_length)
+        self.assertEquals(expected_write_buffer_size, config.circut.write_buffer_size)
+        self.assertEquals(expected_use_loopback, config.circut.use_loopback)
+        self.assertEquals(expected_use_hold_messages, config.circut.use_hold_messages)
 
 class CureRateConfigurationTests(unittest.TestCase, test_helpers.TestHelpers):
     def test_set_should_fail_for_incorrect_values(self):
@@ -295,6 +322,12 @@ class OptionsConfigurationTests(unittest.TestCase, test_helpers.TestHelpers):
         expected_wait_after_move_milliseconds = True
         expected_write_wav_files = "WRONG"
         expected_write_wav_files_folder = True
+        expected_layer_cache_size_mb = 1.5
+        expected_use_layer_cache = "WRONG"
+        expected_prefetch_layers = 1.5
+        expected_use_travel_optimizer = 'True'
+        expected_use_simplification = 'True'
+        expected_use_chunked_gcode = 'True'
 
         options_config = OptionsConfiguration()
 
@@ -328,6 +361,18 @@ class OptionsConfigurationTests(unittest.TestCase, test_helpers.TestHelpers):
             options_config.options.write_wave_files = expected_write_wav_files
         with self.assertRaises(Exception):
             options_config.options.write_wave_files_folder = expected_write_wav_files_folder
+        with self.assertRaises(Exception):
+            options_config.options.layer_cache_size_mb = expected_layer_cache_size_mb
+        with self.assertRaises(Exception):
+            options_config.options.use_layer_cache = expected_use_layer_cache
+        with self.assertRaises(Exception):
+            options_config.options.prefetch_layers = expected_prefetch_layers
+        with self.assertRaises(Exception):
+            options_config.options.use_travel_optimizer = expected_use_travel_optimizer
+        with self.assertRaises(Exception):
+            options_config.options.use_simplification = expected_use_simplification
+        with self.assertRaises(Exception):
+            options_config.options.use_chunked_gcode = expected_use_chunked_gcode
 
     def test_can_create_json_and_load_from_json(self):
         expected_shuffle_layers_amount = 1.0
@@ -346,6 +391,12 @@ class OptionsConfigurationTests(unittest.TestCase, test_helpers.TestHelpers):
         expected_laser_offset = [0.1, 0.1]
         expected_write_wav_files = False
         expected_write_wav_files_folder = 'tmp'
+        expected_layer_cache_size_mb = 100
+        expected_use_layer_cache = True
+        expected_prefetch_layers = 4
+        expected_use_travel_optimizer = True
+        expected_use_simplification = True
+        expected_use_chunked_gcode = True
 
         original_config = Configuration()
         original_config.options.shuffle_layers_amount        = expected_shuffle_layers_amount
@@ -363,6 +414,12 @@ class OptionsConfigurationTests(unittest.TestCase, test_helpers.TestHelpers):
         original_config.options.scaling_factor               = expected_scaling_factor
         original_config.options.write_wave_files             = expected_write_wav_files
         original_config.options.write_wave_files_folder      = expected_write_wav_files_folder
+        original_config.options.layer_cache_size_mb          = expected_layer_cache_size_mb
+        original_config.options.use_layer_cache              = expected_use_layer_cache
+        original_config.options.prefetch_layers              = expected_prefetch_layers
+        original_config.options.use_travel_optimizer         = expected_use_travel_optimizer
+        original_config.options.use_simplification           = expected_use_simplification
+        original_config.options.use_chunked_gcode            = expected_use_chunked_gcode
 
         actual_json = json.loads(original_config.toJson())
         config = Configuration(source=actual_json)
@@ -381,6 +438,12 @@ class OptionsConfigurationTests(unittest.TestCase, test_helpers.TestHelpers):
         self.assertEquals(type(expected_wait_after_move_milliseconds), type(config.options.wait_after_move_milliseconds))
         self.assertEquals(type(expected_write_wav_files), type(config.options.write_wav_files))
         self.assertEquals(type(expected_write_wav_files_folder), type(config.options.write_wav_files_folder))
+        self.assertEquals(type(expected_layer_cache_size_mb), type(config.options.layer_cache_size_mb))
+        self.assertEquals(type(expected_use_layer_cache), type(config.options.use_layer_cache))
+        self.assertEquals(type(expected_prefetch_layers), type(config.options.prefetch_layers))
+        self.assertEquals(type(expected_use_travel_optimizer), type(config.options.use_travel_optimizer))
+        self.assertEquals(type(expected_use_simplification), type(config.options.use_simplification))
+        self.assertEquals(type(expected_use_chunked_gcode), type(config.options.use_chunked_gcode))
 
         self.assertEquals(expected_shuffle_layers_amount, config.options.shuffle_layers_amount)
         self.assertEquals(expected_post_fire_delay, config.options.post_fire_delay)
@@ -396,6 +459,12 @@ class OptionsConfigurationTests(unittest.TestCase, test_helpers.TestHelpers):
         self.assertEquals(expected_wait_after_move_milliseconds, config.options.wait_after_move_milliseconds)
         self.assertEquals(expected_write_wav_files, config.options.write_wav_files)
         self.assertEquals(expected_write_wav_files_folder, config.options.write_wav_files_folder)
+        self.assertEquals(expected_layer_cache_size_mb, config.options.layer_cache_size_mb)
+        self.assertEquals(expected_use_layer_cache, config.options.use_layer_cache)
+        self.assertEquals(expected_prefetch_layers, config.options.prefetch_layers)
+        self.assertEquals(expected_use_travel_optimizer, config.options.use_travel_optimizer)
+        self.assertEquals(expected_use_simplification, config.options.use_simplification)
+        self.assertEquals(expected_use_chunked_gcode, config.options.use_chunked_gcode)
 
 
 class ConfigurationTests(unittest.TestCase, test_helpers.TestHelpers):
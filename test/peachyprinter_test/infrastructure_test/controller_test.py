@@ -58,6 +58,7 @@ class ControllerTests(unittest.TestCase):
         self.wait_for_controller()
 
         self.assertEquals("Complete", self.controller.get_status()['status'])
+        self.assertEquals("Complete", self.controller.get_status_since()['status'])
 
     def test_run_should_record_errors_and_abort(self, mock_LayerGenerator, mock_LayerWriter, mock_LayerProcessing):
         mock_layer_writer = mock_LayerWriter.return_value
@@ -171,6 +172,43 @@ class ControllerTests(unittest.TestCase):
         mock_layer_processing.abort_current_command.assert_called_with()
 
 
+    def test_run_should_complete_when_prefetching_layers(self, mock_LayerGenerator, mock_LayerWriter, mock_LayerProcessing):
+        mock_layer_writer = mock_LayerWriter.return_value
+        mock_layer_processing = mock_LayerProcessing.return_value
+        test_layers = [Layer(float(z), [LateralDraw([0.0, 0.0], [2.0, 2.0], 2.0)]) for z in range(0, 10)]
+        stub_layer_generator = StubLayerGenerator(list(test_layers))
+
+        self.controller = Controller(mock_layer_writer, mock_layer_processing, stub_layer_generator, MachineStatus(), True, prefetch_layers=3)
+        self.controller.start()
+
+        self.wait_for_controller()
+
+        self.assertEquals("Complete", self.controller.get_status()['status'])
+        self.assertEquals(test_layers, [call[0][0] for call in mock_layer_processing.process.call_args_list])
+        self.assertTrue(self.controller.get_status()['layer_queue_depth'] <= 3)
+
+    def test_change_generator_should_flush_prefetched_layers(self, mock_LayerGenerator, mock_LayerWriter, mock_LayerProcessing):
+        mock_layer_writer = mock_LayerWriter.return_value
+        mock_layer_processing = mock_LayerProcessing.return_value
+
+        test_layer1 = Layer(0.0, [LateralDraw([0.0, 0.0], [2.0, 2.0], 100.0)])
+        test_layer2 = Layer(0.1, [LateralDraw([0.0, 0.0], [2.0, 2.0], 100.0)])
+        stub_layer_generator1 = StubLayerGenerator([test_layer1], repeat=True)
+        stub_layer_generator2 = StubLayerGenerator([test_layer2], repeat=True)
+
+        self.controller = Controller(mock_layer_writer, mock_layer_processing, stub_layer_generator1, MachineStatus(), False, prefetch_layers=5)
+        self.controller.start()
+        time.sleep(0.2)
+        self.controller.change_generator(stub_layer_generator2)
+        switch_count = mock_layer_processing.process.call_count
+        time.sleep(0.2)
+        self.controller.close()
+        self.wait_for_controller()
+
+        post_switch = [call[0][0] for call in mock_layer_processing.process.call_args_list[switch_count + 1:]]
+        self.assertTrue(len(post_switch) > 0)
+        self.assertEquals([test_layer2] * len(post_switch), post_switch)
+
 if __name__ == '__main__':
     logging.basicConfig(format='%(asctime)s %(levelname)s: %(message)s', level='DEBUG')
     unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+import os
+import sys
+import math
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', 'src'))
+
+from peachyprinter.infrastructure.drip_history import DripHistory
+
+
+class DripHistoryTests(unittest.TestCase):
+
+    def test_init_rejects_bad_settings(self):
+        with self.assertRaises(Exception):
+            DripHistory(0)
+        with self.assertRaises(Exception):
+            DripHistory(10, rate_windows=(0.0,))
+        with self.assertRaises(Exception):
+            DripHistory(10, ewma_seconds=0)
+
+    def test_view_is_empty_initially(self):
+        history = DripHistory(5)
+        self.assertEqual(0, len(history.view))
+        self.assertEqual(None, history.latest)
+
+    def test_view_returns_times_oldest_first(self):
+        history = DripHistory(5)
+        for timestamp in [1.0, 2.0, 3.0]:
+            history.append(timestamp)
+        self.assertEqual([1.0, 2.0, 3.0], history.view.tolist())
+        self.assertEqual(3.0, history.latest)
+
+    def test_view_keeps_only_last_length_times_after_wrapping(self):
+        history = DripHistory(5)
+        for timestamp in range(12):
+            history.append(float(timestamp))
+        self.assertEqual([7.0, 8.0, 9.0, 10.0, 11.0], history.view.tolist())
+        self.assertEqual(12, history.count)
+        self.assertEqual(5, len(history))
+
+    def test_view_is_read_only(self):
+        history = DripHistory(5)
+        history.append(1.0)
+        view = history.view
+        with self.assertRaises(ValueError):
+            view[0] = 2.0
+
+    def test_view_is_not_a_copy(self):
+        history = DripHistory(5)
+        history.append(1.0)
+        history.append(2.0)
+        self.assertFalse(history.view.flags.owndata)
+
+    def test_append_records_each_drip_at_timestamp(self):
+        history = DripHistory(5)
+        history.append(1.0)
+        history.append(2.0, 3)
+        self.assertEqual([1.0, 2.0, 2.0, 2.0], history.view.tolist())
+
+    def test_append_more_drips_than_length_keeps_length(self):
+        history = DripHistory(5)
+        history.append(1.0)
+        history.append(2.0, 12)
+        self.assertEqual([2.0] * 5, history.view.tolist())
+        self.assertEqual(13, history.count)
+
+    def test_append_ignores_no_drips(self):
+        history = DripHistory(5)
+        history.append(1.0, 0)
+        history.append(1.0, -2)
+        self.assertEqual(0, history.count)
+
+    def test_average_matches_drips_over_span(self):
+        history = DripHistory(50)
+        for drip in range(20):
+            history.append(drip * 0.5)
+        self.assertEqual(0.0, DripHistory(50).average(10))
+        self.assertAlmostEqual(10 / 4.5, history.average(10))
+
+    def test_rates_counts_drips_in_each_window(self):
+        history = DripHistory(500, rate_windows=(1.0, 10.0))
+        for drip in range(100):
+            history.append(drip * 0.25)
+
+        rates = history.rates(now=24.75)
+
+        self.assertAlmostEqual(4.0, rates[1.0])
+        self.assertAlmostEqual(4.0, rates[10.0])
+
+    def test_rates_fall_when_dripping_stops(self):
+        history = DripHistory(500, rate_windows=(1.0, 10.0))
+        for drip in range(100):
+            history.append(drip * 0.25)
+        history.rates(now=24.75)
+
+        rates = history.rates(now=29.75)
+
+        self.assertAlmostEqual(0.0, rates[1.0])
+        self.assertAlmostEqual(2.0, rates[10.0])
+
+    def test_rates_only_use_retained_drips(self):
+        history = DripHistory(10, rate_windows=(100.0,))
+        for drip in range(50):
+            history.append(float(drip))
+        self.assertAlmostEqual(10 / 100.0, history.rates(now=50.0)[100.0])
+
+    def test_ewma_converges_to_steady_rate(self):
+        history = DripHistory(50, ewma_seconds=1.0)
+        self.assertEqual(0.0, history.ewma)
+        for drip in range(100):
+            history.append(drip * 0.5)
+        self.assertAlmostEqual(2.0, history.ewma)
+
+    def test_ewma_weights_by_time_since_last_drip(self):
+        history = DripHistory(50, ewma_seconds=2.0)
+        history.append(0.0)
+        history.append(1.0, 4)
+        expected = (1.0 - math.exp(-0.5)) * 4.0
+        self.assertAlmostEqual(expected, history.ewma)
+
+    def test_reset_clears_history_and_rates(self):
+        history = DripHistory(5)
+        for drip in range(10):
+            history.append(float(drip))
+        history.reset()
+        self.assertEqual(0, len(history.view))
+        self.assertEqual(0.0, history.ewma)
+        self.assertEqual(0.0, history.rates(now=10.0)[1.0])
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s %(levelname)s: %(message)s', level='DEBUG')
+    unittest.main()
@@ -1,8 +1,12 @@
 import unittest
+import math
 import StringIO
 import os
 import sys
 import logging
+import shutil
+import tempfile
+import numpy
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', 'src'))
@@ -10,7 +14,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', 'sr
 import test_helpers
 from mock import patch
 
-from peachyprinter.infrastructure.gcode_layer_generator import GCodeReader, GCodeToLayerGenerator, GCodeCommandReader
+from peachyprinter.infrastructure.gcode_layer_generator import GCodeReader, GCodeToLayerGenerator, GCodeCommandReader, GCodeLayerIndex, GCodeChunkTokenizer, GCodeLine, GCodeRun
 from peachyprinter.domain.commands import *
 
 
@@ -56,6 +60,22 @@ class GCodeReaderTests(unittest.TestCase, test_helpers.TestHelpers):
         gcode_reader.check()
         mock_GCodeToLayerGenerator.assert_called_with(test_gcode, scale=1.0, start_height=expected_start_height)
 
+    @patch('peachyprinter.infrastructure.gcode_layer_generator.GCodeToLayerGenerator')
+    def test_get_layers_should_read_in_chunks_when_chunked(self, mock_GCodeToLayerGenerator):
+        test_gcode = StringIO.StringIO("G01 X0.00 Y0.00 E1 F100.0\n")
+
+        GCodeReader(test_gcode, scale=2.0, chunked=True).get_layers()
+
+        mock_GCodeToLayerGenerator.assert_called_with(test_gcode, scale=2.0, start_height=None, chunked=True)
+
+    @patch('peachyprinter.infrastructure.gcode_layer_generator.GCodeToLayerGenerator')
+    def test_get_layers_should_use_arc_resolution(self, mock_GCodeToLayerGenerator):
+        test_gcode = StringIO.StringIO("G2 X0.00 Y0.00 I1.0 E1 F100.0\n")
+
+        GCodeReader(test_gcode, chord_error=0.05, samples_per_second=8000).get_layers()
+
+        mock_GCodeToLayerGenerator.assert_called_with(test_gcode, scale=1.0, start_height=None, chord_error=0.05, samples_per_second=8000)
+
 
 class GCodeToLayerGeneratorTests(unittest.TestCase, test_helpers.TestHelpers):
 
@@ -81,6 +101,12 @@ class GCodeToLayerGeneratorTests(unittest.TestCase, test_helpers.TestHelpers):
         GCodeToLayerGenerator(test_gcode, scale=0.1)
         mock_GCodeCommandReader.assert_called_with(scale=0.1)
 
+    @patch('peachyprinter.infrastructure.gcode_layer_generator.GCodeCommandReader')
+    def test_when_arc_resolution_provided_gcode_command_called_with_it(self, mock_GCodeCommandReader):
+        test_gcode = StringIO.StringIO("G01 X0.00 Y0.00 E1 F100.0\n")
+        GCodeToLayerGenerator(test_gcode, scale=0.1, chord_error=0.05, samples_per_second=8000)
+        mock_GCodeCommandReader.assert_called_with(scale=0.1, chord_error=0.05, samples_per_second=8000)
+
     @patch('peachyprinter.infrastructure.gcode_layer_generator.GCodeCommandReader')
     def test_get_layers_returns_a_single_layer_with_multipule_commands(self, mock_GCodeCommandReader):
         command1 = LateralDraw([0.0, 0.0], [0.0, 0.0], 100.0)
@@ -211,6 +237,241 @@ class GCodeToLayerGeneratorTests(unittest.TestCase, test_helpers.TestHelpers):
         self.assertLayersEquals(expected, actual)
 
 
+class ChunkedGCodeToLayerGeneratorTests(unittest.TestCase, test_helpers.TestHelpers):
+    gcode = "\n".join([
+        "; header",
+        "M104 S0",
+        "G21",
+        "G1 Z0.1 F600",
+        "G1 X1.0 Y1.0 E1",
+        "  G1 F1200 X2.0 Y1.0 E1  ",
+        "G0 X3.0 Y3.0",
+        "G1 Y2.0 X1.0 E1",
+        "Fake Gcode",
+        "",
+        "G1 Z0.2",
+        "G1 X1.0 Y2.0 F0",
+        "G1 X2.0 Y2.0 E1 F60",
+        "G1 X1.0 Y2.0 Z0.3 E1",
+        "G20",
+        "G1 X1.0 Y1.0 E0.5",
+        "G1 X1.0 Y0.0",
+        ])
+
+    def line_by_line_and_chunked(self, gcode, **kwargs):
+        expected_generator = GCodeToLayerGenerator(StringIO.StringIO(gcode), **kwargs)
+        expected = list(expected_generator)
+        actual_generator = GCodeToLayerGenerator(StringIO.StringIO(gcode), chunked=True, **kwargs)
+        actual = list(actual_generator)
+        return expected, expected_generator.errors, actual, actual_generator.errors
+
+    def test_chunked_layers_match_line_by_line_layers(self):
+        expected, expected_errors, actual, actual_errors = self.line_by_line_and_chunked(self.gcode)
+
+        self.assertTrue(all(isinstance(layer, ArrayLayer) for layer in actual))
+        self.assertLayersEquals(expected, [layer.to_layer() for layer in actual])
+        self.assertEquals(expected_errors, actual_errors)
+
+    def test_chunked_errors_report_line_numbers(self):
+        layer_generator = GCodeToLayerGenerator(StringIO.StringIO(self.gcode), chunked=True)
+
+        list(layer_generator)
+
+        self.assertEquals(["Error 9: Unsupported Command: Fake Gcode", "Error 12: Feed Rate Never Specified"], layer_generator.errors)
+
+    def test_chunked_layers_match_when_lines_span_chunks(self):
+        expected = list(GCodeToLayerGenerator(StringIO.StringIO(self.gcode)))
+
+        with patch.object(GCodeChunkTokenizer, 'CHUNK_SIZE', 7):
+            layer_generator = GCodeToLayerGenerator(StringIO.StringIO(self.gcode), chunked=True)
+            actual = list(layer_generator)
+
+        self.assertLayersEquals(expected, [layer.to_layer() for layer in actual])
+        self.assertEquals(2, len(layer_generator.errors))
+        self.assertTrue(layer_generator.errors[1].startswith("Error 12:"))
+
+    def test_chunked_generator_resumes_at_start_height_using_index(self):
+        gcode = self.gcode + "\nFake Gcode\n"
+        layer_index = GCodeLayerIndex.build(StringIO.StringIO(gcode))
+        expected = list(GCodeToLayerGenerator(StringIO.StringIO(gcode), start_height=0.3))
+
+        layer_generator = GCodeToLayerGenerator(StringIO.StringIO(gcode), start_height=0.3, layer_index=layer_index, chunked=True)
+        actual = list(layer_generator)
+
+        self.assertLayersEquals(expected, [layer.to_layer() for layer in actual])
+        self.assertEquals(["Error 18: Unsupported Command: Fake Gcode"], layer_generator.errors)
+
+
+class GCodeChunkTokenizerTests(unittest.TestCase):
+    def test_read_returns_runs_of_lateral_lines_and_other_lines(self):
+        gcode = "; comment\nG1 X1 Y2 E1\nM106\nG0 F600 X3 Y4\nG21\n\nG1 X5 Y6 F60\n"
+        tokenizer = GCodeChunkTokenizer(StringIO.StringIO(gcode))
+
+        tokens = tokenizer.read()
+
+        self.assertEquals([GCodeRun, GCodeLine, GCodeRun], [type(token) for token in tokens])
+        self.assertEquals([2, 4], list(tokens[0].line_numbers))
+        self.assertEquals(['1', '3'], list(tokens[0].x))
+        self.assertEquals(['2', '4'], list(tokens[0].y))
+        self.assertEquals(['', '600'], list(tokens[0].feed_rate))
+        self.assertEquals(['1', ''], list(tokens[0].extrude))
+        self.assertEquals((5, 'G21'), (tokens[1].line_number, tokens[1].gcode))
+        self.assertEquals([7], list(tokens[2].line_numbers))
+        self.assertEquals(['60'], list(tokens[2].feed_rate))
+        self.assertEquals(None, tokenizer.read())
+
+    def test_read_leaves_lines_with_other_fields_for_the_command_reader(self):
+        gcode = "G1 X1 Y2 Z3\nG1 X1 Y2 S3\nG1  X1 Y2\nG00 X1 Y2\nG1 X1 Y2 ; note\n"
+        tokenizer = GCodeChunkTokenizer(StringIO.StringIO(gcode))
+
+        tokens = tokenizer.read()
+
+        self.assertEquals([GCodeLine] * 5, [type(token) for token in tokens])
+        self.assertEquals([1, 2, 3, 4, 5], [token.line_number for token in tokens])
+
+    def test_read_carries_partial_lines_to_the_next_chunk(self):
+        tokenizer = GCodeChunkTokenizer(StringIO.StringIO("G21\nG20\nG1 X1 Y2"), line_number=10, chunk_size=6)
+
+        tokens = []
+        while True:
+            chunk = tokenizer.read()
+            if chunk is None:
+                break
+            tokens.extend(chunk)
+
+        self.assertEquals([11, 12, 13], [token.line_number if type(token) == GCodeLine else token.line_numbers[0] for token in tokens])
+        self.assertEquals(13, tokenizer.line_number)
+
+
+class GCodeLayerIndexTests(unittest.TestCase, test_helpers.TestHelpers):
+    gcode = "\n".join([
+        "G21",
+        "G1 Z0.1 F600",
+        "G1 X1.0 Y1.0 E1",
+        "G1 X2.0 Y1.0 E1",
+        "; comment",
+        "G1 Z0.2",
+        "G1 X1.0 Y2.0 F1200",
+        "G1 X2.0 Y2.0 E1",
+        "G1 Z0.3",
+        "G1 X3.0 Y3.0 E1",
+        "G1 X2.0 Y3.0 E1",
+        "",
+        ])
+
+    def test_build_records_offset_and_parser_state_for_each_layer(self):
+        layer_index = GCodeLayerIndex.build(StringIO.StringIO(self.gcode))
+
+        self.assertEquals([0.1, 0.2, 0.3], [entry['z'] for entry in layer_index.entries])
+        entry = layer_index.entries[2]
+        self.assertEquals(self.gcode.index("G1 Z0.3"), entry['offset'])
+        self.assertEquals(8, entry['line'])
+        self.assertEquals('mm', entry['units'])
+        self.assertEquals(20.0, entry['mm_per_s'])
+        self.assertEquals([2.0, 2.0], entry['current_xy'])
+        self.assertEquals(0.2, entry['current_z_pos'])
+        self.assertAlmostEquals(0.1, entry['layer_height'])
+
+    def test_entry_for_height_returns_first_layer_at_or_above_height(self):
+        layer_index = GCodeLayerIndex.build(StringIO.StringIO(self.gcode))
+
+        self.assertEquals(0.2, layer_index.entry_for_height(0.15)['z'])
+        self.assertEquals(0.2, layer_index.entry_for_height(0.2)['z'])
+        self.assertEquals(None, layer_index.entry_for_height(0.4))
+
+    def test_build_ignores_heights_that_do_not_rise_past_the_last_layer(self):
+        gcode = "\n".join([
+            "G21",
+            "G1 Z0.1 F600",
+            "G1 X1.0 Y1.0 E1",
+            "G1 Z0.2",
+            "G1 X2.0 Y1.0 E1",
+            "G1 Z0.6",
+            "G1 X1.0 Y2.0",
+            "G1 Z0.2",
+            "G1 X2.0 Y2.0 E1",
+            "G1 Z0.3",
+            "G1 X3.0 Y3.0 E1",
+            "G1 Z0.2",
+            "",
+            ])
+
+        layer_index = GCodeLayerIndex.build(StringIO.StringIO(gcode))
+
+        self.assertEquals([0.1, 0.2, 0.6], [entry['z'] for entry in layer_index.entries])
+        self.assertEquals(gcode.index("G1 Z0.2"), layer_index.entry_for_height(0.2)['offset'])
+        self.assertEquals(gcode.index("G1 Z0.6"), layer_index.entry_for_height(0.3)['offset'])
+        self.assertEquals(None, layer_index.entry_for_height(0.7))
+
+    def test_generator_resumes_at_start_height_using_index(self):
+        layer_index = GCodeLayerIndex.build(StringIO.StringIO(self.gcode))
+        expected = list(GCodeToLayerGenerator(StringIO.StringIO(self.gcode), start_height=0.2))
+
+        layer_generator = GCodeToLayerGenerator(StringIO.StringIO(self.gcode), start_height=0.2, layer_index=layer_index)
+        actual = list(layer_generator)
+
+        self.assertLayersEquals(expected, actual)
+        self.assertEquals([], layer_generator.errors)
+
+    def test_generator_skips_lines_below_start_height_using_index(self):
+        gcode = "Fake Gcode\n" + self.gcode
+        layer_index = GCodeLayerIndex.build(StringIO.StringIO(gcode))
+
+        layer_generator = GCodeToLayerGenerator(StringIO.StringIO(gcode), start_height=0.2, layer_index=layer_index)
+        list(layer_generator)
+
+        self.assertEquals([], layer_generator.errors)
+
+    def test_generator_reports_line_numbers_after_resume(self):
+        gcode = self.gcode + "Fake Gcode\n"
+        layer_index = GCodeLayerIndex.build(StringIO.StringIO(gcode))
+
+        layer_generator = GCodeToLayerGenerator(StringIO.StringIO(gcode), start_height=0.3, layer_index=layer_index)
+        list(layer_generator)
+
+        self.assertEquals(1, len(layer_generator.errors))
+        self.assertTrue(layer_generator.errors[0].startswith("Error 12:"))
+
+    def test_build_follows_arcs_with_omitted_axes(self):
+        gcode = "G1 Z0.1 F600\nG1 X1.0 Y1.0 E1\nG2 Y3.0 J1.0 E1\nG1 Z0.2\n"
+
+        layer_index = GCodeLayerIndex.build(StringIO.StringIO(gcode))
+
+        self.assertEquals([1.0, 3.0], layer_index.entries[1]['current_xy'])
+
+    def test_load_or_build_caches_index_next_to_file(self):
+        folder = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(folder, 'test.gcode')
+            with open(file_name, 'w') as gcode_file:
+                gcode_file.write(self.gcode)
+
+            built = GCodeLayerIndex.load_or_build(file_name)
+
+            self.assertTrue(os.path.isfile(GCodeLayerIndex.index_file_name(file_name)))
+            with patch.object(GCodeLayerIndex, 'build') as mock_build:
+                loaded = GCodeLayerIndex.load_or_build(file_name)
+                self.assertEquals(0, mock_build.call_count)
+            self.assertEquals(built.entries, loaded.entries)
+            self.assertEquals(built.entry_for_height(1.5), loaded.entry_for_height(1.5))
+        finally:
+            shutil.rmtree(folder)
+
+    def test_load_or_build_rebuilds_when_scale_changes(self):
+        folder = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(folder, 'test.gcode')
+            with open(file_name, 'w') as gcode_file:
+                gcode_file.write(self.gcode)
+            GCodeLayerIndex.load_or_build(file_name)
+
+            layer_index = GCodeLayerIndex.load_or_build(file_name, scale=10.0)
+
+            self.assertEquals([1.0, 2.0, 3.0], [entry['z'] for entry in layer_index.entries])
+        finally:
+            shutil.rmtree(folder)
+
+
 class GCodeCommandReaderTest(unittest.TestCase, test_helpers.TestHelpers):
     def test_to_command_returns_empty_list_for_comments(self):
         test_gcode_line = ";Comment"
@@ -423,6 +684,12 @@ class GCodeCommandReaderTest(unittest.TestCase, test_helpers.TestHelpers):
         command_reader.to_command(gcode_feet)
         self.assertCommandsEqual(expected_feet, command_reader.to_command(gcode_feet_line))
 
+    def test_to_command_returns_empty_list_for_units(self):
+        command_reader = GCodeCommandReader()
+
+        self.assertEquals([], command_reader.to_command("G21"))
+        self.assertEquals([], command_reader.to_command("G20"))
+
     def test_to_command_can_scale_when_scale_provided(self):
         gcode_setup1 = "G0 Z0.1 F6000 E0"
         gcode_setup2 = "G0 Z0.2 F6000 E0"
@@ -439,6 +706,116 @@ class GCodeCommandReaderTest(unittest.TestCase, test_helpers.TestHelpers):
         command_reader.to_command(gcode_setup3)
 
         self.assertCommandsEqual(expected, command_reader.to_command(gcode_test))
+    def test_to_arrays_matches_to_command_for_lateral_lines(self):
+        lines = ["G1 X1.0 Y1.0 E1", "G1 X2.0 Y1.0 F1200", "G1 X3.0", "G1 X2.0 Y2.0 E0.5"]
+        command_reader = GCodeCommandReader(scale=2.0)
+        expected = []
+        for line in lines:
+            expected.extend(command_reader.to_command(line))
+        array_reader = GCodeCommandReader(scale=2.0)
+
+        actual, failed = array_reader.to_arrays(['1.0', '2.0', '3.0', '2.0'], ['1.0', '1.0', '', '2.0'], ['', '1200', '', ''], ['1', '', '', '0.5'])
+
+        self.assertCommandsEqual(expected, list(actual.commands))
+        self.assertEquals([], list(failed))
+        self.assertEquals(command_reader.get_state(), array_reader.get_state())
+
+    def test_to_arrays_reports_lines_without_feed_rate(self):
+        command_reader = GCodeCommandReader()
+
+        actual, failed = command_reader.to_arrays(['1', '2', '3'], ['1', '2', '3'], ['0', '', '60'], ['1', '1', '1'])
+
+        self.assertEquals([0, 1], list(failed))
+        self.assertCommandsEqual([LateralDraw([0.0, 0.0], [3.0, 3.0], 1.0)], list(actual.commands))
+
+    def assertOnCircle(self, center, radius, commands, tolerance):
+        for command in commands:
+            for point in [command.start, command.end]:
+                self.assertAlmostEquals(radius, math.hypot(point[0] - center[0], point[1] - center[1]), 9)
+            middle = [(command.start[0] + command.end[0]) / 2.0, (command.start[1] + command.end[1]) / 2.0]
+            self.assertTrue(radius - math.hypot(middle[0] - center[0], middle[1] - center[1]) <= tolerance)
+
+    def test_to_command_draws_counterclockwise_arc_given_center_offset(self):
+        command_reader = GCodeCommandReader(chord_error=0.01)
+        command_reader.to_command("G1 X10.0 Y0.0 F600")
+
+        actual = command_reader.to_command("G3 X0.0 Y10.0 I-10.0 J0.0 E1")
+
+        self.assertTrue(all(type(command) == LateralDraw for command in actual))
+        self.assertEquals([10.0, 0.0], actual[0].start)
+        self.assertEquals([0.0, 10.0], actual[-1].end)
+        self.assertTrue(actual[0].end[1] > 0.0)
+        self.assertOnCircle([0.0, 0.0], 10.0, actual, 0.01)
+        self.assertEquals([0.0, 10.0], command_reader._current_xy)
+
+    def test_to_command_moves_clockwise_arc_given_radius(self):
+        command_reader = GCodeCommandReader(chord_error=0.01)
+        command_reader.to_command("G1 X10.0 Y0.0 F600")
+
+        actual = command_reader.to_command("G2 X0.0 Y10.0 R10.0")
+
+        self.assertTrue(all(type(command) == LateralMove for command in actual))
+        self.assertOnCircle([10.0, 10.0], 10.0, actual, 0.01)
+
+    def test_to_command_takes_long_way_round_given_negative_radius(self):
+        command_reader = GCodeCommandReader(chord_error=0.01)
+        command_reader.to_command("G1 X10.0 Y0.0 F600")
+
+        actual = command_reader.to_command("G2 X0.0 Y10.0 R-10.0 E1")
+
+        self.assertOnCircle([0.0, 0.0], 10.0, actual, 0.01)
+        self.assertTrue(actual[0].end[1] < 0.0)
+
+    def test_to_command_draws_full_circle_when_arc_ends_at_start(self):
+        command_reader = GCodeCommandReader(chord_error=0.01)
+        command_reader.to_command("G1 X10.0 Y0.0 F600")
+
+        actual = command_reader.to_command("G2 I-10.0 E1")
+
+        self.assertOnCircle([0.0, 0.0], 10.0, actual, 0.01)
+        self.assertEquals([10.0, 0.0], actual[-1].end)
+        self.assertAlmostEquals(2 * math.pi * 10.0, sum(math.hypot(c.end[0] - c.start[0], c.end[1] - c.start[1]) for c in actual), 1)
+
+    def test_to_command_uses_fewer_segments_for_coarser_chord_error(self):
+        fine = GCodeCommandReader(chord_error=0.01)
+        coarse = GCodeCommandReader(chord_error=0.1)
+
+        self.assertTrue(len(coarse.to_command("G3 X-1.0 Y1.0 I-1.0 F600")) < len(fine.to_command("G3 X-1.0 Y1.0 I-1.0 F600")))
+
+    def test_to_command_limits_arc_segments_to_sample_distance(self):
+        command_reader = GCodeCommandReader(chord_error=0.0001, samples_per_second=100)
+        command_reader.to_command("G1 X10.0 Y0.0 F600")
+
+        actual = command_reader.to_command("G3 X0.0 Y10.0 I-10.0 E1")
+
+        self.assertEquals(int(10.0 * math.pi / 2.0 / 0.1), len(actual))
+
+    def test_to_command_reuses_arc_templates(self):
+        command_reader = GCodeCommandReader()
+        command_reader.to_command("G1 X1.0 Y0.0 F600")
+        command_reader.to_command("G3 I-1.0 E1")
+
+        with patch('peachyprinter.infrastructure.gcode_layer_generator.numpy.exp') as mock_exp:
+            command_reader.to_command("G3 I-1.0 E1")
+            self.assertEquals(0, mock_exp.call_count)
+
+    def test_arc_templates_are_shared_by_arcs_with_different_sweeps(self):
+        expected = numpy.exp(-2.5j * numpy.arange(1, 8) / 7.0)
+        GCodeCommandReader._arc_template(7, 1.0)
+
+        with patch('peachyprinter.infrastructure.gcode_layer_generator.numpy.exp') as mock_exp:
+            actual = GCodeCommandReader._arc_template(7, -2.5)
+            self.assertEquals(0, mock_exp.call_count)
+        self.assertTrue(numpy.allclose(expected, actual))
+
+    def test_to_command_arc_requires_center_or_radius(self):
+        command_reader = GCodeCommandReader()
+
+        with self.assertRaises(Exception):
+            command_reader.to_command("G2 X1.0 Y1.0 E1")
+        with self.assertRaises(Exception):
+            command_reader.to_command("G2 X1.0 Y1.0 I1.0 R1.0 E1")
+
 
 if __name__ == '__main__':
     logging.basicConfig(format='%(asctime)s %(levelname)s: %(message)s', level='INFO')
@@ -0,0 +1,140 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import StringIO
+from mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', 'src'))
+
+import test_helpers
+from peachyprinter.infrastructure.layer_cache import LayerCache, CompiledLayerFile, CompiledLayerGenerator
+from peachyprinter.infrastructure.gcode_layer_generator import GCodeToLayerGenerator
+from peachyprinter.domain.commands import *
+
+
+class LayerCacheTests(unittest.TestCase, test_helpers.TestHelpers):
+    gcode = "\n".join([
+        "G21",
+        "G1 Z0.1 F600",
+        "G1 X1.0 Y1.0 E1",
+        "G1 X2.0 Y1.0 E1",
+        "G1 Z0.2",
+        "G1 X1.0 Y2.0 F1200",
+        "G1 X2.0 Y2.0 E1",
+        "G1 Z0.3",
+        "G1 X3.0 Y3.0 E1",
+        "G1 X2.5 Y3.0 E1",
+        "",
+        ])
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache_folder = os.path.join(self.folder, 'cache')
+        self.gcode_file_name = self._write_gcode('test.gcode', self.gcode)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _write_gcode(self, name, gcode):
+        file_name = os.path.join(self.folder, name)
+        with open(file_name, 'w') as gcode_file:
+            gcode_file.write(gcode)
+        return file_name
+
+    def test_compiled_layers_match_parsed_layers(self):
+        expected = list(GCodeToLayerGenerator(StringIO.StringIO(self.gcode), scale=2.0))
+        layer_cache = LayerCache(self.cache_folder)
+
+        actual = [layer.to_layer() for layer in layer_cache.get_layers(self.gcode_file_name, scale=2.0)]
+
+        self.assertLayersEquals(expected, actual)
+
+    def test_compiled_arcs_match_parsed_arcs(self):
+        gcode = "\n".join(["G21", "G1 Z0.1 F600", "G1 X10.0 Y0.0", "G2 X0.0 Y-10.0 I-10.0 J0.0 E1", "G3 X10.0 Y0.0 I0.0 J10.0 E1", ""])
+        file_name = self._write_gcode('arcs.gcode', gcode)
+        expected = list(GCodeToLayerGenerator(StringIO.StringIO(gcode), chord_error=0.25, samples_per_second=11000))
+        layer_cache = LayerCache(self.cache_folder)
+
+        actual = [layer.to_layer() for layer in layer_cache.get_layers(file_name, chord_error=0.25, samples_per_second=11000)]
+
+        self.assertTrue(len(expected[0].commands) > 3)
+        self.assertLayersEquals(expected, actual)
+
+    def test_compiled_layers_start_at_start_height(self):
+        layer_cache = LayerCache(self.cache_folder)
+
+        actual = list(layer_cache.get_layers(self.gcode_file_name, start_height=0.2))
+
+        self.assertEquals([0.2, 0.3], [layer.z for layer in actual])
+
+    def test_second_request_uses_compiled_file(self):
+        layer_cache = LayerCache(self.cache_folder)
+        list(layer_cache.get_layers(self.gcode_file_name))
+
+        with patch.object(CompiledLayerFile, 'write') as mock_write:
+            layers = list(layer_cache.get_layers(self.gcode_file_name))
+            self.assertEquals(0, mock_write.call_count)
+        self.assertEquals(3, len(layers))
+
+    def test_compiled_file_is_keyed_by_scale(self):
+        layer_cache = LayerCache(self.cache_folder)
+
+        self.assertNotEquals(
+            layer_cache.compiled_file_name(self.gcode_file_name, 1.0),
+            layer_cache.compiled_file_name(self.gcode_file_name, 2.0))
+
+    def test_compiled_file_is_keyed_by_arc_settings(self):
+        layer_cache = LayerCache(self.cache_folder)
+
+        self.assertNotEquals(
+            layer_cache.compiled_file_name(self.gcode_file_name, 1.0, 0.25, 11000),
+            layer_cache.compiled_file_name(self.gcode_file_name, 1.0, 0.5, 11000))
+        self.assertNotEquals(
+            layer_cache.compiled_file_name(self.gcode_file_name, 1.0, 0.25, 11000),
+            layer_cache.compiled_file_name(self.gcode_file_name, 1.0, 0.25, 22000))
+
+    def test_files_with_errors_are_not_cached(self):
+        file_name = self._write_gcode('bad.gcode', self.gcode + "Fake Gcode\n")
+        layer_cache = LayerCache(self.cache_folder)
+
+        self.assertEquals(None, layer_cache.get_layers(file_name))
+        self.assertEquals([], [name for name in os.listdir(self.cache_folder) if name.endswith(LayerCache.EXTENSION)])
+
+    def test_least_recently_used_files_are_evicted_when_over_size(self):
+        layer_cache = LayerCache(self.cache_folder, max_size_mb=0)
+        first = self._write_gcode('first.gcode', self.gcode)
+        second = self._write_gcode('second.gcode', self.gcode + "G1 X1.0 Y1.0 E1\n")
+
+        layer_cache.get_layers(first).close()
+        layer_cache.get_layers(second).close()
+
+        self.assertFalse(os.path.isfile(layer_cache.compiled_file_name(first, 1.0)))
+        self.assertTrue(os.path.isfile(layer_cache.compiled_file_name(second, 1.0)))
+
+
+class CompiledLayerFileTests(unittest.TestCase, test_helpers.TestHelpers):
+    def test_write_and_read_layers(self):
+        folder = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(folder, 'layers')
+            layers = [
+                Layer(0.5, [LateralMove([0.0, 0.0], [1.0, 1.0], 10.0), LateralDraw([1.0, 1.0], [2.0, 1.0], 20.0)]),
+                Layer(1.0, []),
+                Layer(1.5, [LateralDraw([2.0, 1.0], [2.0, 2.0], 30.0)]),
+                ]
+
+            CompiledLayerFile.write(file_name, layers)
+            generator = CompiledLayerGenerator(file_name)
+            actual = [layer.to_layer() for layer in generator]
+            generator.close()
+
+            self.assertLayersEquals(layers, actual)
+        finally:
+            shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,8 +2,9 @@ import unittest
 import os
 import sys
 import time
+import threading
 import logging
-from mock import patch, call, Mock
+from mock import patch, call, Mock, MagicMock
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', 'src'))
@@ -11,6 +12,9 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', 'sr
 from peachyprinter.infrastructure.layer_control import *
 from peachyprinter.domain.commands import *
 from peachyprinter.infrastructure.machine import *
+from peachyprinter.domain.laser_control import LaserControl
+from peachyprinter.infrastructure.zaxis import SerialDripZAxis
+from peachyprinter.infrastructure.messages import DripRecordedMessage
 
 
 @patch('peachyprinter.domain.laser_control.LaserControl')
@@ -89,6 +93,29 @@ class LayerWriterTests(unittest.TestCase):
 
         mock_disseminator.process.assert_called_with("SomeAudio")
 
+    def test_process_layer_should_flush_disseminator_at_end_of_layer(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
+        mock_laser_control = mock_LaserControl.return_value
+        mock_path_to_points = mock_PathToPoints.return_value
+        mock_disseminator = mock_MicroDisseminator.return_value
+        test_layer = Layer(0.0, [LateralDraw([0.0, 0.0], [2.0, 2.0], 2.0)])
+        mock_path_to_points.process.return_value = "SomeAudio"
+        self.writer = LayerWriter(
+            mock_disseminator, mock_path_to_points, mock_laser_control, MachineState(), override_move_speed=2.0, override_draw_speed=2.0)
+
+        self.writer.process_layer(test_layer)
+
+        self.assertEqual(1, mock_disseminator.flush.call_count)
+        self.assertEqual('flush', mock_disseminator.method_calls[-1][0])
+
+    def test_abort_current_command_should_flush_disseminator(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
+        mock_disseminator = mock_MicroDisseminator.return_value
+        self.writer = LayerWriter(
+            mock_disseminator, mock_PathToPoints.return_value, mock_LaserControl.return_value, MachineState())
+
+        self.writer.abort_current_command()
+
+        mock_disseminator.flush.assert_called_with()
+
     def test_process_layer_should_work_with_no_disseminator(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
         mock_laser_control = mock_LaserControl.return_value
         mock_path_to_points = mock_PathToPoints.return_value
@@ -240,6 +267,84 @@ class LayerWriterTests(unittest.TestCase):
         mock_path_to_points.process.assert_called_with(
             state.xyz, state.xyz, state.speed)
 
+    def test_repeated_sublayer_geometry_is_resampled_in_one_pass(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
+        mock_path_to_points = mock_PathToPoints.return_value
+        mock_path_to_points.process.return_value = [[0.0, 0.0]]
+        mock_path_to_points.process_many.return_value = ('points', 'powers')
+        mock_disseminator = mock_MicroDisseminator.return_value
+        state = MachineState()
+        geometry = Layer(0.0, commands=[
+            LateralDraw([0.0, 0.0], [1.0, 0.0], 100.0),
+            LateralDraw([1.0, 0.0], [2.0, 0.0], 100.0),
+            LateralDraw([2.0, 0.0], [3.0, 0.0], 50.0),
+            ])
+        self.writer = LayerWriter(mock_disseminator, mock_path_to_points, LaserControl(0.5), state)
+
+        self.writer.process_layer(SubLayer(geometry, 0.0, repeats=True))
+        bounds = self.writer.process_layer(SubLayer(geometry, 0.5))
+
+        self.assertEquals(5, mock_path_to_points.process.call_count)
+        self.assertEqual(([3.0, 0.0, 0.0], [0.0, 0.0, 0.5], 100.0), mock_path_to_points.process.call_args_list[3][0])
+        self.assertEqual(([0.0, 0.0, 0.5], [1.0, 0.0, 0.5], 100.0), mock_path_to_points.process.call_args_list[4][0])
+        self.assertEquals(1, mock_path_to_points.process_many.call_count)
+        starts, ends, speeds, draws, z, laser_power = mock_path_to_points.process_many.call_args[0]
+        self.assertEquals([[1.0, 0.0], [2.0, 0.0]], starts.tolist())
+        self.assertEquals([[2.0, 0.0], [3.0, 0.0]], ends.tolist())
+        self.assertEquals([100.0, 50.0], speeds.tolist())
+        self.assertEquals([True, True], draws.tolist())
+        self.assertEquals((0.5, 0.5), (z, laser_power))
+        mock_disseminator.process.assert_called_with('points', 'powers')
+        self.assertEquals([3.0, 0.0, 0.5], state.xyz)
+        self.assertEquals(50.0, state.speed)
+        self.assertEquals([[0.0, 3.0], [0.0, 0.0], 0.5], bounds)
+        self.assertEquals(1, self.writer.reused_sublayers)
+
+    def test_sublayers_are_drawn_from_their_offset_then_tail(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
+        mock_path_to_points = mock_PathToPoints.return_value
+        mock_path_to_points.process.return_value = [[0.0, 0.0]]
+        mock_disseminator = mock_MicroDisseminator.return_value
+        geometry = ArrayLayer.from_commands(0.0, [
+            LateralDraw([0.0, 0.0], [1.0, 0.0], 100.0),
+            LateralDraw([1.0, 0.0], [0.0, 0.0], 100.0),
+            ])
+        state = MachineState(xyz=[1.0, 0.0, 0.0])
+        self.writer = LayerWriter(mock_disseminator, mock_path_to_points, LaserControl(), state)
+
+        self.writer.process_layer(SubLayer(geometry, 0.0, offset=1, tail=[LateralDraw([1.0, 0.0], [0.5, 0.0], 100.0)]))
+
+        self.assertEqual([
+            call([1.0, 0.0, 0.0], [0.0, 0.0, 0.0], 100.0),
+            call([0.0, 0.0, 0.0], [1.0, 0.0, 0.0], 100.0),
+            call([1.0, 0.0, 0.0], [0.5, 0.0, 0.0], 100.0),
+            ], mock_path_to_points.process.call_args_list)
+
+    def test_sublayers_that_do_not_repeat_are_not_recorded(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
+        mock_path_to_points = mock_PathToPoints.return_value
+        mock_path_to_points.process.return_value = [[0.0, 0.0]]
+        geometry = Layer(0.0, commands=[LateralDraw([0.0, 0.0], [1.0, 0.0], 100.0), LateralDraw([1.0, 0.0], [2.0, 0.0], 100.0)])
+        self.writer = LayerWriter(mock_MicroDisseminator.return_value, mock_path_to_points, LaserControl(), MachineState())
+
+        self.writer.process_layer(SubLayer(geometry, 0.0))
+        self.writer.process_layer(SubLayer(geometry, 0.5))
+
+        self.assertEquals(None, self.writer._sublayer_plan)
+        self.assertEquals(0, mock_path_to_points.process_many.call_count)
+        self.assertEquals(0, self.writer.reused_sublayers)
+
+    def test_sublayers_with_new_geometry_are_written_normally(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
+        mock_path_to_points = mock_PathToPoints.return_value
+        mock_path_to_points.process.return_value = [[0.0, 0.0]]
+        mock_disseminator = mock_MicroDisseminator.return_value
+        commands = [LateralDraw([0.0, 0.0], [1.0, 0.0], 100.0), LateralDraw([1.0, 0.0], [2.0, 0.0], 100.0)]
+        self.writer = LayerWriter(mock_disseminator, mock_path_to_points, LaserControl(), MachineState())
+
+        self.writer.process_layer(SubLayer(Layer(0.0, commands=list(commands)), 0.0))
+        self.writer.process_layer(SubLayer(Layer(0.5, commands=list(commands)), 0.5))
+        self.writer.process_layer(Layer(1.0, commands=list(commands)))
+
+        self.assertEquals(0, mock_path_to_points.process_many.call_count)
+        self.assertEquals(0, self.writer.reused_sublayers)
+
     def test_post_fire_delay_will_wait_after_laser_on(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
         mock_path_to_points = mock_PathToPoints.return_value
         mock_disseminator = mock_MicroDisseminator.return_value
@@ -281,6 +386,180 @@ class LayerWriterTests(unittest.TestCase):
         self.assertEqual(mock_path_to_points.process.call_args_list[2][0], ([1.0, 1.0, 0.0], [1.5, 1.5, 0.0], 40.0))
         self.assertEquals(2, mock_laser_control.set_laser_on.call_count)
 
+    def test_compiled_layers_are_replayed_when_repeated(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
+        mock_path_to_points = mock_PathToPoints.return_value
+        mock_path_to_points.process.return_value = [[0.0, 0.0]]
+        mock_disseminator = mock_MicroDisseminator.return_value
+        mock_disseminator.stop_recording.return_value = 'compiled'
+        laser_control = LaserControl()
+        state = MachineState(speed=100.0)
+        layer = Layer(0.0, commands=[LateralDraw([0.0, 0.0], [1.0, 1.0], 100.0), LateralDraw([1.0, 1.0], [0.0, 0.0], 100.0)], repeats=True)
+        self.writer = LayerWriter(mock_disseminator, mock_path_to_points, laser_control, state, compile_repeated_layers=True)
+
+        self.writer.process_layer(layer)
+        compiled = self.writer.process_layer(layer)
+        replayed = self.writer.process_layer(layer)
+        self.writer.process_layer(layer)
+
+        self.assertEquals(4, mock_path_to_points.process.call_count)
+        self.assertEquals(2, mock_disseminator.start_recording.call_count)
+        self.assertEquals([call('compiled'), call('compiled')], mock_disseminator.replay.call_args_list)
+        self.assertEquals(2, self.writer.replayed_layers)
+        self.assertEquals(compiled, replayed)
+        self.assertEquals([0.0, 0.0, 0.0], state.xyz)
+        self.assertTrue(laser_control.laser_is_on())
+        self.assertEquals(4, mock_disseminator.flush.call_count)
+
+    def test_layers_that_do_not_repeat_are_not_recorded(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
+        mock_path_to_points = mock_PathToPoints.return_value
+        mock_path_to_points.process.return_value = [[0.0, 0.0]]
+        mock_disseminator = mock_MicroDisseminator.return_value
+        layer = Layer(0.0, commands=[LateralDraw([0.0, 0.0], [1.0, 1.0], 100.0), LateralDraw([1.0, 1.0], [0.0, 0.0], 100.0)])
+        self.writer = LayerWriter(mock_disseminator, mock_path_to_points, LaserControl(), MachineState(), compile_repeated_layers=True)
+
+        self.writer.process_layer(layer)
+        self.writer.process_layer(layer)
+
+        self.assertEquals(4, mock_path_to_points.process.call_count)
+        self.assertEquals(0, mock_disseminator.start_recording.call_count)
+        self.assertEquals(0, mock_disseminator.replay.call_count)
+
+    def test_compiled_layers_are_rebuilt_when_transformer_or_layer_changes(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
+        mock_path_to_points = mock_PathToPoints.return_value
+        mock_path_to_points.process.return_value = [[0.0, 0.0]]
+        mock_disseminator = mock_MicroDisseminator.return_value
+        mock_disseminator.stop_recording.return_value = 'compiled'
+        state = MachineState(speed=100.0)
+        layer = Layer(0.0, commands=[LateralDraw([0.0, 0.0], [1.0, 1.0], 100.0), LateralDraw([1.0, 1.0], [0.0, 0.0], 100.0)], repeats=True)
+        self.writer = LayerWriter(mock_disseminator, mock_path_to_points, LaserControl(), state, compile_repeated_layers=True)
+
+        self.writer.process_layer(layer)
+        mock_path_to_points.transformer = Mock()
+        self.writer.process_layer(layer)
+        self.writer.process_layer(Layer(0.0, commands=list(layer.commands), repeats=True))
+
+        self.assertEquals(6, mock_path_to_points.process.call_count)
+        self.assertEquals(0, mock_disseminator.replay.call_count)
+
+    def test_compiled_layers_are_rebuilt_when_laser_power_changes(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
+        mock_path_to_points = mock_PathToPoints.return_value
+        mock_path_to_points.process.return_value = [[0.0, 0.0]]
+        mock_disseminator = mock_MicroDisseminator.return_value
+        mock_disseminator.stop_recording.return_value = 'compiled'
+        state = MachineState(speed=100.0)
+        layer = Layer(0.0, commands=[LateralDraw([0.0, 0.0], [1.0, 1.0], 100.0), LateralDraw([1.0, 1.0], [0.0, 0.0], 100.0)], repeats=True)
+        self.writer = LayerWriter(mock_disseminator, mock_path_to_points, LaserControl(0.5), state, compile_repeated_layers=True)
+        self.writer.process_layer(layer)
+
+        self.writer._laser_control = LaserControl(0.8)
+        self.writer._laser_control.set_laser_on()
+        self.writer.process_layer(layer)
+
+        self.assertEquals(4, mock_path_to_points.process.call_count)
+        self.assertEquals(0, mock_disseminator.replay.call_count)
+
+    def test_aborted_layers_are_not_compiled(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
+        mock_path_to_points = mock_PathToPoints.return_value
+        mock_path_to_points.process.return_value = [[0.0, 0.0]]
+        mock_disseminator = mock_MicroDisseminator.return_value
+        mock_disseminator.stop_recording.return_value = 'compiled'
+        state = MachineState(speed=100.0)
+        layer = Layer(0.0, commands=[LateralDraw([0.0, 0.0], [1.0, 1.0], 100.0), LateralDraw([1.0, 1.0], [0.0, 0.0], 100.0)], repeats=True)
+        self.writer = LayerWriter(mock_disseminator, mock_path_to_points, LaserControl(), state, compile_repeated_layers=True)
+
+        self.writer.abort_current_command()
+        self.writer.process_layer(layer)
+        self.writer.process_layer(layer)
+
+        self.assertEquals(2, mock_path_to_points.process.call_count)
+        self.assertEquals(0, mock_disseminator.replay.call_count)
+
+    def test_wait_till_time_holds_position_once_when_holding_while_waiting(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
+        mock_path_to_points = mock_PathToPoints.return_value
+        mock_path_to_points.hold.return_value = ([0.5, 0.5], 800)
+        mock_disseminator = mock_MicroDisseminator.return_value
+        mock_laser_control = mock_LaserControl.return_value
+        state = MachineState()
+        self.writer = LayerWriter(
+            mock_disseminator, mock_path_to_points, mock_laser_control, state, hold_while_waiting=True)
+
+        before = time.time()
+        self.writer.wait_till_time(before + 0.1)
+        after = time.time()
+
+        self.assertTrue(before + 0.1 <= after)
+        self.assertEquals(state.xyz, mock_path_to_points.hold.call_args[0][0])
+        self.assertTrue(mock_path_to_points.hold.call_args[0][1] <= 0.1)
+        mock_disseminator.hold.assert_called_once_with([0.5, 0.5], 800)
+        mock_laser_control.set_laser_off.assert_called_with()
+        self.assertEquals(0, mock_path_to_points.process.call_count)
+        self.assertEquals(0, mock_disseminator.process.call_count)
+
+    def test_wait_till_time_wakes_once_when_holding_while_waiting(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
+        mock_path_to_points = mock_PathToPoints.return_value
+        mock_path_to_points.hold.return_value = ([0.5, 0.5], 800)
+        self.writer = LayerWriter(
+            mock_MicroDisseminator.return_value, mock_path_to_points, mock_LaserControl.return_value, MachineState(), hold_while_waiting=True)
+
+        with patch.object(self.writer._stopped, 'wait') as mock_wait:
+            self.writer.wait_till_time(time.time() + 100)
+
+        self.assertEquals(1, mock_wait.call_count)
+        self.assertTrue(mock_wait.call_args[0][0] <= 100)
+
+    def test_wait_until_blocks_once_for_the_whole_wait(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
+        mock_path_to_points = mock_PathToPoints.return_value
+        mock_disseminator = mock_MicroDisseminator.return_value
+        mock_laser_control = mock_LaserControl.return_value
+        self.writer = LayerWriter(mock_disseminator, mock_path_to_points, mock_laser_control, MachineState())
+        until = Mock(return_value=True)
+
+        self.writer.wait_until(until, lambda: False)
+
+        until.assert_called_once_with(None)
+        mock_laser_control.set_laser_off.assert_called_with()
+        self.assertEquals(0, mock_path_to_points.process.call_count)
+        self.assertEquals(0, mock_disseminator.hold.call_count)
+
+    def test_wait_until_blocks_once_per_hold_when_holding_while_waiting(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
+        mock_path_to_points = mock_PathToPoints.return_value
+        mock_path_to_points.hold.return_value = ([0.5, 0.5], 800)
+        mock_disseminator = mock_MicroDisseminator.return_value
+        self.writer = LayerWriter(
+            mock_disseminator, mock_path_to_points, mock_LaserControl.return_value, MachineState(), hold_while_waiting=True)
+        until = Mock(side_effect=[False, False, True])
+
+        self.writer.wait_until(until, lambda: False)
+
+        self.assertEquals([call(LayerWriter.HOLD_SECONDS)] * 3, until.call_args_list)
+        self.assertEquals(3, mock_disseminator.hold.call_count)
+        mock_path_to_points.hold.assert_called_with(self.writer._state.xyz, LayerWriter.HOLD_SECONDS)
+
+    def test_wait_until_stops_holding_when_cancelled(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
+        mock_path_to_points = mock_PathToPoints.return_value
+        mock_path_to_points.hold.return_value = ([0.5, 0.5], 800)
+        self.writer = LayerWriter(
+            mock_MicroDisseminator.return_value, mock_path_to_points, mock_LaserControl.return_value, MachineState(), hold_while_waiting=True)
+        cancelled = Mock(side_effect=[False, True])
+        until = Mock(return_value=False)
+
+        self.writer.wait_until(until, cancelled)
+
+        self.assertEquals(1, until.call_count)
+
+    def test_wait_till_time_does_not_hold_when_shutting_down(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
+        mock_path_to_points = mock_PathToPoints.return_value
+        mock_disseminator = mock_MicroDisseminator.return_value
+        self.writer = LayerWriter(
+            mock_disseminator, mock_path_to_points, mock_LaserControl.return_value, MachineState(), hold_while_waiting=True)
+
+        before = time.time()
+        self.writer.terminate()
+        self.writer.wait_till_time(before + 100)
+
+        self.assertTrue(before + 10 > time.time())
+        self.assertEquals(0, mock_disseminator.hold.call_count)
+
     def test_wait_till_time_returns_instantly_if_shutting_down(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
         mock_path_to_points = mock_PathToPoints.return_value
         mock_disseminator = mock_MicroDisseminator.return_value
@@ -351,6 +630,26 @@ class LayerWriterTests(unittest.TestCase):
 
         self.assertEqual(expected, result)
 
+    def test_process_layer_should_process_array_layers_like_layers(self, mock_MicroDisseminator, mock_PathToPoints, mock_LaserControl):
+        mock_laser_control = mock_LaserControl.return_value
+        mock_path_to_points = mock_PathToPoints.return_value
+        mock_disseminator = mock_MicroDisseminator.return_value
+        commands = [
+            LateralMove([0.0, 0.0], [-2.0, 0.0], 100.0),
+            LateralDraw([-2.0, 0.0], [-1.0, 2.0], 2.0),
+            LateralDraw([3.0, 3.0], [4.0, 4.0], 2.0),
+        ]
+        self.writer = LayerWriter(mock_disseminator, mock_path_to_points, mock_laser_control, MachineState())
+        expected = self.writer.process_layer(Layer(2.0, commands))
+        expected_calls = mock_path_to_points.process.call_args_list
+        mock_path_to_points.reset_mock()
+        self.writer = LayerWriter(mock_disseminator, mock_path_to_points, mock_laser_control, MachineState())
+
+        result = self.writer.process_layer(ArrayLayer.from_commands(2.0, commands))
+
+        self.assertEqual(expected, result)
+        self.assertEqual(expected_calls, mock_path_to_points.process.call_args_list)
+
 
 @patch('peachyprinter.infrastructure.layer_control.LayerWriter')
 @patch('peachyprinter.domain.zaxis.ZAxis')
@@ -376,6 +675,7 @@ class LayerProcessingTest(unittest.TestCase):
         self.assertEquals(0, mock_writer.process_layer.call_count)
 
     def test_process_should_print_while_dripping_until_half_max_lead(self, mock_ZAxis, mock_Writer):
+        mock_Writer.return_value.process_layer.return_value = [[0.0, 2.0], [0.0, 2.0], 1.0]
         max_lead_distance = 1.0
         mock_writer = mock_Writer.return_value
         mock_zaxis = mock_ZAxis.return_value
@@ -395,6 +695,7 @@ class LayerProcessingTest(unittest.TestCase):
         mock_zaxis.move_to.assert_has_calls([call(1.5)])
 
     def test_process_should_ignore_z_in_layer_if_z_axis_none(self, mock_ZAxis, mock_Writer):
+        mock_Writer.return_value.process_layer.return_value = [[0.0, 2.0], [0.0, 2.0], 1.0]
         mock_writer = mock_Writer.return_value
         state = MachineState()
         status = MachineStatus()
@@ -408,6 +709,7 @@ class LayerProcessingTest(unittest.TestCase):
         mock_writer.process_layer.assert_called_with(test_layer)
 
     def test_process_should_wait_for_zaxis(self, mock_ZAxis, mock_Writer):
+        mock_Writer.return_value.process_layer.return_value = [[0.0, 2.0], [0.0, 2.0], 1.0]
         mock_writer = mock_Writer.return_value
         mock_zaxis = mock_ZAxis.return_value
         state = MachineState()
@@ -424,7 +726,7 @@ class LayerProcessingTest(unittest.TestCase):
         layer_processing.process(test_layer)
 
         self.assertEqual(1, mock_writer.process_layer.call_count)
-        self.assertEqual(2, mock_writer.wait_till_time.call_count)
+        self.assertEqual(2, mock_writer.wait_until.call_count)
 
     @patch('peachyprinter.infrastructure.machine.MachineStatus')
     def test_process_should_set_waiting_while_wating_for_z(self, mock_MachineStatus, mock_ZAxis, mock_Writer):
@@ -449,14 +751,63 @@ class LayerProcessingTest(unittest.TestCase):
         layer_processing.process(test_layer)
 
         self.assertEqual(1, mock_writer.process_layer.call_count)
-        self.assertEqual(1, mock_writer.wait_till_time.call_count)
+        self.assertEqual(1, mock_writer.wait_until.call_count)
         self.assertEqual(1, mock_machinestatus.set_waiting_for_drips.call_count)
         self.assertEqual(1, mock_machinestatus.set_not_waiting_for_drips.call_count)
         print commander.send_command.call_args_list
         self.assertEqual('o', commander.send_command.call_args_list[0][0][0])
 
+    def test_process_should_wake_writer_when_zaxis_reaches_height(self, mock_ZAxis, mock_Writer):
+        mock_Writer.return_value.process_layer.return_value = [[0.0, 2.0], [0.0, 2.0], 1.0]
+        mock_writer = mock_Writer.return_value
+        mock_zaxis = mock_ZAxis.return_value
+        zaxis_return_values = [0.0, 1.0, 1.0]
+        mock_zaxis.current_z_location_mm = lambda: zaxis_return_values.pop(0)
+        test_layer = Layer(1.0, [LateralDraw([0.0, 0.0], [2.0, 2.0], 2.0)])
+        layer_processing = LayerProcessing(
+            mock_writer, MachineState(), MachineStatus(), mock_zaxis, 0.0, NullCommander(), 0, 'a', 'b', 'z')
+
+        layer_processing.process(test_layer)
+        until, cancelled = mock_writer.wait_until.call_args[0]
+        until(None)
+
+        mock_zaxis.wait_for_height.assert_called_once_with(1.0, None, cancelled=cancelled)
+        self.assertFalse(cancelled())
+
+    def test_process_waits_for_drips_with_one_blocking_wait(self, mock_ZAxis, mock_Writer):
+        mock_Writer.return_value.process_layer.return_value = [[0.0, 2.0], [0.0, 2.0], 1.0]
+        zaxis = SerialDripZAxis(MagicMock(), 1.0, 0.0)
+        wait = zaxis._height_changed.wait
+        wakeups = []
+
+        def counting_wait(timeout=None):
+            wakeups.append(timeout)
+            wait(timeout)
+        zaxis._height_changed.wait = counting_wait
+        writer = LayerWriter(None, MagicMock(), MagicMock(), MachineState())
+        layer_processing = LayerProcessing(writer, MachineState(), MachineStatus(), zaxis, 0.0, NullCommander(), 0, 'a', 'b', 'z')
+        timer = threading.Timer(0.3, zaxis.drip_reported_handler, [DripRecordedMessage(1)])
+        timer.start()
+
+        layer_processing.process(Layer(1.0, [LateralDraw([0.0, 0.0], [0.0, 0.0], 2.0)]))
+
+        self.assertEqual([None], wakeups)
+
+    def test_abort_wakes_a_drip_wait(self, mock_ZAxis, mock_Writer):
+        zaxis = SerialDripZAxis(MagicMock(), 1.0, 0.0)
+        writer = LayerWriter(None, MagicMock(), MagicMock(), MachineState())
+        layer_processing = LayerProcessing(writer, MachineState(), MachineStatus(), zaxis, 0.0, NullCommander(), 0, 'a', 'b', 'z')
+        timer = threading.Timer(0.05, layer_processing.terminate)
+        start = time.time()
+        timer.start()
+
+        layer_processing.process(Layer(1.0, [LateralDraw([0.0, 0.0], [0.0, 0.0], 2.0)]))
+
+        self.assertTrue(time.time() - start < 1.0)
+
     @patch('peachyprinter.infrastructure.commander.Commander')
     def test_process_should_write_layer_start_and_end_commands(self, mock_Commander, mock_ZAxis, mock_Writer):
+        mock_Writer.return_value.process_layer.return_value = [[0.0, 2.0], [0.0, 2.0], 1.0]
         mock_commander = mock_Commander.return_value
         mock_zaxis = mock_ZAxis.return_value
         mock_writer = mock_Writer.return_value
@@ -571,6 +922,7 @@ class LayerProcessingTest(unittest.TestCase):
         self.assertEquals([expected_axis], actual)
 
     def test_process_should_update_layer_height(self, mock_ZAxis, mock_Writer):
+        mock_Writer.return_value.process_layer.return_value = [[0.0, 2.0], [0.0, 2.0], 1.0]
         mock_zaxis = mock_ZAxis.return_value
         status = MachineStatus()
         layer_processing = LayerProcessing(
@@ -590,6 +942,7 @@ class LayerProcessingTest(unittest.TestCase):
         self.assertEquals(expected_model_height, actual)
 
     def test_process_should_set_waiting_for_drips(self, mock_ZAxis, mock_Writer):
+        mock_Writer.return_value.process_layer.return_value = [[0.0, 2.0], [0.0, 2.0], 1.0]
         mock_zaxis = mock_ZAxis.return_value
         status = MachineStatus()
         layer_processing = LayerProcessing(
@@ -617,6 +970,7 @@ class LayerProcessingTest(unittest.TestCase):
         self.assertFalse(actual[2])
 
     def test_process_should_tell_writer_to_wait_when_prelayer_delay(self, mock_ZAxis, mock_Writer):
+        mock_Writer.return_value.process_layer.return_value = [[0.0, 2.0], [0.0, 2.0], 1.0]
         mock_zaxis = mock_ZAxis.return_value
         mock_writer = mock_Writer.return_value
         pre_layer_delay = 0.1
@@ -2,6 +2,8 @@ import unittest
 import os
 import sys
 import logging
+import math
+import numpy as np
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', 'src'))
@@ -156,6 +158,50 @@ class MemoryHourglassTests(unittest.TestCase, test_helpers.TestHelpers):
         actual = layer_generator.next()
         self.assertLayerEquals(expected, actual)
 
+
+class LoopingPatternGeneratorTests(unittest.TestCase, test_helpers.TestHelpers):
+    def test_first_layer_comes_from_the_pattern(self):
+        pattern = CircleGenerator(speed=100.0, radius=10.0)
+        expected = CircleGenerator(speed=100.0, radius=10.0).next()
+
+        first = LoopingPatternGenerator(pattern).next()
+
+        self.assertLayerEquals(expected, first)
+        self.assertFalse(first.repeats)
+
+    def test_repeats_the_steady_layer_without_asking_the_pattern(self):
+        pattern = HilbertGenerator(order=2)
+        generator = LoopingPatternGenerator(pattern)
+        generator.next()
+        steady = generator.next()
+
+        pattern.next = lambda: self.fail("Pattern should not be regenerated")
+        self.assertTrue(steady.repeats)
+        self.assertTrue(steady is generator.next())
+        self.assertTrue(steady is generator.next())
+
+    def test_repeated_layers_match_the_pattern(self):
+        generator = LoopingPatternGenerator(CircleGenerator(speed=100.0, radius=10.0))
+        pattern = CircleGenerator(speed=100.0, radius=10.0)
+
+        for i in range(4):
+            self.assertLayerEquals(pattern.next(), generator.next())
+
+    def test_changing_pattern_settings_builds_a_new_layer(self):
+        pattern = SquareGenerator(speed=100.0, radius=10.0)
+        generator = LoopingPatternGenerator(pattern)
+        generator.next()
+        steady = generator.next()
+
+        pattern.set_radius(5.0)
+        changed = generator.next()
+
+        self.assertFalse(steady is changed)
+        self.assertLayerEquals(SquareGenerator(speed=100.0, radius=5.0).next(), changed)
+
+        pattern.set_current_height(2.0)
+        self.assertEquals(2.0, generator.next().z)
+
 #---------------- Augmented Generators  -------------------------------------
 
 
@@ -223,6 +269,27 @@ class SublayerGeneratorTests(unittest.TestCase, test_helpers.TestHelpers):
         with self.assertRaises(StopIteration):
             sublayer_generator.next()
 
+    def test_sublayers_share_the_source_layer_without_changing_it(self):
+        layer1 = Layer(0.0, [LateralDraw([0.0, 0.0], [0.0, 0.0], 100.0)])
+        layer2 = Layer(1.0, [LateralDraw([0.0, 0.0], [0.0, 0.0], 100.0)])
+        sublayer_generator = SubLayerGenerator(StubLayerGenerator([layer1, layer2]), 0.25)
+
+        sublayers = [sublayer_generator.next() for i in range(4)]
+
+        self.assertEquals([0.0, 0.25, 0.5, 0.75], [sublayer.z for sublayer in sublayers])
+        self.assertTrue(all(sublayer.geometry is layer1 for sublayer in sublayers))
+        self.assertEquals(0.0, layer1.z)
+
+    def test_sublayers_are_marked_when_the_next_shares_geometry(self):
+        layer1 = Layer(0.0, [LateralDraw([0.0, 0.0], [0.0, 0.0], 100.0)])
+        layer2 = Layer(1.0, [LateralDraw([0.0, 0.0], [0.0, 0.0], 100.0)])
+        sublayer_generator = SubLayerGenerator(StubLayerGenerator([layer1, layer2]), 0.5)
+
+        sublayers = [sublayer_generator.next() for i in range(3)]
+
+        self.assertEquals([0.0, 0.5, 1.0], [sublayer.z for sublayer in sublayers])
+        self.assertEquals([True, False, False], [sublayer.repeats for sublayer in sublayers])
+
 
 class ShuffleGeneratorTests(unittest.TestCase, test_helpers.TestHelpers):
 
@@ -319,6 +386,38 @@ class ShuffleGeneratorTests(unittest.TestCase, test_helpers.TestHelpers):
         with self.assertRaises(StopIteration):
             shuffle_generator.next()
 
+    def test_shuffle_generator_should_offset_layers_without_changing_them(self):
+        commands = [LateralDraw([0.0, 0.0], [float(i), float(i)], 100.0) for i in range(4)]
+        layer = Layer(0.0, list(commands))
+        shuffle_generator = ShuffleGenerator(StubLayerGenerator([Layer(0.0, commands), layer]), 3)
+        shuffle_generator.next()
+
+        shuffled = shuffle_generator.next()
+
+        self.assertTrue(shuffled.geometry is layer)
+        self.assertEquals(3, shuffled.offset)
+        self.assertCommandsEqual(commands[3:] + commands[:3], list(shuffled.commands))
+        self.assertCommandsEqual(commands, layer.commands)
+
+    def test_shuffle_generator_should_add_to_sublayer_offsets(self):
+        commands = [LateralDraw([0.0, 0.0], [float(i), float(i)], 100.0) for i in range(4)]
+        geometry = ArrayLayer.from_commands(0.0, commands)
+        shuffle_generator = ShuffleGenerator(StubLayerGenerator([SubLayer(geometry, 0.0, 3), SubLayer(geometry, 0.5, 3)]), 2)
+        shuffle_generator.next()
+
+        shuffled = shuffle_generator.next()
+
+        self.assertTrue(shuffled.geometry is geometry)
+        self.assertEquals(0.5, shuffled.z)
+        self.assertCommandsEqual(commands[1:] + commands[:1], list(shuffled.commands))
+
+    def test_shuffle_generator_keeps_repeats_only_when_offset_is_unchanged(self):
+        geometry = ArrayLayer.from_commands(0.0, [LateralDraw([0.0, 0.0], [float(i), float(i)], 100.0) for i in range(4)])
+        layers = [SubLayer(geometry, 0.0, repeats=True), SubLayer(geometry, 0.5)]
+
+        self.assertFalse(ShuffleGenerator(StubLayerGenerator(list(layers)), 1).next().repeats)
+        self.assertTrue(ShuffleGenerator(StubLayerGenerator(list(layers)), 4).next().repeats)
+
 
 class OverLapGeneratorTests(unittest.TestCase, test_helpers.TestHelpers):
     def test_next_should_return_input_when_single_command(self):
@@ -373,6 +472,34 @@ class OverLapGeneratorTests(unittest.TestCase, test_helpers.TestHelpers):
 
         self.assertLayerEquals(expected_layer, actual_layer)
 
+    def test_next_should_overlap_with_a_tail_over_the_shared_layer(self):
+        source_layer = Layer(0.0, commands=[
+            LateralDraw([0.0, 0.0], [10.0, 0.0], 100.0),
+            LateralDraw([10.0, 0.0], [0.0, 0.0], 100.0),
+           ])
+        overlap_generator = OverLapGenerator(StubLayerGenerator([source_layer]), 2.0)
+
+        actual_layer = overlap_generator.next()
+
+        self.assertTrue(actual_layer.geometry is source_layer)
+        self.assertFalse(actual_layer.repeats)
+        self.assertEquals(2, len(source_layer.commands))
+        self.assertCommandsEqual([LateralDraw([0.0, 0.0], [2.0, 0.0], 100.0)], actual_layer.tail)
+
+    def test_next_should_overlap_across_many_short_commands(self):
+        steps = 100
+        points = [[math.cos(2 * math.pi * i / steps), math.sin(2 * math.pi * i / steps)] for i in range(steps + 1)]
+        commands = [LateralDraw(start, end, 100.0) for (start, end) in zip(points, points[1:])]
+        commands.insert(50, LateralDraw(points[50], points[50], 100.0))
+        step = math.hypot(points[1][0] - points[0][0], points[1][1] - points[0][1])
+        overlap_generator = OverLapGenerator(StubLayerGenerator([Layer(0.0, commands=commands)]), step * 60.5)
+
+        tail = list(overlap_generator.next().commands)[len(commands):]
+
+        self.assertEquals(61, len(tail))
+        self.assertCommandsEqual(commands[:50] + commands[51:61], tail[:60])
+        self.assertAlmostEquals(step / 2.0, math.hypot(tail[60].end[0] - tail[60].start[0], tail[60].end[1] - tail[60].start[1]))
+
     def test_next_should_overlap_when_commands_congruent_and_overlap_amount_specified(self):
         amount = 2
         source_layer = Layer(0.0, commands=[
@@ -462,6 +589,195 @@ class OverLapGeneratorTests(unittest.TestCase, test_helpers.TestHelpers):
 #---------------- Cure Test Generators  -------------------------------------
 
 
+class TravelOptimizerGeneratorTests(unittest.TestCase, test_helpers.TestHelpers):
+    def test_next_should_order_polylines_by_nearest_start(self):
+        source = StubLayerGenerator([Layer(0.0, commands=[
+            LateralMove([0.0, 0.0], [10.0, 0.0], 200.0),
+            LateralDraw([10.0, 0.0], [11.0, 0.0], 100.0),
+            LateralMove([11.0, 0.0], [1.0, 0.0], 200.0),
+            LateralDraw([1.0, 0.0], [2.0, 0.0], 100.0),
+            LateralMove([2.0, 0.0], [5.0, 0.0], 200.0),
+            LateralDraw([5.0, 0.0], [6.0, 0.0], 100.0),
+            ])])
+        expected = Layer(0.0, commands=[
+            LateralMove([0.0, 0.0], [1.0, 0.0], 200.0),
+            LateralDraw([1.0, 0.0], [2.0, 0.0], 100.0),
+            LateralMove([2.0, 0.0], [5.0, 0.0], 200.0),
+            LateralDraw([5.0, 0.0], [6.0, 0.0], 100.0),
+            LateralMove([6.0, 0.0], [10.0, 0.0], 200.0),
+            LateralDraw([10.0, 0.0], [11.0, 0.0], 100.0),
+            ])
+        generator = TravelOptimizerGenerator(source)
+
+        self.assertLayerEquals(expected, generator.next())
+        self.assertEquals((23.0, 8.0), generator.last_travel)
+
+    def test_next_should_reverse_polylines_when_their_end_is_closer(self):
+        source = StubLayerGenerator([Layer(0.0, commands=[
+            LateralDraw([3.0, 0.0], [2.0, 0.0], 100.0),
+            LateralDraw([2.0, 0.0], [1.0, 0.0], 50.0),
+            ])])
+        expected = Layer(0.0, commands=[
+            LateralMove([0.0, 0.0], [1.0, 0.0], 50.0),
+            LateralDraw([1.0, 0.0], [2.0, 0.0], 50.0),
+            LateralDraw([2.0, 0.0], [3.0, 0.0], 100.0),
+            ])
+
+        self.assertLayerEquals(expected, TravelOptimizerGenerator(source).next())
+
+    def test_next_should_split_polylines_at_position_jumps(self):
+        source = StubLayerGenerator([Layer(0.0, commands=[
+            LateralDraw([5.0, 0.0], [6.0, 0.0], 100.0),
+            LateralDraw([1.0, 0.0], [2.0, 0.0], 100.0),
+            ])])
+        expected = Layer(0.0, commands=[
+            LateralMove([0.0, 0.0], [1.0, 0.0], 100.0),
+            LateralDraw([1.0, 0.0], [2.0, 0.0], 100.0),
+            LateralMove([2.0, 0.0], [5.0, 0.0], 100.0),
+            LateralDraw([5.0, 0.0], [6.0, 0.0], 100.0),
+            ])
+
+        self.assertLayerEquals(expected, TravelOptimizerGenerator(source).next())
+
+    def test_next_should_start_from_where_the_last_layer_ended(self):
+        source = StubLayerGenerator([
+            Layer(0.0, commands=[LateralDraw([9.0, 0.0], [10.0, 0.0], 100.0)]),
+            Layer(1.0, commands=[LateralDraw([1.0, 0.0], [2.0, 0.0], 100.0), LateralDraw([8.0, 0.0], [9.0, 0.0], 100.0)]),
+            ])
+        generator = TravelOptimizerGenerator(source)
+        generator.next()
+        layer = generator.next()
+
+        self.assertEquals([9.0, 0.0], layer.commands[1].start)
+        self.assertEquals([8.0, 0.0], layer.commands[1].end)
+        self.assertEquals([1.0, 0.0], layer.commands[-1].end)
+
+    def test_next_should_keep_array_layers_and_every_draw(self):
+        random = np.random.RandomState(1)
+        starts = random.uniform(-50.0, 50.0, (300, 2))
+        ends = starts + random.uniform(-1.0, 1.0, (300, 2))
+        kinds = [ArrayLayer.DRAW] * 300
+        source = StubLayerGenerator([ArrayLayer(0.0, starts, ends, [100.0] * 300, kinds)])
+        generator = TravelOptimizerGenerator(source)
+
+        layer = generator.next()
+
+        self.assertTrue(isinstance(layer, ArrayLayer))
+        expected_draws = sorted(sorted([tuple(start), tuple(end)]) for (start, end) in zip(starts.tolist(), ends.tolist()))
+        actual_draws = sorted(sorted([tuple(start), tuple(end)]) for (start, end) in zip(layer.starts[layer.draws].tolist(), layer.ends[layer.draws].tolist()))
+        self.assertEquals(expected_draws, actual_draws)
+        before, after = generator.last_travel
+        self.assertTrue(after < before / 4.0)
+        self.assertEquals(before, generator.travel_before)
+
+    def test_next_should_not_move_to_where_the_layer_starts_drawing(self):
+        square = [
+            LateralDraw([1.0, 1.0], [2.0, 1.0], 100.0),
+            LateralDraw([2.0, 1.0], [2.0, 2.0], 100.0),
+            LateralDraw([2.0, 2.0], [1.0, 2.0], 100.0),
+            LateralDraw([1.0, 2.0], [1.0, 1.0], 100.0),
+            ]
+        source = StubLayerGenerator([Layer(0.0, commands=square), Layer(1.0, commands=square)])
+        generator = TravelOptimizerGenerator(source)
+
+        self.assertLayerEquals(Layer(0.0, commands=square), generator.next())
+        self.assertLayerEquals(Layer(1.0, commands=square), generator.next())
+
+    def test_overlap_still_applies_after_travel_optimizing_closed_loops(self):
+        square = [
+            LateralDraw([1.0, 1.0], [2.0, 1.0], 100.0),
+            LateralDraw([2.0, 1.0], [2.0, 2.0], 100.0),
+            LateralDraw([2.0, 2.0], [1.0, 2.0], 100.0),
+            LateralDraw([1.0, 2.0], [1.0, 1.0], 100.0),
+            ]
+        expected = OverLapGenerator(StubLayerGenerator([Layer(0.0, commands=square)]), 0.5).next()
+
+        actual = OverLapGenerator(TravelOptimizerGenerator(StubLayerGenerator([Layer(0.0, commands=square)])), 0.5).next()
+
+        self.assertEquals(5, len(list(actual.commands)))
+        self.assertCommandsEqual(list(expected.commands), list(actual.commands))
+
+    def test_nearest_neighbour_finds_the_nearest_end_across_grid_cells(self):
+        heads = [(3.9, 2.0), (3.3, 0.3), (1.9, 0.2), (3.5, 1.8), (0.3, 0.3)]
+        generator = TravelOptimizerGenerator(StubLayerGenerator([]))
+        generator._position = (2.2, 0.3)
+
+        order = generator._nearest_neighbour(heads, heads)
+
+        self.assertEquals(2, order[0][0])
+
+    def test_next_should_leave_layers_without_draws(self):
+        expected = Layer(0.0, commands=[LateralMove([0.0, 0.0], [1.0, 1.0], 100.0)])
+        self.assertLayerEquals(expected, TravelOptimizerGenerator(StubLayerGenerator([expected])).next())
+
+    def test_two_opt_should_uncross_the_order(self):
+        heads = [(1.0, 0.0), (2.0, 0.0), (3.0, 0.0)]
+        tails = [(1.0, 0.0), (2.0, 0.0), (3.0, 0.0)]
+        generator = TravelOptimizerGenerator(StubLayerGenerator([]))
+
+        order = generator._two_opt([(0, False), (2, False), (1, False)], heads, tails)
+
+        self.assertEquals([0, 1, 2], [polyline for (polyline, reverse) in order])
+
+
+class SimplifyGeneratorTests(unittest.TestCase, test_helpers.TestHelpers):
+    def test_next_should_merge_collinear_draws(self):
+        source = StubLayerGenerator([Layer(0.0, commands=[
+            LateralDraw([0.0, 0.0], [1.0, 0.0], 100.0),
+            LateralDraw([1.0, 0.0], [2.0, 0.01], 100.0),
+            LateralDraw([2.0, 0.01], [3.0, 0.0], 100.0),
+            LateralDraw([3.0, 0.0], [3.0, 3.0], 100.0),
+            ])])
+        expected = Layer(0.0, commands=[
+            LateralDraw([0.0, 0.0], [3.0, 0.0], 100.0),
+            LateralDraw([3.0, 0.0], [3.0, 3.0], 100.0),
+            ])
+        generator = SimplifyGenerator(source, 0.05)
+
+        self.assertLayerEquals(expected, generator.next())
+        self.assertEquals((4, 2), generator.last_reduction)
+
+    def test_next_should_keep_vertices_outside_tolerance(self):
+        expected = Layer(0.0, commands=[
+            LateralDraw([0.0, 0.0], [1.0, 0.0], 100.0),
+            LateralDraw([1.0, 0.0], [2.0, 0.3], 100.0),
+            LateralDraw([2.0, 0.3], [3.0, 0.0], 100.0),
+            ])
+
+        self.assertLayerEquals(expected, SimplifyGenerator(StubLayerGenerator([expected]), 0.05).next())
+
+    def test_next_should_not_merge_across_moves_jumps_or_speed_changes(self):
+        expected = Layer(0.0, commands=[
+            LateralDraw([0.0, 0.0], [1.0, 0.0], 100.0),
+            LateralDraw([1.0, 0.0], [2.0, 0.0], 50.0),
+            LateralMove([2.0, 0.0], [3.0, 0.0], 100.0),
+            LateralDraw([3.0, 0.0], [4.0, 0.0], 50.0),
+            LateralDraw([5.0, 0.0], [6.0, 0.0], 50.0),
+            ])
+
+        self.assertLayerEquals(expected, SimplifyGenerator(StubLayerGenerator([expected]), 0.05).next())
+
+    def test_next_should_collapse_micro_segments_of_closed_loops(self):
+        steps = 1000
+        points = [[10.0 * math.cos(2 * math.pi * i / steps), 10.0 * math.sin(2 * math.pi * i / steps)] for i in range(steps + 1)]
+        source = StubLayerGenerator([ArrayLayer(0.0, points[:-1], points[1:], [100.0] * steps, [ArrayLayer.DRAW] * steps)])
+        generator = SimplifyGenerator(source, 0.05)
+
+        layer = generator.next()
+
+        self.assertTrue(isinstance(layer, ArrayLayer))
+        self.assertTrue(len(layer) <= 64)
+        self.assertEquals(points[0], layer.starts[0].tolist())
+        self.assertEquals(points[-1], layer.ends[-1].tolist())
+        self.assertTrue(np.allclose(layer.starts[1:], layer.ends[:-1]))
+        for (x, y) in layer.ends.tolist():
+            self.assertAlmostEquals(10.0, math.hypot(x, y))
+
+    def test_next_should_leave_single_draws(self):
+        expected = Layer(0.0, commands=[LateralMove([0.0, 0.0], [1.0, 1.0], 100.0), LateralDraw([1.0, 1.0], [2.0, 2.0], 100.0)])
+        self.assertLayerEquals(expected, SimplifyGenerator(StubLayerGenerator([expected]), 0.05).next())
+
+
 class CureTestGeneratorTests(unittest.TestCase, test_helpers.TestHelpers):
 
     def test_next_must_yield_correct_layer_at_correct_speed(self):
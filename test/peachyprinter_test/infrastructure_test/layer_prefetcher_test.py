@@ -0,0 +1,89 @@
+import unittest
+import os
+import sys
+import time
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', 'src'))
+
+from peachyprinter.domain.commands import *
+from peachyprinter.infrastructure.layer_generators import StubLayerGenerator
+from peachyprinter.infrastructure.layer_prefetcher import LayerPrefetcher
+
+
+class FailingLayerGenerator(object):
+    def __init__(self, layers, failure):
+        self._layers = layers
+        self._failure = failure
+
+    def next(self):
+        if self._layers:
+            return self._layers.pop(0)
+        if self._failure:
+            failure, self._failure = self._failure, None
+            raise failure
+        raise StopIteration
+
+
+class LayerPrefetcherTests(unittest.TestCase):
+    prefetcher = None
+
+    def tearDown(self):
+        if self.prefetcher:
+            self.prefetcher.close()
+
+    def wait_for_queue(self, depth):
+        end = time.time() + 2.0
+        while self.prefetcher.queue_depth < depth and time.time() < end:
+            time.sleep(0.01)
+
+    def test_next_returns_layers_in_order_then_stops(self):
+        layers = [Layer(float(z), [LateralDraw([0.0, 0.0], [1.0, 1.0], 1.0)]) for z in range(0, 20)]
+        self.prefetcher = LayerPrefetcher(StubLayerGenerator(list(layers)), 4)
+
+        actual = [layer for layer in self.prefetcher]
+
+        self.assertEquals(layers, actual)
+        with self.assertRaises(StopIteration):
+            self.prefetcher.next()
+
+    def test_queue_is_bounded_by_depth(self):
+        layer = Layer(0.0, [LateralDraw([0.0, 0.0], [1.0, 1.0], 1.0)])
+        self.prefetcher = LayerPrefetcher(StubLayerGenerator([layer], repeat=True), 3)
+
+        self.wait_for_queue(3)
+        time.sleep(0.2)
+
+        self.assertEquals(3, self.prefetcher.queue_depth)
+        self.assertTrue(self.prefetcher.producer_stall_time > 0.0)
+
+    def test_errors_are_raised_in_order_and_prefetching_continues(self):
+        layer = Layer(0.0, [LateralDraw([0.0, 0.0], [1.0, 1.0], 1.0)])
+        self.prefetcher = LayerPrefetcher(FailingLayerGenerator([layer], Exception("Bad Layer")), 2)
+
+        self.assertEquals(layer, self.prefetcher.next())
+        with self.assertRaises(Exception) as context:
+            self.prefetcher.next()
+        self.assertEquals("Bad Layer", str(context.exception))
+        with self.assertRaises(StopIteration):
+            self.prefetcher.next()
+
+    def test_close_flushes_queue_and_stops(self):
+        layer = Layer(0.0, [LateralDraw([0.0, 0.0], [1.0, 1.0], 1.0)])
+        self.prefetcher = LayerPrefetcher(StubLayerGenerator([layer], repeat=True), 3)
+        self.wait_for_queue(3)
+
+        self.prefetcher.close()
+
+        self.assertEquals(0, self.prefetcher.queue_depth)
+        with self.assertRaises(StopIteration):
+            self.prefetcher.next()
+
+    def test_depth_must_be_positive(self):
+        with self.assertRaises(Exception):
+            LayerPrefetcher(StubLayerGenerator([]), 0)
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s %(levelname)s: %(message)s', level='DEBUG')
+    unittest.main()
@@ -2,6 +2,8 @@ import unittest
 import os
 import sys
 import logging
+import time
+import numpy
 from mock import patch
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
@@ -169,6 +171,162 @@ class MachineStatusTests(unittest.TestCase):
         status.drip_call_back(67, 12, 12.2, [12, 13])
         self.assertEqual([12, 13], status.status()['drip_history'])
 
+    def test_set_layer_queue_updates_prefetch_status(self):
+        status = MachineStatus()
+        status.set_layer_queue(3, 1.5, 0.25)
+        self.assertEqual(3, status.status()['layer_queue_depth'])
+        self.assertEqual(1.5, status.status()['layer_producer_stall_time'])
+        self.assertEqual(0.25, status.status()['layer_consumer_stall_time'])
+
+    def test_add_axis_data_keeps_missing_extents(self):
+        status = MachineStatus()
+        status.add_axis_data([[None, None], [None, None], None])
+        self.assertEqual([[[None, None], [None, None], None]], status.status()['axis'])
+
+    def test_add_axis_data_grows_storage(self):
+        status = MachineStatus()
+        for layer in range(40):
+            status.add_axis_data([[0.0, 1.0], [-1.0, 1.0], layer])
+        self.assertEqual(range(40), [axis[2] for axis in status.status()['axis']])
+
+    def test_errors_are_limited_to_most_recent(self):
+        status = MachineStatus(error_limit=2)
+        for message in ['a', 'b', 'c']:
+            status.add_error(MachineError(message))
+        self.assertEqual(['b', 'c'], [error['message'] for error in status.status()['errors']])
+
+    def test_version_increases_with_each_change(self):
+        status = MachineStatus()
+        versions = [status.version]
+        status.add_layer()
+        versions.append(status.version)
+        status.drip_call_back(1, 0.1, 0.0)
+        versions.append(status.version)
+        status.set_complete()
+        versions.append(status.version)
+        self.assertEqual(sorted(set(versions)), versions)
+        self.assertEqual(status.version, status.status()['version'])
+
+    def test_status_since_none_returns_everything(self):
+        status = MachineStatus()
+        status.add_axis_data([[0.0, 1.0], [-1.0, 1.0], 2.0])
+        full = status.status()
+
+        changes = status.status_since(None)
+
+        for key in ['start_time', 'current_layer', 'height', 'drips', 'waiting_for_drips', 'model_height', 'axis', 'status']:
+            self.assertEqual(full[key], changes[key])
+        self.assertEqual(status.version, changes['version'])
+
+    def test_status_since_returns_only_changes(self):
+        status = MachineStatus()
+        status.add_axis_data([[0.0, 1.0], [-1.0, 1.0], 1.0])
+        cursor = status.status_since()['cursor']
+        status.add_layer()
+        status.add_axis_data([[0.0, 2.0], [-2.0, 2.0], 2.0])
+
+        changes = status.status_since(cursor)
+
+        self.assertEqual(1, changes['current_layer'])
+        self.assertEqual([[[0.0, 2.0], [-2.0, 2.0], 2.0]], changes['axis'])
+        self.assertFalse('height' in changes)
+        self.assertFalse('errors' in changes)
+        self.assertFalse('start_time' in changes)
+        self.assertTrue(changes['version'] > cursor.version)
+
+    def test_status_since_returns_nothing_new_when_unchanged(self):
+        status = MachineStatus()
+        status.add_layer()
+        cursor = status.status_since()['cursor']
+
+        changes = status.status_since(cursor)
+
+        self.assertEqual(set(['version', 'cursor', 'status', 'elapsed_time']), set(changes.keys()))
+        self.assertEqual(cursor, changes['cursor'])
+
+    def test_status_since_returns_new_drips_only(self):
+        status = MachineStatus()
+        status.drip_call_back(2, 0.2, 1.0, [10.0, 11.0])
+        cursor = status.status_since()['cursor']
+        status.drip_call_back(4, 0.4, 1.0, [10.0, 11.0, 12.0, 13.0])
+
+        changes = status.status_since(cursor)
+
+        self.assertEqual([12.0, 13.0], changes['drip_history'])
+        self.assertEqual(4, changes['drips'])
+
+    def test_drip_call_back_stores_history_without_copying(self):
+        status = MachineStatus()
+        history = numpy.array([10.0, 11.0])
+
+        status.drip_call_back(2, 0.2, 1.0, history)
+
+        self.assertTrue(status._drip_history is history)
+        self.assertEqual([10.0, 11.0], status.status()['drip_history'])
+        self.assertEqual([11.0], status.status_since(StatusCursor(-1, 0, 0, 10.0))['drip_history'])
+
+    def test_status_since_reports_missed_errors(self):
+        status = MachineStatus(error_limit=2)
+        status.add_error(MachineError('a'))
+        cursor = status.status_since()['cursor']
+        for message in ['b', 'c', 'd']:
+            status.add_error(MachineError(message))
+
+        changes = status.status_since(cursor)
+
+        self.assertEqual(['c', 'd'], [error['message'] for error in changes['errors']])
+        self.assertEqual(1, changes['missed_errors'])
+
+    def test_subscribe_pushes_layer_drip_error_and_status_events(self):
+        events = []
+        status = MachineStatus()
+        status.subscribe(events.extend, max_rate=1000.0)
+
+        status.add_layer()
+        status.drip_call_back(1, 0.1, 0.5)
+        status.add_axis_data([[0.0, 1.0], [-1.0, 1.0], 2.0])
+        status.add_error(MachineError('Broken', 1))
+        status.set_complete()
+        status.close()
+
+        self.assertEqual(['layer_started', 'drip', 'layer_completed', 'error', 'status'], [event.type for event in events])
+        self.assertEqual({'layer': 1}, events[0].data)
+        self.assertEqual(0.1, events[1].data['height'])
+        self.assertEqual([[0.0, 1.0], [-1.0, 1.0], 2.0], events[2].data['axis'])
+        self.assertEqual('Broken', events[3].data['message'])
+        self.assertEqual({'status': 'Complete'}, events[4].data)
+        self.assertEqual(status.version, events[4].version)
+
+    def test_subscribe_can_limit_events(self):
+        events = []
+        status = MachineStatus()
+        status.subscribe(events.extend, events=['error'])
+
+        status.add_layer()
+        status.drip_call_back(1, 0.1, 0.5)
+        status.add_error(MachineError('Broken'))
+        status.close()
+
+        self.assertEqual(['error'], [event.type for event in events])
+
+    def test_subscribe_coalesces_drips(self):
+        events = []
+        status = MachineStatus()
+        status.subscribe(events.extend, max_rate=0.1)
+        status.add_layer()
+        time.sleep(0.1)
+
+        for drip in range(1, 50):
+            status.drip_call_back(drip, drip * 0.1, 0.5)
+        status.close()
+
+        drips = [event for event in events if event.type == 'drip']
+        self.assertEqual(1, len(drips))
+        self.assertEqual(49, drips[0].data['drips'])
+
+    def test_close_without_subscribers_does_nothing(self):
+        MachineStatus().close()
+
 if __name__ == '__main__':
     logging.basicConfig(format='%(asctime)s %(levelname)s: %(message)s', level='DEBUG')
     unittest.main()
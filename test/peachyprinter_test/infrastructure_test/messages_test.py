@@ -5,7 +5,7 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', 'src'))
 
-from peachyprinter.infrastructure.messages import MoveMessage, DripRecordedMessage, SetDripCountMessage, MoveToDripCountMessage, IAmMessage
+from peachyprinter.infrastructure.messages import MoveMessage, DripRecordedMessage, SetDripCountMessage, MoveToDripCountMessage, IAmMessage, HoldMessage
 
 
 class MoveMesssageTests(unittest.TestCase):
@@ -17,6 +17,39 @@ class MoveMesssageTests(unittest.TestCase):
         decoded_message = MoveMessage.from_bytes(proto_bytes)
         self.assertEqual(inital_message, decoded_message)
 
+    def test_frame_prefixes_length_and_type(self):
+        message = MoveMessage(77, 88, 55)
+        proto_bytes = message.get_bytes()
+        self.assertEqual(chr(len(proto_bytes) + 1) + chr(MoveMessage.TYPE_ID) + proto_bytes, message.frame())
+
+    def test_frames_matches_individual_frames(self):
+        positions = [0, 1, 127, 128, 16383, 16384, 262143, -1, -262143, 2147483647, -2147483648]
+        for laser_power in [0, 1, 127, 128, 255]:
+            expected = ''.join([MoveMessage(x, y, laser_power).frame() for (x, y) in zip(positions, reversed(positions))])
+            self.assertEqual(expected, MoveMessage.frames(positions, list(reversed(positions)), laser_power))
+
+    def test_frames_accepts_a_power_per_move(self):
+        positions = [0, 1, 127, 128, 16383]
+        powers = [0, 255, 128, 1, 127]
+        expected = ''.join([MoveMessage(x, x, power).frame() for (x, power) in zip(positions, powers)])
+        self.assertEqual(expected, MoveMessage.frames(positions, positions, powers))
+
+    def test_frames_handles_empty_batches(self):
+        self.assertEqual('', MoveMessage.frames([], [], 255))
+
+
+class HoldMessageTests(unittest.TestCase):
+
+    def test_hold_message_encodes_and_decodes(self):
+        inital_message = HoldMessage(-77, 88, 55, 800)
+        proto_bytes = inital_message.get_bytes()
+        self.assertTrue(len(proto_bytes) > 0)
+        decoded_message = HoldMessage.from_bytes(proto_bytes)
+        self.assertEqual(inital_message, decoded_message)
+
+    def test_hold_message_is_smaller_than_the_moves_it_replaces(self):
+        self.assertTrue(len(HoldMessage(77, 88, 55, 800).frame()) < len(MoveMessage.frames([77] * 2, [88] * 2, 55)))
+
 
 class DripRecordedMesssageTests(unittest.TestCase):
 
@@ -11,7 +11,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', 'sr
 from test_helpers import TestHelpers
 from peachyprinter.infrastructure.micro_disseminator import MicroDisseminator
 from peachyprinter.domain.laser_control import LaserControl
-from peachyprinter.infrastructure.messages import MoveMessage
+from peachyprinter.infrastructure.messages import MoveMessage, HoldMessage
 
 
 class MicroDisseminatorTests(unittest.TestCase, TestHelpers):
@@ -20,6 +20,9 @@ class MicroDisseminatorTests(unittest.TestCase, TestHelpers):
         self.mock_comm = MagicMock()
         self.laser_control = LaserControl()
 
+    def frames(self, *messages):
+        return ''.join([message.frame() for message in messages])
+
     def test_samples_per_second_is_data_rate(self):
         expected_samples_per_second = 8000
         micro_disseminator = MicroDisseminator(LaserControl(), MagicMock(), expected_samples_per_second)
@@ -34,14 +37,14 @@ class MicroDisseminatorTests(unittest.TestCase, TestHelpers):
         sample_data_chunk = numpy.array([(0, 0)])
         micro_disseminator = MicroDisseminator(self.laser_control, self.mock_comm, 8000)
         micro_disseminator.process(sample_data_chunk)
-        self.mock_comm.send.assert_called_with(MoveMessage(0, 0, 0))
+        self.mock_comm.send_frames.assert_called_with(self.frames(MoveMessage(0, 0, 0)))
 
     def test_process_should_call_com_with_move_when_laser_on(self):
         self.laser_control.set_laser_on()
         sample_data_chunk = numpy.array([(0, 0)])
         micro_disseminator = MicroDisseminator(self.laser_control, self.mock_comm, 8000)
         micro_disseminator.process(sample_data_chunk)
-        self.mock_comm.send.assert_called_with(MoveMessage(0, 0, 255))
+        self.mock_comm.send_frames.assert_called_with(self.frames(MoveMessage(0, 0, 255)))
 
     def test_process_should_adjust_laser_power(self):
         self.laser_control = LaserControl(0.5)
@@ -49,32 +52,82 @@ class MicroDisseminatorTests(unittest.TestCase, TestHelpers):
         sample_data_chunk = numpy.array([(0, 0)])
         micro_disseminator = MicroDisseminator(self.laser_control, self.mock_comm, 8000)
         micro_disseminator.process(sample_data_chunk)
-        self.mock_comm.send.assert_called_with(MoveMessage(0, 0, 127))
+        self.mock_comm.send_frames.assert_called_with(self.frames(MoveMessage(0, 0, 127)))
 
     def test_process_should_call_com_with_correct_posisitions(self):
         self.laser_control.set_laser_on()
         sample_data_chunk = numpy.array([(1, 1)])
         micro_disseminator = MicroDisseminator(self.laser_control, self.mock_comm, 8000)
         micro_disseminator.process(sample_data_chunk)
-        self.mock_comm.send.assert_called_with(MoveMessage(self.max_value, self.max_value, 255))
+        self.mock_comm.send_frames.assert_called_with(self.frames(MoveMessage(self.max_value, self.max_value, 255)))
 
     def test_process_should_handle_empty_lists(self):
         self.laser_control.set_laser_on()
         sample_data_chunk = numpy.array([])
         micro_disseminator = MicroDisseminator(self.laser_control, self.mock_comm, 8000)
         micro_disseminator.process(sample_data_chunk)
-        self.assertEqual(0, self.mock_comm.send.call_count)
+        self.assertEqual(0, self.mock_comm.send_frames.call_count)
 
     def test_process_should_call_com_each_element_in_list(self):
         self.laser_control.set_laser_on()
         sample_data_chunk = numpy.array([(0.0, 1.0), (0.5, 0.0), (1.0, 0.5)])
         micro_disseminator = MicroDisseminator(self.laser_control, self.mock_comm, 8000)
         micro_disseminator.process(sample_data_chunk)
-        self.mock_comm.send.assert_has_calls([
-            call(MoveMessage(0,     self.max_value, 255)),
-            call(MoveMessage(self.max_value / 2, 0,     255)),
-            call(MoveMessage(self.max_value, self.max_value / 2, 255)),
-            ])
+        self.mock_comm.send_frames.assert_called_with(self.frames(
+            MoveMessage(0,     self.max_value, 255),
+            MoveMessage(self.max_value / 2, 0,     255),
+            MoveMessage(self.max_value, self.max_value / 2, 255),
+            ))
+
+    def test_process_should_encode_batches_identically_to_single_messages(self):
+        self.laser_control.set_laser_on()
+        sample_data_chunk = numpy.random.uniform(-0.1, 1.1, (500, 2))
+        micro_disseminator = MicroDisseminator(self.laser_control, self.mock_comm, 8000)
+        micro_disseminator.process(sample_data_chunk)
+        expected = self.frames(*[MoveMessage(int(x * self.max_value), int(y * self.max_value), 255) for (x, y) in sample_data_chunk])
+        self.mock_comm.send_frames.assert_called_once_with(expected)
+
+    def test_process_should_use_laser_powers_when_given(self):
+        self.laser_control.set_laser_off()
+        micro_disseminator = MicroDisseminator(self.laser_control, self.mock_comm, 8000)
+        micro_disseminator.process(numpy.array([(0.0, 0.0), (1.0, 1.0)]), numpy.array([0.5, 0.0]))
+        expected = self.frames(MoveMessage(0, 0, 127), MoveMessage(self.max_value, self.max_value, 0))
+        self.mock_comm.send_frames.assert_called_with(expected)
+
+    def test_hold_should_send_one_hold_message(self):
+        self.laser_control.set_laser_off()
+        micro_disseminator = MicroDisseminator(self.laser_control, self.mock_comm, 8000)
+
+        micro_disseminator.hold([0.5, 1.0], 800)
+
+        self.mock_comm.send.assert_called_once_with(HoldMessage(int(0.5 * self.max_value), self.max_value, 0, 800))
+        self.assertEquals(0, self.mock_comm.send_frames.call_count)
+
+    def test_flush_calls_flush_on_communicator(self):
+        micro_disseminator = MicroDisseminator(self.laser_control, self.mock_comm, 8000)
+        micro_disseminator.flush()
+        self.mock_comm.flush.assert_called_with()
+
+    def test_recording_captures_the_frames_sent(self):
+        self.laser_control.set_laser_on()
+        micro_disseminator = MicroDisseminator(self.laser_control, self.mock_comm, 8000)
+        micro_disseminator.start_recording()
+        micro_disseminator.process(numpy.array([(0.0, 0.0), (0.5, 0.5)]))
+        micro_disseminator.process(numpy.array([(1.0, 1.0)]))
+        frames = micro_disseminator.stop_recording()
+
+        expected = self.frames(MoveMessage(0, 0, 255), MoveMessage(int(0.5 * self.max_value), int(0.5 * self.max_value), 255), MoveMessage(self.max_value, self.max_value, 255))
+        self.assertEquals(expected, frames)
+        self.assertEquals(2, self.mock_comm.send_frames.call_count)
+
+    def test_stop_recording_returns_none_when_not_recording(self):
+        micro_disseminator = MicroDisseminator(self.laser_control, self.mock_comm, 8000)
+        self.assertEquals(None, micro_disseminator.stop_recording())
+
+    def test_replay_sends_frames_to_communicator(self):
+        micro_disseminator = MicroDisseminator(self.laser_control, self.mock_comm, 8000)
+        micro_disseminator.replay(self.frames(MoveMessage(1, 2, 3)))
+        self.mock_comm.send_frames.assert_called_with(self.frames(MoveMessage(1, 2, 3)))
 
     def test_close_calls_close_on_communicator(self):
         micro_disseminator = MicroDisseminator(self.laser_control, self.mock_comm, 8000)
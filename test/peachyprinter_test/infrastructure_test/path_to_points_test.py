@@ -69,6 +69,25 @@ class PathToPointsTests(unittest.TestCase, TestHelpers):
         actual = path2audio.process([1.0, 1.0, 1.0], [1.0, 1.0, 1.0], 1.0)
         self.assertNumpyArrayClose(expected, actual)
 
+    def test_hold_returns_transformed_position_and_samples_for_duration(self):
+        path2audio = PathToPoints(8000, TuningTransformer(), 0.5)
+
+        position, samples = path2audio.hold([0.5, 1.5, 1.0], 0.1)
+
+        self.assertNumpyArrayClose(numpy.array([0.5, 1.0]), position)
+        self.assertEquals(800, samples)
+        self.assertEquals(1, path2audio.clipped_points)
+
+    def test_process_counts_points_clipped_by_transformer(self):
+        samples_per_second = 4
+        laser_size = 0.5
+        path2audio = PathToPoints(samples_per_second, TuningTransformer(), laser_size)
+
+        path2audio.process([0.5, 0.5, 1.0], [1.5, 0.5, 1.0], 1.0)
+        path2audio.process_many([[0.5, 0.5], [-0.5, 0.5]], [[-0.5, 0.5], [-0.5, -0.5]], [1.0, 1.0], [True, True], 1.0)
+
+        self.assertEquals(4, path2audio.clipped_points)
+
     def test_in_the_event_of_a_distance_smaller_then_a_sample_the_vertex_time_should_not_be_skiped(self):
         samples_per_second = 10
         laser_size = 0.5
@@ -95,6 +114,65 @@ class PathToPointsTests(unittest.TestCase, TestHelpers):
         self.assertNumpyArrayEquals(expected1, actual1)
         self.assertNumpyArrayEquals(expected2, actual2)
 
+    def test_process_many_should_match_process_per_segment(self):
+        samples_per_second = 11
+        laser_size = 0.5
+        per_segment = PathToPoints(samples_per_second, self.transformer, laser_size)
+        batch = PathToPoints(samples_per_second, self.transformer, laser_size)
+        starts = [[0.0, 0.0], [1.0, 0.0], [1.0, 1.0]]
+        ends = [[1.0, 0.0], [1.0, 1.0], [0.0, 0.0]]
+        speeds = [2.0, 2.0, 3.0]
+        expected = numpy.vstack([per_segment.process(start + [1.0], end + [1.0], speed) for (start, end, speed) in zip(starts, ends, speeds)])
+
+        actual, _ = batch.process_many(starts, ends, speeds, [True, False, True], 1.0)
+
+        self.assertNumpyArrayEquals(expected, actual)
+
+    def test_process_many_should_return_laser_power_per_sample(self):
+        samples_per_second = 11
+        laser_size = 0.5
+        path2audio = PathToPoints(samples_per_second, self.transformer, laser_size)
+        expected = numpy.array([0.0] * 5 + [0.5] * 5)
+
+        _, actual = path2audio.process_many([[0.0, 0.0], [1.0, 0.0]], [[1.0, 0.0], [1.0, 1.0]], [2.0, 2.0], [False, True], 1.0, 0.5)
+
+        self.assertNumpyArrayEquals(expected, actual)
+
+    def test_process_many_should_carry_sub_sample_vertices_into_next_segment(self):
+        samples_per_second = 10
+        laser_size = 0.5
+        path2audio = PathToPoints(samples_per_second, self.transformer, laser_size)
+        expected = numpy.array([[0.0, 0.0], [1.0, 1.0]])
+
+        actual, _ = path2audio.process_many([[0.0, 0.0], [0.0, 1.0]], [[0.0, 1.0], [1.0, 1.0]], [10.0, 10.0], [True, True], 1.0)
+
+        self.assertNumpyArrayEquals(expected, actual)
+
+    def test_process_many_should_carry_sub_sample_vertices_between_calls(self):
+        samples_per_second = 10
+        laser_size = 0.5
+        path2audio = PathToPoints(samples_per_second, self.transformer, laser_size)
+        expected1 = numpy.empty((0, 2))
+        expected2 = numpy.array([[0.0, 0.0], [1.0, 1.0]])
+
+        actual1, _ = path2audio.process_many([[0.0, 0.0]], [[0.0, 1.0]], [10.0], [True], 1.0)
+        actual2, _ = path2audio.process_many([[0.0, 1.0]], [[1.0, 1.0]], [10.0], [True], 1.0)
+
+        self.assertNumpyArrayEquals(expected1, actual1)
+        self.assertNumpyArrayEquals(expected2, actual2)
+
+    def test_process_and_process_many_share_the_sub_sample_carry(self):
+        samples_per_second = 10
+        laser_size = 0.5
+        path2audio = PathToPoints(samples_per_second, self.transformer, laser_size)
+        expected = numpy.array([[0.0, 0.0], [1.0, 1.0]])
+
+        skipped = path2audio.process([0.0, 0.0, 1.0], [0.0, 1.0, 1.0], 10.0)
+        actual, _ = path2audio.process_many([[0.0, 1.0]], [[1.0, 1.0]], [10.0], [True], 1.0)
+
+        self.assertEquals(0, len(skipped))
+        self.assertNumpyArrayEquals(expected, actual)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+import sys
+import os
+import time
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', 'src'))
+
+from peachyprinter.infrastructure.messages import MoveMessage, HoldMessage, IdentifyMessage, IAmMessage, DripRecordedMessage, SetDripCountMessage
+from peachyprinter.infrastructure.peachyusb_loopback import LoopbackPeachyUSB
+from peachyprinter.infrastructure.communicator import UsbPacketCommunicator
+
+
+class LoopbackPeachyUSBTests(unittest.TestCase):
+    device = None
+
+    def setUp(self):
+        self.received = []
+
+    def tearDown(self):
+        if self.device:
+            self.device.close()
+
+    def call_back(self, data, length):
+        self.received.append(data[:length])
+
+    def wait_for(self, condition, timeout=2.0):
+        end = time.time() + timeout
+        while not condition() and time.time() < end:
+            time.sleep(0.005)
+
+    def test_write_decodes_moves(self):
+        self.device = LoopbackPeachyUSB(100, bytes_per_second=1000000)
+        self.device.write(MoveMessage.frames([1, 2, 3], [4, 5, 6], 255))
+
+        self.wait_for(lambda: self.device.moves_drained == 3)
+
+        self.assertEquals(3, self.device.moves_drained)
+        self.assertEquals(MoveMessage(3, 6, 255), self.device.last_move)
+
+    def test_drain_rate_limits_throughput(self):
+        frame = MoveMessage(1, 1, 255).frame()
+        self.device = LoopbackPeachyUSB(1000, bytes_per_second=len(frame) * 100)
+        self.device.write(frame * 50)
+
+        time.sleep(0.2)
+
+        self.assertTrue(self.device.moves_drained < 50)
+        self.assertTrue(self.device.queue_depth > 0)
+
+    def test_write_blocks_while_queue_is_at_capacity(self):
+        frame = MoveMessage(1, 1, 255).frame()
+        self.device = LoopbackPeachyUSB(10, bytes_per_second=len(frame) * 200)
+        self.device.write(frame * 10)
+
+        self.device.write(frame)
+
+        self.assertTrue(self.device.moves_drained >= 1)
+
+    def test_identify_replies_with_i_am(self):
+        self.device = LoopbackPeachyUSB(10, data_rate=2000)
+        self.device.set_read_callback(self.call_back)
+        self.device.write(IdentifyMessage().frame())
+
+        self.wait_for(lambda: self.received)
+
+        self.assertEquals(chr(IAmMessage.TYPE_ID), self.received[0][0])
+        self.assertEquals(2000, IAmMessage.from_bytes(self.received[0][1:]).dataRate)
+
+    def test_drips_are_reported_through_call_back(self):
+        self.device = LoopbackPeachyUSB(10, drips_per_second=100)
+        self.device.set_read_callback(self.call_back)
+        self.device.write(SetDripCountMessage(5).frame())
+
+        self.wait_for(lambda: len(self.received) >= 2)
+
+        drips = [DripRecordedMessage.from_bytes(data[1:]).drips for data in self.received]
+        self.assertTrue(drips[-1] > drips[0])
+
+    def test_underruns_are_counted_when_queue_empties(self):
+        self.device = LoopbackPeachyUSB(10, bytes_per_second=1000000)
+        self.device.write(MoveMessage(1, 1, 255).frame())
+
+        self.wait_for(lambda: self.device.underruns > 0)
+
+        self.assertEquals(1, self.device.underruns)
+        self.assertEquals(1, self.device.status()['underruns'])
+
+    def test_hold_occupies_device_for_its_samples(self):
+        self.device = LoopbackPeachyUSB(10, bytes_per_second=1000000, data_rate=1000)
+        self.device.write(HoldMessage(1, 2, 0, 200).frame() + MoveMessage(3, 4, 255).frame())
+
+        self.wait_for(lambda: self.device.holds_drained == 1)
+        time.sleep(0.05)
+
+        self.assertEquals(MoveMessage(1, 2, 0), self.device.last_move)
+        self.assertEquals(200, self.device.held_samples)
+        self.assertEquals(0, self.device.underruns)
+
+        self.wait_for(lambda: self.device.last_move == MoveMessage(3, 4, 255))
+
+        self.assertEquals(201, self.device.moves_drained)
+
+    def test_communicator_can_use_loopback(self):
+        communicator = UsbPacketCommunicator(10, loopback=True)
+        identities = []
+        communicator.register_handler(IAmMessage, identities.append)
+        communicator.start()
+        self.device = communicator._device
+
+        communicator.send(IdentifyMessage())
+        self.wait_for(lambda: identities)
+        communicator.close()
+        self.device = None
+
+        self.assertEquals('loopback', identities[0].sn)
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s %(levelname)s: %(message)s', level='DEBUG')
+    unittest.main()
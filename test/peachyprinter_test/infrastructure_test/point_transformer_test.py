@@ -4,6 +4,7 @@ import sys
 import logging
 import numpy as np
 import math
+from mock import patch
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', 'src'))
@@ -69,6 +70,115 @@ class PointTransformerTest(unittest.TestCase):
         print(average_diffrence)
         self.assertTrue(average_diffrence < acceptable_diffrence, 'Difference was %s' % average_diffrence)
 
+    def get_calibration_points(self, z_height):
+        printer = self.factory.new_peachy_printer()
+        deflection_points = [
+            [ 1.0, 1.0],[-1.0, 1.0],[ 1.0,-1.0],[-1.0, -1.0],
+            [ 0.0, 1.0 ],[ 0.0, -1.0 ],[1.0,0.0],[-1.0,0.0],
+            [ 0.8, 0.8],[-0.8, 0.8],[ 0.8,-0.8],[-0.8, -0.8],
+            [ 0.0, 0.8],[ 0.0, -0.8 ],[0.8,0.0],[-0.8,0.0],
+            [ 0.4, 0.4],[-0.4, 0.4],[ 0.4,-0.4],[-0.4, -0.4],
+        ]
+        return [((dx, dy), printer.write(dx, dy, z_height).tolist()[0][:2]) for (dx, dy) in deflection_points]
+
+    def test_transform_many_matches_transform(self):
+        pt = PointTransformer(self.get_calibration_points(-300))
+        points = [point for point in self.get_test_points(10, -300)]
+
+        actual, clipped = pt.transform_many(points)
+
+        expected = np.array([pt.transform(point)[:2] for point in points])
+        self.assertTrue(np.allclose(expected, actual))
+        self.assertEquals(0, clipped)
+
+    def test_batched_fit_search_finds_same_bend_as_sequential_search(self):
+        class SequentialPointTransformer(PointTransformer):
+            def _shortlist(self, errors):
+                return range(len(errors))
+
+        for z_height in [-300, -100]:
+            calibration_points = self.get_calibration_points(z_height)
+            sequential = SequentialPointTransformer(calibration_points)
+            batched = PointTransformer(calibration_points)
+
+            self.assertEquals(
+                (sequential.calibrated_bend_x, sequential.calibrated_bend_y, sequential.calibrated_scale),
+                (batched.calibrated_bend_x, batched.calibrated_bend_y, batched.calibrated_scale))
+            self.assertTrue(np.array_equal(sequential.coeffecient_vector_x, batched.coeffecient_vector_x))
+
+    def test_fit_search_with_process_pool_finds_same_bend(self):
+        calibration_points = self.get_calibration_points(-300)
+        single = PointTransformer(calibration_points)
+        pooled = PointTransformer(calibration_points, processes=2)
+
+        self.assertEquals(
+            (single.calibrated_bend_x, single.calibrated_bend_y, single.calibrated_scale),
+            (pooled.calibrated_bend_x, pooled.calibrated_bend_y, pooled.calibrated_scale))
+
+    def test_fit_cache_skips_the_bend_search_for_the_same_calibration(self):
+        calibration_points = self.get_calibration_points(-300)
+        fit_cache = {}
+        original = PointTransformer(calibration_points, fit_cache=fit_cache)
+
+        with patch.object(PointTransformer, '_get_best_bends') as mock_get_best_bends:
+            cached = PointTransformer(calibration_points, fit_cache=dict(fit_cache))
+            self.assertEquals(0, mock_get_best_bends.call_count)
+
+        point = [10.0, -5.0, -300]
+        self.assertEquals(original.transform(point), cached.transform(point))
+
+    def test_lookup_grid_stays_within_reported_error(self):
+        calibration_points = self.get_calibration_points(-300)
+        exact = PointTransformer(calibration_points)
+        gridded = PointTransformer(calibration_points, grid_resolution=32)
+        actuals = np.array([actual for (deflection, actual) in calibration_points])
+        xs = np.linspace(actuals[:, 0].min(), actuals[:, 0].max(), 37)
+        ys = np.linspace(actuals[:, 1].min(), actuals[:, 1].max(), 41)
+        points = [[x, y, -300] for x in xs for y in ys]
+
+        expected = exact.transform_many(points)[0]
+        actual = gridded.transform_many(points)[0]
+
+        max_error = gridded.lookup_grid_error()
+        self.assertTrue(max_error > 0.0)
+        self.assertTrue(np.sqrt(((expected - actual) ** 2).sum(axis=1)).max() <= max_error * 1.5)
+        self.assertEquals(gridded.transform(points[100])[:2], actual[100].tolist())
+
+    def test_lookup_grid_error_shrinks_with_resolution(self):
+        calibration_points = self.get_calibration_points(-300)
+        coarse = PointTransformer(calibration_points, grid_resolution=8)
+        fine = PointTransformer(calibration_points, grid_resolution=64)
+
+        self.assertTrue(fine.lookup_grid_error() < coarse.lookup_grid_error())
+
+    def test_lookup_grid_is_cached_with_the_calibration_fit(self):
+        calibration_points = self.get_calibration_points(-300)
+        fit_cache = {}
+        original = PointTransformer(calibration_points, grid_resolution=16, fit_cache=fit_cache)
+        original_error = original.lookup_grid_error()
+
+        with patch.object(PointTransformer, '_exact_many') as mock_exact_many:
+            cached = PointTransformer(calibration_points, grid_resolution=16, fit_cache=dict(fit_cache))
+            self.assertEquals(original_error, cached.lookup_grid_error())
+            self.assertEquals(0, mock_exact_many.call_count)
+
+        point = [10.0, -5.0, -300]
+        self.assertEquals(original.transform(point), cached.transform(point))
+
+    def test_lookup_grid_cache_is_keyed_by_resolution(self):
+        calibration_points = self.get_calibration_points(-300)
+        fit_cache = {}
+        coarse = PointTransformer(calibration_points, grid_resolution=8, fit_cache=fit_cache)
+        coarse.lookup_grid_error()
+        fine = PointTransformer(calibration_points, grid_resolution=64, fit_cache=fit_cache)
+
+        self.assertTrue(fine.lookup_grid_error() < coarse.lookup_grid_error())
+
+    def test_lookup_grid_resolution_must_be_at_least_2(self):
+        with self.assertRaises(Exception):
+            PointTransformer(self.get_calibration_points(-300), grid_resolution=1)
+
+
 class SquareTransformTest(unittest.TestCase):
     def test_requires_four_square_point_mappings(self):
         points = [
@@ -0,0 +1,145 @@
+import unittest
+import os
+import sys
+import time
+import threading
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', 'src'))
+
+from peachyprinter.infrastructure.status_dispatcher import StatusDispatcher, StatusEvent, StatusSubscription
+
+
+class StatusSubscriptionTests(unittest.TestCase):
+
+    def event(self, event_type, version):
+        return StatusEvent(event_type, version, 0.0, {})
+
+    def test_init_rejects_bad_settings(self):
+        with self.assertRaises(Exception):
+            StatusSubscription(None, events=['spam'])
+        with self.assertRaises(Exception):
+            StatusSubscription(None, max_rate=0)
+        with self.assertRaises(Exception):
+            StatusSubscription(None, queue_length=0)
+
+    def test_take_returns_events_in_version_order(self):
+        subscription = StatusSubscription(None)
+        subscription._offer(self.event('layer_started', 1))
+        subscription._offer(self.event('drip', 2))
+        subscription._offer(self.event('layer_completed', 3))
+
+        events = subscription._take(0.0)
+
+        self.assertEqual([1, 2, 3], [event.version for event in events])
+        self.assertFalse(subscription._has_pending())
+
+    def test_offer_keeps_only_newest_drip(self):
+        subscription = StatusSubscription(None)
+        for version in range(5):
+            subscription._offer(self.event('drip', version))
+
+        self.assertEqual([4], [event.version for event in subscription._take(0.0)])
+
+    def test_offer_ignores_unsubscribed_events(self):
+        subscription = StatusSubscription(None, events=['error'])
+        subscription._offer(self.event('drip', 1))
+        subscription._offer(self.event('layer_started', 2))
+        self.assertFalse(subscription._has_pending())
+
+    def test_offer_drops_oldest_when_full(self):
+        subscription = StatusSubscription(None, queue_length=2)
+        for version in range(5):
+            subscription._offer(self.event('layer_started', version))
+
+        self.assertEqual([3, 4], [event.version for event in subscription._take(0.0)])
+        self.assertEqual(3, subscription.dropped)
+
+    def test_take_delays_next_delivery_by_rate(self):
+        subscription = StatusSubscription(None, max_rate=4.0)
+        subscription._take(10.0)
+        self.assertAlmostEqual(0.25, subscription._due_in(10.0))
+
+
+class StatusDispatcherTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatcher = StatusDispatcher()
+        self.batches = []
+        self.delivered = threading.Event()
+
+    def tearDown(self):
+        self.dispatcher.close()
+
+    def call_back(self, events):
+        self.batches.append(events)
+        self.delivered.set()
+
+    def test_publish_delivers_to_subscriber(self):
+        self.dispatcher.subscribe(StatusSubscription(self.call_back))
+        event = StatusEvent('layer_started', 1, 0.0, {'layer': 1})
+
+        self.dispatcher.publish(event)
+
+        self.assertTrue(self.delivered.wait(2.0))
+        self.assertEqual([[event]], self.batches)
+
+    def test_publish_is_rate_limited_and_batched(self):
+        self.dispatcher.subscribe(StatusSubscription(self.call_back, max_rate=5.0))
+        self.dispatcher.publish(StatusEvent('layer_started', 1, 0.0, {}))
+        self.assertTrue(self.delivered.wait(2.0))
+        self.delivered.clear()
+        start = time.time()
+
+        self.dispatcher.publish(StatusEvent('layer_completed', 2, 0.0, {}))
+        self.dispatcher.publish(StatusEvent('layer_started', 3, 0.0, {}))
+
+        self.assertTrue(self.delivered.wait(2.0))
+        self.assertTrue(time.time() - start >= 0.1)
+        self.assertEqual([[1], [2, 3]], [[event.version for event in batch] for batch in self.batches])
+
+    def test_slow_subscriber_does_not_block_publish(self):
+        release = threading.Event()
+        self.dispatcher.subscribe(StatusSubscription(lambda events: release.wait(2.0), max_rate=1000.0))
+        self.dispatcher.publish(StatusEvent('layer_started', 1, 0.0, {}))
+        start = time.time()
+
+        for version in range(2, 200):
+            self.dispatcher.publish(StatusEvent('layer_started', version, 0.0, {}))
+
+        self.assertTrue(time.time() - start < 1.0)
+        release.set()
+
+    def test_failing_subscriber_does_not_stop_others(self):
+        def broken(events):
+            raise Exception("Broken")
+        self.dispatcher.subscribe(StatusSubscription(broken))
+        self.dispatcher.subscribe(StatusSubscription(self.call_back))
+
+        self.dispatcher.publish(StatusEvent('error', 1, 0.0, {}))
+
+        self.assertTrue(self.delivered.wait(2.0))
+
+    def test_unsubscribed_subscription_gets_nothing(self):
+        subscription = self.dispatcher.subscribe(StatusSubscription(self.call_back))
+        subscription.close()
+
+        self.dispatcher.publish(StatusEvent('error', 1, 0.0, {}))
+
+        self.assertFalse(self.delivered.wait(0.1))
+
+    def test_close_delivers_pending_events(self):
+        self.dispatcher.subscribe(StatusSubscription(self.call_back, max_rate=0.1))
+        self.dispatcher.publish(StatusEvent('layer_started', 1, 0.0, {}))
+        self.assertTrue(self.delivered.wait(2.0))
+        self.dispatcher.publish(StatusEvent('status', 2, 0.0, {'status': 'Complete'}))
+
+        self.dispatcher.close()
+
+        self.assertEqual([[1], [2]], [[event.version for event in batch] for batch in self.batches])
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s %(levelname)s: %(message)s', level='DEBUG')
+    unittest.main()
@@ -145,6 +145,39 @@ class TimedDripZaxisTests(unittest.TestCase):
         self.tdza.start()
         self.tdza.move_to(7.0)
 
+    def test_call_back_gets_a_copy_of_drip_history(self):
+        self.tdza = TimedDripZAxis(1, 0.0, call_back=self.call_back, drips_per_second=100)
+        self.tdza.start()
+        time.sleep(0.1)
+        self.tdza.close()
+
+        self.assertTrue(self.drip_history.flags.owndata)
+
+    def test_start_returns_once_running(self):
+        self.tdza = TimedDripZAxis(1, 0.0)
+        self.tdza.start()
+        self.assertTrue(self.tdza.running)
+        self.assertNotEqual(0, self.tdza.start_time)
+
+    def test_close_returns_once_shutdown(self):
+        self.tdza = TimedDripZAxis(1, 0.0, calls_back_per_second=1)
+        self.tdza.start()
+        start = time.time()
+        self.tdza.close()
+        self.assertTrue(time.time() - start < 0.5)
+        self.assertTrue(self.tdza.shutdown)
+        self.assertFalse(self.tdza.is_alive())
+
+    def test_wait_for_height_returns_when_height_reached(self):
+        self.tdza = TimedDripZAxis(10, 0.0, drips_per_second=100, calls_back_per_second=1)
+        self.tdza.start()
+
+        reached = self.tdza.wait_for_height(2.0, 5.0)
+
+        self.assertTrue(reached)
+        self.assertTrue(self.tdza.current_z_location_mm() >= 2.0)
+        self.assertTrue(self.tdza.current_z_location_mm() < 3.0)
+
 
 class PhotoZAxisTests(unittest.TestCase):
 
@@ -224,5 +257,17 @@ class PhotoZAxisTests(unittest.TestCase):
         self.assertEquals(0.0, test_zaxis.current_z_location_mm())
         test_zaxis.close()
 
+    def test_wait_for_height_returns_when_change_due(self):
+        expected_delay = 0.1
+        test_zaxis = PhotoZAxis(0.0, expected_delay)
+        test_zaxis.move_to(10.0)
+        start = time.time()
+
+        reached = test_zaxis.wait_for_height(10.0, 5.0)
+
+        self.assertTrue(reached)
+        self.assertTrue(time.time() - start >= expected_delay)
+        self.assertTrue(time.time() - start < 1.0)
+
 if __name__ == '__main__':
     unittest.main()
@@ -3,11 +3,15 @@ import os
 import sys
 import logging
 import math
+import numpy
+import json
+from mock import patch
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', 'src'))
 
 from peachyprinter.infrastructure.transformer import OneToOneTransformer, TuningTransformer, HomogenousTransformer
+from test_helpers import NumpyTestHelpers
 
 
 class OneToOneTransformerTests(unittest.TestCase):
@@ -19,7 +23,7 @@ class OneToOneTransformerTests(unittest.TestCase):
             OneToOneTransformer().transform([1.0, 1.0])
 
 
-class TuningTransformerTests(unittest.TestCase):
+class TuningTransformerTests(unittest.TestCase, NumpyTestHelpers):
     def test_works_on_xyz(self):
         tuning_transformer = TuningTransformer()
         self.assertEquals([1.0, 1.0], tuning_transformer.transform([1.0, 1.0, 1.0]))
@@ -57,8 +61,17 @@ class TuningTransformerTests(unittest.TestCase):
         self.assertEquals([0.5, 0.5], tuning_transformer.transform([0.5, 0.5, 1.0]))
         self.assertEquals([0.25, 0.25], tuning_transformer.transform([0.0, 0.0, 1.0]))
 
+    def test_transform_many_matches_transform_and_counts_clipped_points(self):
+        tuning_transformer = TuningTransformer(scale=0.5)
+        points = [[1.1, 1.0, 1.0], [0.5, 0.5, 1.0], [0.0, -0.1, 1.0], [0.25, 0.75, 1.0]]
+
+        actual, clipped = tuning_transformer.transform_many(points)
+
+        self.assertNumpyArrayEquals(numpy.array([tuning_transformer.transform(point) for point in points]), actual)
+        self.assertEquals(2, clipped)
+
 
-class HomogenousTransformerTests(unittest.TestCase):
+class HomogenousTransformerTests(unittest.TestCase, NumpyTestHelpers):
     def test_points_outside_range_clip(self):
         height = 1.0
         lower_points = {
@@ -82,6 +95,99 @@ class HomogenousTransformerTests(unittest.TestCase):
                 results.append(transformer.transform(test_point))
         self.assertEquals([(0.0, 0.0), (1.0, 1.0)], results)
 
+    def test_transform_many_clips_and_counts_points_outside_range(self):
+        points = {(1.0, 1.0): (1.0, 1.0), (0.0, 1.0): (-1.0, 1.0), (1.0, 0.0): (1.0, -1.0), (0.0, 0.0): (-1.0, -1.0)}
+        transformer = HomogenousTransformer(1.0, 1.0, points, points)
+
+        actual, clipped = transformer.transform_many([[-2.0, -2.0, 0.0], [0.0, 0.0, 0.0], [2.0, 2.0, 0.0]])
+
+        self.assertNumpyArrayEquals(numpy.array([[0.0, 0.0], [0.5, 0.5], [1.0, 1.0]]), actual)
+        self.assertEquals(2, clipped)
+
+    def test_alternating_heights_are_served_from_cache(self):
+        points = {(1.0, 1.0): (1.0, 1.0), (0.0, 1.0): (-1.0, 1.0), (1.0, 0.0): (1.0, -1.0), (0.0, 0.0): (-1.0, -1.0)}
+        transformer = HomogenousTransformer(1.0, 10.0, points, points)
+
+        for repeat in range(0, 5):
+            transformer.transform([0.5, 0.5, 1.0])
+            transformer.transform([0.5, 0.5, 1.1])
+
+        self.assertEquals({'hits': 8, 'misses': 2, 'size': 2, 'max_size': HomogenousTransformer.CACHE_SIZE}, transformer.cache_info())
+
+    def test_cache_evicts_least_recently_used_height(self):
+        points = {(1.0, 1.0): (1.0, 1.0), (0.0, 1.0): (-1.0, 1.0), (1.0, 0.0): (1.0, -1.0), (0.0, 0.0): (-1.0, -1.0)}
+        transformer = HomogenousTransformer(1.0, 10.0, points, points, cache_size=2)
+
+        transformer.transform([0.5, 0.5, 1.0])
+        transformer.transform([0.5, 0.5, 2.0])
+        transformer.transform([0.5, 0.5, 1.0])
+        transformer.transform([0.5, 0.5, 3.0])
+        transformer.transform([0.5, 0.5, 1.0])
+        transformer.transform([0.5, 0.5, 2.0])
+
+        self.assertEquals(2, transformer.cache_info()['hits'])
+        self.assertEquals(4, transformer.cache_info()['misses'])
+        self.assertEquals(2, transformer.cache_info()['size'])
+
+    def test_set_scale_replaces_cached_transforms(self):
+        points = {(1.0, 1.0): (1.0, 1.0), (0.0, 1.0): (-1.0, 1.0), (1.0, 0.0): (1.0, -1.0), (0.0, 0.0): (-1.0, -1.0)}
+        transformer = HomogenousTransformer(1.0, 10.0, points, points)
+        before = transformer.transform([0.5, 0.5, 1.0])
+
+        transformer.set_scale(0.5)
+
+        self.assertEquals(0, transformer.cache_info()['size'])
+        self.assertNotEquals(before, transformer.transform([0.5, 0.5, 1.0]))
+
+    def test_fit_cache_is_filled_and_reused_for_same_calibration(self):
+        lower_points = {(1.0, 1.0): (4.0, 4.0), (0.0, 1.0): (-4.0, 4.0), (1.0, 0.0): (4.0, -4.0), (0.0, 0.0): (-4.0, -4.0)}
+        upper_points = {(1.0, 1.0): (3.0, 3.0), (0.0, 1.0): (-3.0, 3.0), (1.0, 0.0): (3.0, -3.0), (0.0, 0.0): (-3.0, -3.0)}
+        fit_cache = {}
+        original = HomogenousTransformer(0.9, 10.0, lower_points, upper_points, fit_cache=fit_cache)
+        stored = json.loads(json.dumps(fit_cache))
+
+        with patch.object(HomogenousTransformer, '_get_transformation_matrix') as mock_get_transformation_matrix:
+            cached = HomogenousTransformer(0.9, 10.0, lower_points, upper_points, fit_cache=stored)
+            self.assertEquals(0, mock_get_transformation_matrix.call_count)
+
+        for point in [[1.0, 2.0, 0.0], [-3.0, 2.5, 5.0], [4.0, -4.0, 10.0]]:
+            self.assertEquals(original.transform(point), cached.transform(point))
+
+    def test_fit_cache_is_replaced_when_calibration_changes(self):
+        lower_points = {(1.0, 1.0): (4.0, 4.0), (0.0, 1.0): (-4.0, 4.0), (1.0, 0.0): (4.0, -4.0), (0.0, 0.0): (-4.0, -4.0)}
+        upper_points = {(1.0, 1.0): (3.0, 3.0), (0.0, 1.0): (-3.0, 3.0), (1.0, 0.0): (3.0, -3.0), (0.0, 0.0): (-3.0, -3.0)}
+        fit_cache = {}
+        HomogenousTransformer(0.9, 10.0, lower_points, upper_points, fit_cache=fit_cache)
+        first_keys = fit_cache.keys()
+
+        HomogenousTransformer(0.9, 12.0, lower_points, upper_points, fit_cache=fit_cache)
+
+        self.assertEquals(1, len(fit_cache))
+        self.assertNotEquals(first_keys, fit_cache.keys())
+
+    def test_fit_cache_keeps_fits_of_other_transformers(self):
+        lower_points = {(1.0, 1.0): (4.0, 4.0), (0.0, 1.0): (-4.0, 4.0), (1.0, 0.0): (4.0, -4.0), (0.0, 0.0): (-4.0, -4.0)}
+        upper_points = {(1.0, 1.0): (3.0, 3.0), (0.0, 1.0): (-3.0, 3.0), (1.0, 0.0): (3.0, -3.0), (0.0, 0.0): (-3.0, -3.0)}
+        other_fit = {'bend_x': 0.5}
+        fit_cache = {'point:abc': other_fit}
+
+        HomogenousTransformer(0.9, 10.0, lower_points, upper_points, fit_cache=fit_cache)
+        HomogenousTransformer(0.9, 12.0, lower_points, upper_points, fit_cache=fit_cache)
+
+        self.assertEquals(2, len(fit_cache))
+        self.assertTrue(fit_cache['point:abc'] is other_fit)
+
+    def test_transform_many_matches_transform_across_heights(self):
+        lower_points = {(0.9, 0.95): (40.0, 40.0), (0.1, 0.9): (-40.0, 40.0), (0.95, 0.05): (40.0, -40.0), (0.05, 0.1): (-40.0, -40.0)}
+        upper_points = {(0.8, 0.85): (30.0, 30.0), (0.2, 0.8): (-30.0, 30.0), (0.85, 0.15): (30.0, -30.0), (0.15, 0.2): (-30.0, -30.0)}
+        transformer = HomogenousTransformer(0.75, 50.0, lower_points, upper_points)
+        points = numpy.array([[x, y, z] for x in [-600.0, -10.0, 0.0, 25.0] for y in [-30.0, 5.0, 600.0] for z in [0.0, 1.5, 3.0, 50.0]])
+
+        actual, clipped = transformer.transform_many(points)
+
+        self.assertNumpyArrayClose(numpy.array([transformer.transform(point) for point in points]), actual)
+        self.assertTrue(clipped > 0)
+
     def test_given_a_basic_mapping_yields_expected_results(self):
         height = 1.0
         lower_points = {
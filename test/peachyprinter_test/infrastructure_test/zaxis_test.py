@@ -2,8 +2,9 @@ import unittest
 import os
 import sys
 import time
+import threading
 import logging
-from mock import MagicMock
+from mock import MagicMock, patch
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', 'src'))
@@ -102,6 +103,53 @@ class SerialDripZAxisTests(unittest.TestCase):
         sdza.drip_reported_handler(drip_message_2)
         self.assertEquals(10, len(mock_call_back.call_args_list[1][0][3]))
 
+    def test_drip_history_is_a_copy(self):
+        mock_communicatior = MagicMock()
+        sdza = SerialDripZAxis(mock_communicatior, 1.0, 0.0)
+        sdza.drip_reported_handler(DripRecordedMessage(3))
+
+        history = sdza.drip_history
+        sdza.drip_reported_handler(DripRecordedMessage(600))
+
+        self.assertEqual(3, len(history))
+        self.assertTrue(history.flags.owndata)
+        self.assertTrue(history[0] <= sdza.drip_history[0])
+
+    def test_drip_history_view_is_read_only(self):
+        mock_communicatior = MagicMock()
+        sdza = SerialDripZAxis(mock_communicatior, 1.0, 0.0)
+        sdza.drip_reported_handler(DripRecordedMessage(3))
+
+        view = sdza.drip_history_view
+
+        self.assertEqual(3, len(view))
+        self.assertFalse(view.flags.writeable)
+
+    def test_call_back_history_is_unchanged_by_later_drips(self):
+        mock_communicatior = MagicMock()
+        mock_call_back = MagicMock()
+        sdza = SerialDripZAxis(mock_communicatior, 1.0, 0.0, mock_call_back)
+        with patch('peachyprinter.infrastructure.zaxis.time.time') as mock_time:
+            for drip in range(1, 4):
+                mock_time.return_value = float(drip)
+                sdza.drip_reported_handler(DripRecordedMessage(drip))
+            first = mock_call_back.call_args_list[2][0][3]
+            for drip in range(4, 1000):
+                mock_time.return_value = float(drip)
+                sdza.drip_reported_handler(DripRecordedMessage(drip))
+
+        self.assertEqual([1.0, 2.0, 3.0], first.tolist())
+
+    def test_drip_rates_and_estimate_follow_drips(self):
+        mock_communicatior = MagicMock()
+        sdza = SerialDripZAxis(mock_communicatior, 1.0, 0.0, rate_windows=(1.0, 5.0))
+        with patch('peachyprinter.infrastructure.zaxis.time.time') as mock_time:
+            for drip in range(1, 21):
+                mock_time.return_value = drip * 0.1
+                sdza.drip_reported_handler(DripRecordedMessage(drip))
+        self.assertEqual(set([1.0, 5.0]), set(sdza.drip_rates.keys()))
+        self.assertTrue(sdza.estimated_drips_per_second > 0.0)
+
     def test_move_to_sends_drips(self):
         mock_communicatior = MagicMock()
         starting_height = 0.0
@@ -133,7 +181,7 @@ class SerialDripZAxisTests(unittest.TestCase):
         history = sdza.drip_history
 
         self.assertEqual(0.0, actual_height)
-        self.assertEqual([], history)
+        self.assertEqual(0, len(history))
 
     def test_reset_removes_drips_count_accounting_for_hardware(self):
         mock_communicatior = MagicMock()
@@ -179,6 +227,59 @@ class SerialDripZAxisTests(unittest.TestCase):
         self.assertTrue(mock_call_back.call_args_list[0][0][3][0] >= start)
         self.assertTrue(mock_call_back.call_args_list[0][0][3][0] <= end)
 
+    def test_wait_for_height_wakes_when_drip_reported(self):
+        mock_communicatior = MagicMock()
+        sdza = SerialDripZAxis(mock_communicatior, 1.0, 0.0)
+        timer = threading.Timer(0.05, sdza.drip_reported_handler, [DripRecordedMessage(2)])
+        start = time.time()
+        timer.start()
+
+        reached = sdza.wait_for_height(2.0, 5.0)
+
+        self.assertTrue(reached)
+        self.assertTrue(time.time() - start < 1.0)
+
+    def test_wait_for_height_returns_false_on_timeout(self):
+        mock_communicatior = MagicMock()
+        sdza = SerialDripZAxis(mock_communicatior, 1.0, 0.0)
+        sdza.drip_reported_handler(DripRecordedMessage(1))
+
+        self.assertFalse(sdza.wait_for_height(2.0, 0.05))
+        self.assertTrue(sdza.wait_for_height(1.0, 0.0))
+
+    def test_wait_for_height_without_timeout_wakes_only_when_height_changes(self):
+        sdza = SerialDripZAxis(MagicMock(), 1.0, 0.0)
+        wait = sdza._height_changed.wait
+        wakeups = []
+
+        def counting_wait(timeout=None):
+            wakeups.append(timeout)
+            wait(timeout)
+        sdza._height_changed.wait = counting_wait
+        timer = threading.Timer(0.2, sdza.drip_reported_handler, [DripRecordedMessage(2)])
+        timer.start()
+
+        reached = sdza.wait_for_height(2.0)
+
+        self.assertTrue(reached)
+        self.assertEqual([None], wakeups)
+
+    def test_wait_for_height_returns_false_when_interrupted_and_cancelled(self):
+        sdza = SerialDripZAxis(MagicMock(), 1.0, 0.0)
+        cancelled = threading.Event()
+
+        def cancel():
+            cancelled.set()
+            sdza.interrupt()
+        timer = threading.Timer(0.05, cancel)
+        start = time.time()
+        timer.start()
+
+        reached = sdza.wait_for_height(2.0, cancelled=cancelled.is_set)
+
+        self.assertFalse(reached)
+        self.assertTrue(time.time() - start < 1.0)
+
 
 if __name__ == '__main__':
     logging.basicConfig(format='%(asctime)s %(levelname)s: %(message)s', level='DEBUG')
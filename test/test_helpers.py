@@ -108,6 +108,7 @@ class TestHelpers(NumpyTestHelpers,CommandTestHelpers, DefaultsHelpers):
         self.assertEquals(expected.calibration.flip_x_axis              , actual.calibration.flip_x_axis              , "calibration.flip_x_axis did not match expected %s was %s"               % (expected.calibration.flip_x_axis              , actual.calibration.flip_x_axis              ))
         self.assertEquals(expected.calibration.flip_y_axis              , actual.calibration.flip_y_axis              , "calibration.flip_y_axis did not match expected %s was %s"               % (expected.calibration.flip_y_axis              , actual.calibration.flip_y_axis              ))
         self.assertEquals(expected.calibration.swap_axis                , actual.calibration.swap_axis                , "calibration.swap_axis did not match expected %s was %s"                 % (expected.calibration.swap_axis                , actual.calibration.swap_axis                ))
+        self.assertEquals(expected.calibration.fit_cache                , actual.calibration.fit_cache                , "calibration.fit_cache did not match expected %s was %s"                 % (expected.calibration.fit_cache                , actual.calibration.fit_cache                ))
 
         self.assertEquals(expected.options.scaling_factor               , actual.options.scaling_factor               , "options.scaling_factor did not match expected %s was %s"                % (expected.options.scaling_factor               , actual.options.scaling_factor               ))
         self.assertEquals(expected.options.sublayer_height_mm           , actual.options.sublayer_height_mm           , "options.sublayer_height_mm did not match expected %s was %s"            % (expected.options.sublayer_height_mm           , actual.options.sublayer_height_mm           ))
@@ -123,6 +124,12 @@ class TestHelpers(NumpyTestHelpers,CommandTestHelpers, DefaultsHelpers):
         self.assertEquals(expected.options.slew_delay                  , actual.options.slew_delay                    , "options.slew_delay      did not match expected %s was %s"               % (expected.options.slew_delay                   , actual.options.slew_delay                   ))
         self.assertEquals(expected.options.write_wav_files             , actual.options.write_wav_files               , "options.write_wav_files did not match expected %s was %s"               % (expected.options.write_wav_files              , actual.options.write_wav_files              ))
         self.assertEquals(expected.options.write_wav_files_folder      , actual.options.write_wav_files_folder        , "options.write_wav_files_folder did not match expected %s was %s"        % (expected.options.write_wav_files_folder       , actual.options.write_wav_files_folder       ))
+        self.assertEquals(expected.options.use_chunked_gcode, actual.options.use_chunked_gcode, "options.use_chunked_gcode did not match expected %s was %s" % (expected.options.use_chunked_gcode, actual.options.use_chunked_gcode))
+        self.assertEquals(expected.options.use_simplification, actual.options.use_simplification, "options.use_simplification did not match expected %s was %s" % (expected.options.use_simplification, actual.options.use_simplification))
+        self.assertEquals(expected.options.use_travel_optimizer, actual.options.use_travel_optimizer, "options.use_travel_optimizer did not match expected %s was %s" % (expected.options.use_travel_optimizer, actual.options.use_travel_optimizer))
+        self.assertEquals(expected.options.prefetch_layers, actual.options.prefetch_layers, "options.prefetch_layers did not match expected %s was %s" % (expected.options.prefetch_layers, actual.options.prefetch_layers))
+        self.assertEquals(expected.options.layer_cache_size_mb, actual.options.layer_cache_size_mb, "options.layer_cache_size_mb did not match expected %s was %s" % (expected.options.layer_cache_size_mb, actual.options.layer_cache_size_mb))
+        self.assertEquals(expected.options.use_layer_cache, actual.options.use_layer_cache, "options.use_layer_cache did not match expected %s was %s" % (expected.options.use_layer_cache, actual.options.use_layer_cache))
 
         self.assertEquals(expected.dripper.max_lead_distance_mm         , actual.dripper.max_lead_distance_mm         , "dripper.max_lead_distance_mm did not match expected %s was %s"          % (expected.dripper.max_lead_distance_mm         , actual.dripper.max_lead_distance_mm         ))
         self.assertEquals(expected.dripper.drips_per_mm                 , actual.dripper.drips_per_mm                 , "dripper.drips_per_mm did not match expected %s was %s"                  % (expected.dripper.drips_per_mm                 , actual.dripper.drips_per_mm                 ))
@@ -160,3 +167,6 @@ class TestHelpers(NumpyTestHelpers,CommandTestHelpers, DefaultsHelpers):
         self.assertEqual(expected.circut.data_rate                      , actual.circut.data_rate                     , "circut.data_rate did not march expected %s was %s"                      % (expected.circut.data_rate                    ,  actual.circut.data_rate                     ))
         self.assertEqual(expected.circut.print_queue_length             , actual.circut.print_queue_length            , "circut.print_queue_length did not march expected %s was %s"             % (expected.circut.print_queue_length           ,  actual.circut.print_queue_length            ))
         self.assertEqual(expected.circut.calibration_queue_length       , actual.circut.calibration_queue_length      , "circut.calibration_queue_length did not march expected %s was %s"       % (expected.circut.calibration_queue_length     ,  actual.circut.calibration_queue_length      ))
+        self.assertEqual(expected.circut.write_buffer_size, actual.circut.write_buffer_size, "circut.write_buffer_size did not march expected %s was %s" % (expected.circut.write_buffer_size, actual.circut.write_buffer_size))
+        self.assertEqual(expected.circut.use_loopback, actual.circut.use_loopback, "circut.use_loopback did not march expected %s was %s" % (expected.circut.use_loopback, actual.circut.use_loopback))
+        self.assertEqual(expected.circut.use_hold_messages, actual.circut.use_hold_messages, "circut.use_hold_messages did not march expected %s was %s" % (expected.circut.use_hold_messages, actual.circut.use_hold_messages))